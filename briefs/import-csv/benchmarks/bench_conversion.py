@@ -0,0 +1,188 @@
+"""
+Compara la conversion completa de 01_convierte-inventario.py contra el modo
+por bloques (--por-bloques) sobre inventarios sinteticos.
+
+Cada medicion corre en un subproceso nuevo para que el pico de memoria
+(ru_maxrss) sea solo el de esa conversion. Despues de cada modo verifica que
+rechazos_importacion.csv tenga los mismos codigos que parseCsv.ts daria al leer
+la salida (el inventario sintetico trae algunas filas invalidas a proposito). Los archivos generados van a un
+directorio temporal y se borran al terminar.
+
+Uso:
+    python benchmarks/bench_conversion.py                        # 100k y 1M filas
+    python benchmarks/bench_conversion.py --filas 50000 --tamano-bloque 10000
+    python benchmarks/bench_conversion.py --salida resultados.json
+"""
+import argparse
+import csv
+import importlib.util
+import json
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_CONVERSION = Path(__file__).resolve().parents[1] / "scripts" / "01_convierte-inventario.py"
+
+# Mismo encabezado que la exportacion real (incluye las dos columnas sin nombre del final)
+ENCABEZADO = [
+    "clave1 *", "clave2", "descripción *", "departamento", "categoria", "(s/n) inventariable",
+    "unidad", "costo", "precio1", "(s/n) precio con impuestos", "(s/n) imp IVA (8%)",
+    "(s/n) imp IVA (16%)", "(s/n) granel", "existencia", "", "",
+]
+DEPARTAMENTOS = {
+    "Herramientas": ["Bases giratorias", "Espatulas", "Cortadores"],
+    "Moldes": ["Silicon", "Aluminio", "Policarbonato"],
+    "Decoracion": ["Duyas", "Sprinkles", "Colorantes"],
+    "Insumos": ["Polvos", "Chocolates", "Esencias"],
+}
+CODIGOS_SAT = ["48101817", "52151600", "52151907", "12164602"]
+# Cada tantas filas, un caso que el importador rechaza: precio no numerico, precio 0, categoria vacia
+FILAS_INVALIDAS = {997: ("precio", "abc"), 1009: ("precio", " $0.00 "), 1013: ("categoria", "")}
+
+
+# ─── Inventario sintetico ────────────────────────────────────────────────────
+def _clave2(rng: random.Random, i: int) -> str:
+    """EAN numerico, codigo de proveedor alfanumerico o vacio, como en la exportacion real."""
+    r = rng.random()
+    if r < 0.75:
+        return str(7_500_000_000_000 + i)
+    if r < 0.8:
+        return f"TOL{i:06d}"
+    return ""
+
+
+def generar_inventario(ruta: Path, filas: int, semilla: int = 7, invalidas: bool = False):
+    """invalidas: agrega las filas de FILAS_INVALIDAS (para verificar el reporte de rechazos)."""
+    rng = random.Random(semilla)
+    departamentos = list(DEPARTAMENTOS)
+    with open(ruta, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(ENCABEZADO)
+        for i in range(filas):
+            depto = rng.choice(departamentos)
+            precio = rng.randint(500, 250_000) / 100
+            campos = {"precio": f" ${precio:,.2f} ", "categoria": rng.choice(DEPARTAMENTOS[depto])}
+            for cada, (campo, valor) in FILAS_INVALIDAS.items():
+                if invalidas and i % cada == cada - 1:
+                    campos[campo] = valor
+            writer.writerow([
+                f"SKU{i:07d}",
+                _clave2(rng, i),
+                f"PRODUCTO {depto.upper()} {i} Ø{rng.randint(5, 40)} cm",
+                depto,
+                campos["categoria"],
+                "SI" if rng.random() < 0.9 else "NO",
+                "Pieza", "", "",
+                campos["precio"],
+                "", "", "", "", "",
+                rng.choice(CODIGOS_SAT),
+            ])
+
+
+# ─── Rechazos: reporte vs importador ─────────────────────────────────────────
+OBLIGATORIAS = ["nombre", "precio", "departamento", "categoria", "clave1"]   # CSV_REQUIRED_COLUMNS
+_RE_NUMERO = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+
+
+def _precio_importador(texto: str) -> float:
+    """normalizePrice de normalizers.ts: quita $ y comas y aplica parseFloat (prefijo numerico)."""
+    m = _RE_NUMERO.match(texto.strip().replace("$", "").replace(",", ""))
+    return float(m.group()) if m else float("nan")
+
+
+def rechazos_importador(salida: Path) -> list[tuple[int, str]]:
+    """(fila, codigo) que parseCsv.ts reportaria para la salida, con las mismas reglas y orden."""
+    rechazos = []
+    with open(salida, newline="", encoding="utf-8") as f:
+        for fila, row in enumerate(csv.DictReader(f), start=2):
+            if any(not (row.get(col) or "").strip() for col in OBLIGATORIAS):
+                rechazos.append((fila, "MISSING_FIELD"))
+            elif not _precio_importador(row["precio"]) > 0:
+                rechazos.append((fila, "INVALID_PRICE"))
+    return rechazos
+
+
+def rechazos_reportados(salida: Path) -> list[tuple[int, str]]:
+    with open(salida.parent / "rechazos_importacion.csv", newline="", encoding="utf-8") as f:
+        return [(int(row["fila"]), row["codigo"]) for row in csv.DictReader(f)]
+
+
+# ─── Medicion en subproceso ──────────────────────────────────────────────────
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KiB, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def ejecutar_modo(modo: str, origen: str, destino: str, tamano_bloque: int):
+    """Punto de entrada del subproceso: convierte y emite una linea JSON con la medicion."""
+    spec = importlib.util.spec_from_file_location("convierte_inventario", SCRIPT_CONVERSION)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+
+    inicio = time.perf_counter()
+    if modo == "bloques":
+        modulo.convertir_inventario_por_bloques(origen, destino, chunk_size=tamano_bloque)
+    else:
+        modulo.convertir_inventario(origen, destino)
+    segundos = time.perf_counter() - inicio
+    print(json.dumps({"segundos": segundos, "max_rss_mb": _max_rss_mb()}))
+
+
+def medir(modo: str, origen: Path, destino: Path, tamano_bloque: int) -> dict:
+    proceso = subprocess.run(
+        [sys.executable, __file__, "--ejecutar", modo, str(origen), str(destino),
+         "--tamano-bloque", str(tamano_bloque)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de conversion completa vs por bloques.")
+    parser.add_argument("--filas", type=int, nargs="+", default=[100_000, 1_000_000],
+                        help="tamanos de inventario a generar (default: %(default)s)")
+    parser.add_argument("--tamano-bloque", type=int, default=50_000, help="filas por bloque (default: %(default)s)")
+    parser.add_argument("--salida", help="guarda los resultados en este archivo JSON")
+    parser.add_argument("--ejecutar", nargs=3, metavar=("MODO", "ORIGEN", "DESTINO"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.ejecutar:
+        ejecutar_modo(*args.ejecutar, tamano_bloque=args.tamano_bloque)
+        return
+
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="bench_conversion_") as tmp:
+        tmp = Path(tmp)
+        for filas in args.filas:
+            origen = tmp / f"inventario_{filas}.csv"
+            generar_inventario(origen, filas, invalidas=True)
+            mb = origen.stat().st_size / 1_000_000
+            print(f"\n{filas:,} filas ({mb:.0f} MB)")
+            for modo in ("completo", "bloques"):
+                medicion = medir(modo, origen, tmp / f"salida_{modo}.csv", args.tamano_bloque)
+                medicion.update({"filas": filas, "modo": modo, "mb_origen": round(mb, 1)})
+                resultados.append(medicion)
+                salida = tmp / f"salida_{modo}.csv"
+                esperados = rechazos_importador(salida)
+                medicion["rechazos"] = len(esperados)
+                medicion["rechazos_coinciden"] = rechazos_reportados(salida) == esperados
+                print(f"  {modo:<9} {medicion['segundos']:7.2f} s   "
+                      f"{filas / medicion['segundos']:>10,.0f} filas/s   "
+                      f"pico RSS {medicion['max_rss_mb']:7.1f} MB   "
+                      f"rechazos {len(esperados)} ({'coinciden' if medicion['rechazos_coinciden'] else 'NO coinciden'})")
+            iguales = (tmp / "salida_completo.csv").read_bytes() == (tmp / "salida_bloques.csv").read_bytes()
+            print(f"  salidas identicas: {'si' if iguales else 'NO'}")
+
+    if args.salida:
+        Path(args.salida).write_text(json.dumps(resultados, indent=2), encoding="utf-8")
+        print(f"\nResultados: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
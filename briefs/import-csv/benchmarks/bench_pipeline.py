@@ -0,0 +1,282 @@
+"""
+Benchmark reproducible de las etapas del pipeline offline con catalogos sinteticos.
+
+Para cada tamano genera un Inventario_Productos.csv sintetico con el mismo
+formato que la exportacion real (BOM, encabezados con acentos, precios como
+" $1,135.00 ", columnas sin nombre al final) y corre, cada una en un
+subproceso nuevo:
+
+  - conversion: 01_convierte-inventario.py completo (lectura, validacion y escritura);
+  - precios:    parse_price sobre la columna de precio (mejor de 3);
+  - imagenes:   02_agrega-imagenes.py (busqueda, descarga, descripciones y estado);
+  - subida:     03_sube-imagenes-supabase.py --subir (hash, Storage y lotes de image_url).
+
+Las etapas corren sobre una copia de scripts/ dentro de un arbol temporal, asi
+que todas sus salidas quedan ahi. La red se reemplaza por stubs locales
+(stubs.py): paginas de resultados, navegador falso, imagenes, Ollama y
+Supabase. Las esperas del limitador por fuente de 02 se anulan: se mide el
+costo del codigo, no la espera frente a los buscadores. --busqueda elige el
+backend de busqueda de 02 (http o navegador).
+
+Cada medicion registra tiempo de pared, filas/s y pico de memoria (ru_maxrss
+del subproceso). Los resultados se guardan en JSON con el commit y el entorno,
+y --comparar muestra la diferencia contra una corrida anterior.
+
+Uso:
+    python benchmarks/bench_pipeline.py                                  # 1k, 10k y 100k filas
+    python benchmarks/bench_pipeline.py --filas 1000 --etapas conversion precios
+    python benchmarks/bench_pipeline.py --latencia-ms 20 --workers 4
+    python benchmarks/bench_pipeline.py --etapas imagenes --busqueda navegador
+    python benchmarks/bench_pipeline.py --comparar benchmarks/resultados/anterior.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from bench_conversion import _max_rss_mb, generar_inventario
+from stubs import DriverFalso, ServidorStubs
+
+BENCH_DIR = Path(__file__).resolve().parent
+IMPORT_CSV_DIR = BENCH_DIR.parent
+SCRIPTS_DIR = IMPORT_CSV_DIR / "scripts"
+RESULTADOS_DIR = BENCH_DIR / "resultados"
+
+ETAPAS = ["conversion", "precios", "imagenes", "subida"]
+REQUIERE = {"imagenes": "conversion", "subida": "imagenes"}
+FILAS = [1_000, 10_000, 100_000]
+REPETICIONES_PRECIOS = 3
+UMBRAL_REGRESION = 0.10   # --comparar marca como regresion lo que sea 10% mas lento
+
+
+# ─── Etapas (corren en el subproceso) ────────────────────────────────────────
+def _cargar(nombre_script: str, raiz: Path):
+    ruta = raiz / "scripts" / nombre_script
+    sys.path.insert(0, str(ruta.parent))
+    spec = importlib.util.spec_from_file_location(ruta.stem.replace("-", "_"), ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def _etapa_conversion(raiz: Path) -> dict:
+    sys.argv = ["01_convierte-inventario.py"]
+    inicio = time.perf_counter()
+    runpy.run_path(str(raiz / "scripts" / "01_convierte-inventario.py"), run_name="__main__")
+    segundos = time.perf_counter() - inicio
+    salida = raiz / "output" / "current" / "productos_listos_para_importar.csv"
+    with open(salida, encoding="utf-8") as f:
+        filas = sum(1 for _ in f) - 1
+    return {"segundos": segundos, "unidades": filas}
+
+
+def _etapa_precios(raiz: Path) -> dict:
+    modulo = _cargar("01_convierte-inventario.py", raiz)
+    df = modulo.safe_read_csv(str(raiz / "source" / "inventory" / "Inventario_Productos.csv"))
+    df.columns = df.columns.str.strip()
+    _, _, normalized_map = modulo.resolve_columns(df)
+    columna = modulo.choose_price_column(df, normalized_map)
+    precios = df[columna]
+    tiempos = []
+    for _ in range(REPETICIONES_PRECIOS):
+        inicio = time.perf_counter()
+        resultado = modulo.parse_price(precios)
+        tiempos.append(time.perf_counter() - inicio)
+    return {"segundos": min(tiempos), "unidades": len(resultado), "precios_mayores_a_cero": int((resultado > 0).sum())}
+
+
+class _TiempoSinPausas:
+    """Reemplaza al modulo time dentro de 02: sleep no espera, el resto es el real."""
+
+    def __getattr__(self, nombre):
+        return getattr(time, nombre)
+
+    @staticmethod
+    def sleep(_segundos):
+        pass
+
+
+def _etapa_imagenes(raiz: Path, workers: int, busqueda: str) -> dict:
+    modulo = _cargar("02_agrega-imagenes.py", raiz)
+    url_stubs = os.environ["BENCH_STUBS_URL"]
+    latencia = float(os.environ.get("BENCH_LATENCIA_MS", "0"))
+    modulo.crear_driver = lambda headless=False: DriverFalso(url_stubs, latencia_ms=latencia)
+    modulo.time = _TiempoSinPausas()
+    sys.argv = ["02_agrega-imagenes.py", "--workers", str(workers), "--busqueda", busqueda]
+    inicio = time.perf_counter()
+    modulo.main()
+    segundos = time.perf_counter() - inicio
+    estado = modulo.EstadoPipeline(modulo.ESTADO_DB)
+    conteos = estado.conteos()
+    estado.cerrar()
+    return {"segundos": segundos, "unidades": sum(conteos.values()), "con_imagen": conteos.get("ok", 0)}
+
+
+def _etapa_subida(raiz: Path, workers: int) -> dict:
+    modulo = _cargar("03_sube-imagenes-supabase.py", raiz)
+    sys.argv = ["03_sube-imagenes-supabase.py", "--subir", "--workers", str(workers)]
+    inicio = time.perf_counter()
+    modulo.main()
+    segundos = time.perf_counter() - inicio
+    manifest = json.loads(modulo.MANIFEST.read_text()) if modulo.MANIFEST.exists() else {}
+    with open(modulo.IMAGENES_MAP, encoding="utf-8") as f:
+        filas = sum(1 for _ in f) - 1
+    return {"segundos": segundos, "unidades": filas, "objetos": len(manifest)}
+
+
+def ejecutar_etapa(etapa: str, raiz: Path, salida: Path, workers: int, busqueda: str):
+    """Punto de entrada del subproceso: corre la etapa y escribe su medicion en `salida`."""
+    if etapa == "conversion":
+        medicion = _etapa_conversion(raiz)
+    elif etapa == "precios":
+        medicion = _etapa_precios(raiz)
+    elif etapa == "imagenes":
+        medicion = _etapa_imagenes(raiz, workers, busqueda)
+    else:
+        medicion = _etapa_subida(raiz, workers)
+    medicion["max_rss_mb"] = _max_rss_mb()
+    salida.write_text(json.dumps(medicion))
+
+
+# ─── Orquestacion ────────────────────────────────────────────────────────────
+def preparar_arbol(raiz: Path, filas: int):
+    """Arbol import-csv temporal: copia de scripts/, inventario sintetico y output/current vacio."""
+    shutil.copytree(SCRIPTS_DIR, raiz / "scripts", ignore=shutil.ignore_patterns("__pycache__"))
+    inventario = raiz / "source" / "inventory" / "Inventario_Productos.csv"
+    inventario.parent.mkdir(parents=True)
+    (raiz / "output" / "current").mkdir(parents=True)
+    generar_inventario(inventario, filas)
+    return inventario
+
+
+def medir(etapa: str, raiz: Path, workers: int, busqueda: str, entorno: dict) -> dict:
+    salida = raiz / f"medicion_{etapa}.json"
+    proceso = subprocess.run(
+        [sys.executable, __file__, "--ejecutar", etapa, str(raiz), str(salida),
+         "--workers", str(workers), "--busqueda", busqueda],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env=entorno,
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"La etapa {etapa} fallo:\n{proceso.stderr[-2000:]}")
+    return json.loads(salida.read_text())
+
+
+def _commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=IMPORT_CSV_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        sucio = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=IMPORT_CSV_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{commit}{'-sucio' if sucio else ''}"
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def comparar(resultados: list[dict], ruta_anterior: Path):
+    anterior = {(r["etapa"], r["filas"]): r for r in json.loads(ruta_anterior.read_text())["resultados"]}
+    print(f"\nComparacion contra {ruta_anterior}:")
+    for r in resultados:
+        previo = anterior.get((r["etapa"], r["filas"]))
+        if not previo:
+            continue
+        cambio = r["segundos"] / previo["segundos"] - 1 if previo["segundos"] else 0.0
+        marca = "  REGRESION" if cambio > UMBRAL_REGRESION else ""
+        print(f"  {r['etapa']:<11}{r['filas']:>9,}  {previo['segundos']:8.2f} s → {r['segundos']:8.2f} s "
+              f"({cambio:+.0%})   RSS {previo['max_rss_mb']:.0f} → {r['max_rss_mb']:.0f} MB{marca}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las etapas del pipeline con stubs locales.")
+    parser.add_argument("--filas", type=int, nargs="+", default=FILAS,
+                        help="tamanos de inventario a generar (default: %(default)s)")
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=ETAPAS,
+                        help="etapas a medir; se agregan las que requieren (default: todas)")
+    parser.add_argument("--workers", type=int, default=1, help="--workers de 02 y 03 (default: %(default)s)")
+    parser.add_argument("--busqueda", choices=["http", "navegador"], default="http",
+                        help="--busqueda de 02 (default: %(default)s)")
+    parser.add_argument("--latencia-ms", type=float, default=0.0,
+                        help="latencia simulada por peticion en los stubs (default: %(default)s)")
+    parser.add_argument("--kb-imagen", type=int, default=4, help="tamano de las imagenes servidas (default: %(default)s)")
+    parser.add_argument("--salida", type=Path,
+                        help="archivo JSON de resultados (default: benchmarks/resultados/<fecha>-<commit>.json)")
+    parser.add_argument("--comparar", type=Path, help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--ejecutar", nargs=3, metavar=("ETAPA", "RAIZ", "SALIDA"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.ejecutar:
+        etapa, raiz, salida = args.ejecutar
+        ejecutar_etapa(etapa, Path(raiz), Path(salida), args.workers, args.busqueda)
+        return
+
+    etapas = set(args.etapas)
+    for etapa in list(etapas):
+        while etapa in REQUIERE:
+            etapa = REQUIERE[etapa]
+            etapas.add(etapa)
+    etapas = [e for e in ETAPAS if e in etapas]
+
+    stubs = ServidorStubs(latencia_ms=args.latencia_ms, kb_imagen=args.kb_imagen).iniciar()
+    entorno = {
+        **os.environ,
+        "OLLAMA_HOST": stubs.url,
+        "NEXT_PUBLIC_SUPABASE_URL": stubs.url,
+        "SUPABASE_SERVICE_ROLE_KEY": "bench",
+        "HG_BING_URL": f"{stubs.url}/bing/images/search",
+        "HG_GOOGLE_URL": f"{stubs.url}/google/search",
+        "BENCH_STUBS_URL": stubs.url,
+        "BENCH_LATENCIA_MS": str(args.latencia_ms),
+    }
+
+    commit = _commit()
+    print(f"Commit: {commit}   Etapas: {', '.join(etapas)}   Workers: {args.workers}   "
+          f"Busqueda: {args.busqueda}   "
+          f"Latencia stubs: {args.latencia_ms:g} ms")
+    resultados = []
+    try:
+        for filas in args.filas:
+            with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as tmp:
+                raiz = Path(tmp) / "import-csv"
+                inventario = preparar_arbol(raiz, filas)
+                mb = inventario.stat().st_size / 1_000_000
+                print(f"\n{filas:,} filas ({mb:.1f} MB)")
+                for etapa in etapas:
+                    medicion = medir(etapa, raiz, args.workers, args.busqueda, entorno)
+                    medicion.update({
+                        "etapa": etapa, "filas": filas,
+                        "filas_por_s": round(filas / medicion["segundos"], 1) if medicion["segundos"] else None,
+                    })
+                    resultados.append(medicion)
+                    print(f"  {etapa:<11}{medicion['segundos']:9.3f} s  {medicion['filas_por_s'] or 0:>12,.0f} filas/s  "
+                          f"pico RSS {medicion['max_rss_mb']:7.1f} MB")
+    finally:
+        stubs.detener()
+
+    reporte = {
+        "commit": commit,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parametros": {"etapas": etapas, "filas": args.filas, "workers": args.workers,
+                       "busqueda": args.busqueda, "latencia_ms": args.latencia_ms, "kb_imagen": args.kb_imagen},
+        "resultados": resultados,
+    }
+    salida = args.salida or RESULTADOS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps(reporte, indent=2), encoding="utf-8")
+    print(f"\nResultados: {salida}")
+    if args.comparar:
+        comparar(resultados, args.comparar)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Stubs locales para correr las etapas del pipeline sin red: un solo servidor HTTP
+que imita las paginas de resultados de Bing y Google (para HG_BING_URL /
+HG_GOOGLE_URL), las imagenes, Ollama (/api/chat) y Supabase (Storage y
+PostgREST), y un navegador falso que reemplaza a Selenium.
+
+Lo usa bench_pipeline.py; tambien sirve para pruebas manuales:
+
+    python benchmarks/stubs.py --puerto 8765 --latencia-ms 20
+"""
+import argparse
+import hashlib
+import html
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+KB_IMAGEN = 4   # tamano de cada imagen servida
+CANDIDATOS = 3  # resultados por pagina de busqueda
+
+
+def _clave_consulta(consulta: str) -> str:
+    return hashlib.sha1(consulta.encode()).hexdigest()[:16]
+
+
+def pagina_bing(url_stubs: str, consulta: str, candidatos: int = CANDIDATOS) -> str:
+    """Resultados con el marcado de Bing Imagenes: a.iusc con el JSON en `m` e img.mimg."""
+    clave = _clave_consulta(consulta)
+    enlaces = []
+    for n in range(candidatos):
+        src = f"{url_stubs}/imagenes/{clave}-{n}.jpg"
+        m = html.escape(json.dumps({"murl": src, "turl": src, "t": f"Resultado {n}"}))
+        enlaces.append(f'<li><div class="imgpt"><a class="iusc" style="height:180px" m="{m}" '
+                       f'href="/images/search?view=detailV2"><img class="mimg" height="180" '
+                       f'src="{src}" alt="Resultado {n}"></a></div></li>')
+    return f'<html><body><ul class="dgControl_list">{"".join(enlaces)}</ul></body></html>'
+
+
+def pagina_google(url_stubs: str, consulta: str, candidatos: int = CANDIDATOS) -> str:
+    """Resultados con el marcado de la version HTML basica de Google Imagenes."""
+    clave = _clave_consulta(consulta)
+    celdas = "".join(
+        f'<td><a href="/url?q=x"><img class="DS1iW" alt="" '
+        f'src="{url_stubs}/imagenes/{clave}-{n}.jpg?q=tbn:{clave}-{n}&amp;s"></a></td>'
+        for n in range(candidatos)
+    )
+    return f'<html><body><img src="/images/branding/logo.png"><table><tr>{celdas}</tr></table></body></html>'
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Encabezados y cuerpo salen en escrituras separadas: con Nagle cada respuesta
+    # keep-alive esperaria el ACK retardado del cliente (~40 ms)
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    # ─── Utilidades ──────────────────────────────────────────────────────────
+    def _cuerpo(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _responder(self, codigo: int, datos: bytes = b"", tipo="application/json", headers=None):
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(datos)))
+        for clave, valor in (headers or {}).items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(datos)
+
+    def _json(self, codigo: int, objeto):
+        self._responder(codigo, json.dumps(objeto).encode())
+
+    def _esperar(self, ruta: str):
+        self.server.contar(ruta)
+        if self.server.latencia:
+            time.sleep(self.server.latencia)
+
+    # ─── Rutas ───────────────────────────────────────────────────────────────
+    def do_GET(self):
+        ruta = urlparse(self.path).path
+        if ruta.startswith("/imagenes/"):
+            self._esperar("imagen")
+            return self._responder(200, self.server.imagen(ruta), tipo="image/jpeg")
+        if ruta.startswith(("/bing/", "/google/")):
+            self._esperar("busqueda")
+            pagina = pagina_bing if ruta.startswith("/bing/") else pagina_google
+            return self._responder(200, pagina(self.server.url, self.path).encode(), tipo="text/html; charset=utf-8")
+        self._esperar("get")
+        self._json(404, {})
+
+    def do_HEAD(self):
+        ruta = urlparse(self.path).path
+        self._esperar("storage_head")
+        objeto = self.server.objetos.get(ruta.removeprefix("/storage/v1/object/"))
+        if objeto is None:
+            return self._responder(400)
+        md5, tamano = objeto
+        self.send_response(200)
+        self.send_header("ETag", f'"{md5}"')
+        self.send_header("Content-Length", str(tamano))
+        self.end_headers()
+
+    def do_POST(self):
+        ruta = urlparse(self.path).path
+        cuerpo = self._cuerpo()
+        if ruta == "/api/chat":
+            self._esperar("ollama")
+            pedido = json.loads(cuerpo)
+            contenido = f"Descripcion de prueba para {pedido['messages'][0]['content'][-40:]}"
+            return self._json(200, {
+                "model": pedido["model"], "created_at": "2026-01-01T00:00:00Z",
+                "message": {"role": "assistant", "content": contenido},
+                "done": True, "eval_count": 20, "eval_duration": 20_000_000,
+            })
+        if ruta.startswith("/storage/v1/object/"):
+            self._esperar("storage_post")
+            with self.server.lock:
+                self.server.objetos[ruta.removeprefix("/storage/v1/object/")] = (
+                    hashlib.md5(cuerpo).hexdigest(), len(cuerpo))
+            return self._json(200, {"Key": ruta})
+        if ruta.startswith("/rest/v1/rpc/"):
+            self._esperar("rpc")
+            items = json.loads(cuerpo).get("items") or []
+            return self._json(200, {"updated": len(items), "unmatched": []})
+        if ruta == "/rest/v1/products":
+            self._esperar("upsert")
+            return self._responder(201)
+        self._json(404, {})
+
+    def do_PATCH(self):
+        consulta = parse_qs(urlparse(self.path).query)
+        self._cuerpo()
+        self._esperar("patch")
+        self._json(200, [{"sku": consulta.get("sku", ["eq."])[0][3:]}])
+
+
+class ServidorStubs(ThreadingHTTPServer):
+    """Servidor en un hilo de fondo; `url` es la base para OLLAMA_HOST, Supabase y las imagenes."""
+
+    daemon_threads = True
+
+    def __init__(self, puerto=0, latencia_ms=0.0, kb_imagen=KB_IMAGEN):
+        super().__init__(("127.0.0.1", puerto), _Manejador)
+        self.latencia = latencia_ms / 1000
+        self.kb_imagen = kb_imagen
+        self.objetos = {}   # ruta en el bucket → (md5, bytes)
+        self.llamadas = {}
+        self.lock = threading.Lock()
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+
+    def contar(self, tipo: str):
+        with self.lock:
+            self.llamadas[tipo] = self.llamadas.get(tipo, 0) + 1
+
+    def imagen(self, ruta: str) -> bytes:
+        """JPEG aparente (firma + relleno) distinto por ruta, para que no se deduplique."""
+        semilla = hashlib.sha256(ruta.encode()).digest()
+        relleno = semilla * (self.kb_imagen * 1024 // len(semilla) + 1)
+        return b"\xff\xd8\xff\xe0" + relleno[:self.kb_imagen * 1024]
+
+    def iniciar(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self.shutdown()
+        self.server_close()
+
+
+# ─── Navegador falso (reemplaza a Selenium en 02) ────────────────────────────
+class _ElementoFalso:
+    def __init__(self, src):
+        self._src = src
+
+    def is_displayed(self):
+        return True
+
+    def get_attribute(self, nombre):
+        return self._src if nombre == "src" else None
+
+
+class DriverFalso:
+    """Responde cualquier busqueda con N imagenes del servidor de stubs.
+
+    Las URLs dependen de la consulta, asi que cada SKU recibe imagenes propias."""
+
+    def __init__(self, url_stubs: str, candidatos: int = CANDIDATOS, latencia_ms: float = 0.0):
+        self.url_stubs = url_stubs
+        self.candidatos = candidatos
+        self.latencia = latencia_ms / 1000
+        self._consulta = ""
+
+    def get(self, url):
+        if url != "about:blank":
+            self._consulta = url
+            if self.latencia:
+                time.sleep(self.latencia)
+
+    def find_element(self, *args):
+        return self.find_elements(*args)[0]
+
+    def find_elements(self, *args):
+        clave = _clave_consulta(self._consulta)
+        return [_ElementoFalso(f"{self.url_stubs}/imagenes/{clave}-{n}.jpg") for n in range(self.candidatos)]
+
+    def execute_script(self, *args):
+        return None
+
+    def set_window_size(self, *args):
+        pass
+
+    def quit(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de stubs (imagenes, Ollama, Supabase).")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="demora por peticion")
+    parser.add_argument("--kb-imagen", type=int, default=KB_IMAGEN, help="tamano de las imagenes servidas")
+    args = parser.parse_args()
+    servidor = ServidorStubs(args.puerto, args.latencia_ms, args.kb_imagen)
+    print(f"Stubs en {servidor.url} (Ctrl+C para salir)")
+    print(f"  HG_BING_URL={servidor.url}/bing/images/search  HG_GOOGLE_URL={servidor.url}/google/search")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
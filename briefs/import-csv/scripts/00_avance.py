@@ -0,0 +1,110 @@
+"""
+Monitor en vivo de una corrida del pipeline (reemplaza 00_avance.sh).
+
+Sigue el archivo de eventos más reciente de output/current/eventos/ (o el
+indicado) y muestra avance, velocidad reciente, ETA y latencias por etapa y
+fuente. Termina cuando la corrida escribe su evento final.
+
+Uso:
+    python scripts/00_avance.py                     # corrida más reciente, refresca cada 5 s
+    python scripts/00_avance.py --intervalo 30
+    python scripts/00_avance.py output/current/eventos/20261018-101500-02_agrega-imagenes.jsonl
+    python scripts/00_avance.py --una-vez           # imprime el estado actual y sale
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+from eventos_pipeline import EVENTOS_DIR, Agregador, lineas_resumen
+
+INTERVALO = 5   # segundos entre refrescos
+
+
+def corrida_mas_reciente(carpeta: Path):
+    archivos = sorted(carpeta.glob("*.jsonl"), key=lambda p: p.stat().st_mtime) if carpeta.exists() else []
+    return archivos[-1] if archivos else None
+
+
+class Seguidor:
+    """Lee solo lo nuevo del archivo en cada pasada; una línea a medias espera a la siguiente."""
+
+    def __init__(self, ruta: Path):
+        self.ruta = ruta
+        self.posicion = 0
+        self.resto = ""
+        self.agregador = Agregador()
+
+    def leer(self):
+        with open(self.ruta, encoding="utf-8") as f:
+            f.seek(self.posicion)
+            texto = self.resto + f.read()
+            self.posicion = f.tell()
+        *lineas, self.resto = texto.split("\n")
+        for linea in lineas:
+            try:
+                self.agregador.agregar(json.loads(linea))
+            except json.JSONDecodeError:
+                continue
+
+
+def _duracion(segundos: float) -> str:
+    segundos = int(segundos)
+    return f"{segundos // 3600}h{segundos % 3600 // 60:02d}m{segundos % 60:02d}s"
+
+
+def pantalla(seguidor: Seguidor) -> list[str]:
+    a = seguidor.agregador
+    lineas = [f"{datetime.now():%Y-%m-%d %H:%M:%S}  {seguidor.ruta.name}"]
+    if a.inicio is None:
+        return lineas + ["  Sin eventos todavía."]
+    transcurrido = (time.time() if not a.terminada else a.ultimo) - a.inicio
+    avance = f"{a.hechos}/{a.total} ({a.hechos / a.total:.1%})" if a.total else str(a.hechos)
+    lineas.append(f"── {a.script} {'(terminada)' if a.terminada else ''}")
+    lineas.append(f"  Avance:       {avance}")
+    lineas.append(f"  Transcurrido: {_duracion(transcurrido)}")
+    velocidad = a.velocidad()
+    lineas.append(f"  Velocidad:    {velocidad * 60:.1f}/min (últimos 2 min)")
+    eta = a.eta()
+    if eta is not None and not a.terminada:
+        fin = datetime.fromtimestamp(time.time() + eta)
+        lineas.append(f"  ETA:          {_duracion(eta)} (≈ {fin:%H:%M})")
+    lineas.append("── Etapas")
+    return lineas + lineas_resumen(a.resumen())[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Avance y ETA de la corrida en curso.")
+    parser.add_argument("eventos", nargs="?", type=Path, help="archivo .jsonl (default: el más reciente)")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO,
+                        help="segundos entre refrescos (default: %(default)s)")
+    parser.add_argument("--una-vez", action="store_true", help="muestra el estado actual y sale")
+    args = parser.parse_args()
+
+    ruta = args.eventos
+    while ruta is None:
+        ruta = corrida_mas_reciente(EVENTOS_DIR)
+        if ruta is None:
+            if args.una_vez:
+                print(f"No hay corridas en {EVENTOS_DIR}")
+                return
+            print(f"Esperando eventos en {EVENTOS_DIR} ...")
+            time.sleep(args.intervalo)
+
+    seguidor = Seguidor(ruta)
+    try:
+        while True:
+            seguidor.leer()
+            if not args.una_vez:
+                print("\033[2J\033[H", end="")
+            print("\n".join(pantalla(seguidor)), flush=True)
+            if args.una_vez or seguidor.agregador.terminada:
+                return
+            time.sleep(args.intervalo)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,54 @@
+import argparse
+import codecs
+import json
+import os
 import unicodedata
+from datetime import datetime
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
+try:  # only needed for the optional --parquet output
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Converted file layout: one column per CsvRawRow field (src/lib/import/csv/types.ts),
+# typed with pandas nullable dtypes so a missing value stays <NA> (written as an empty
+# cell) instead of the literal "nan".
+SCHEMA: dict[str, str] = {
+    "nombre": "string",
+    "descripcion": "string",
+    "precio": "Float64",
+    "departamento": "string",
+    "categoria": "string",
+    "clave1": "string",
+    "clave2": "string",
+    "codigo_sat": "string",
+    "disponible": "boolean",
+    "destacado": "boolean",
+    "temporada": "boolean",
+}
+ORDERED_COLUMNS = list(SCHEMA)
+REQUIRED_COLUMNS = ["nombre", "precio", "departamento", "categoria", "clave1"]  # CSV_REQUIRED_COLUMNS
+SOURCE_ENCODINGS = ("utf-8-sig", "latin1")
+CHUNK_SIZE = 50_000       # filas por bloque en el modo --por-bloques
+SAMPLE_ROWS = 20_000      # filas usadas para elegir la columna de precio
+SAMPLE_BYTES = 1 << 20    # prefijo leido para detectar el encoding
+DEDUP_FILE = "productos_sin_conflictos.csv"
+CONFLICTS_FILE = "conflictos_sku.csv"
+CONFLICT_COLUMNS = ["fila", "clave1", "clave2", "nombre", "tipo", "severidad", "accion", "conflicto_con"]
+REJECTIONS_FILE = "rechazos_importacion.csv"
+REJECTION_COLUMNS = ["fila", "clave1", "nombre", "codigo", "campo", "valor", "detalle"]
+DELTA_KEY = "clave1"
+DELTA_FILES = {
+    "agregados": "productos_agregados.csv",
+    "modificados": "productos_modificados.csv",
+    "eliminados": "productos_eliminados.csv",
+}
+
 
 def normalize_column_name(name: str) -> str:
     """Normalize CSV headers to compare safely regardless of accents/BOM."""
@@ -12,27 +58,37 @@ def normalize_column_name(name: str) -> str:
 
 
 def safe_read_csv(path: str) -> pd.DataFrame:
-    """Try common encodings used in exports and return a DataFrame."""
-    for enc in ("utf-8-sig", "latin1"):
+    """Try common encodings used in exports and return a DataFrame of text columns.
+
+    dtype=str keeps keys as written (leading zeros, long barcodes) and matches the
+    chunked reader, which cannot infer types consistently across chunks."""
+    for enc in SOURCE_ENCODINGS:
         try:
-            return pd.read_csv(path, encoding=enc)
+            return pd.read_csv(path, encoding=enc, dtype=str)
         except UnicodeDecodeError:
             continue
-    return pd.read_csv(path)
+    return pd.read_csv(path, dtype=str)
 
 
 def parse_price(series: pd.Series) -> pd.Series:
-    cleaned = (
-        series.astype(str)
-        .str.replace(r"[\$,]", "", regex=True)
-        .str.strip()
-        .replace({"": "0", "nan": "0", "None": "0"})
-    )
-    return pd.to_numeric(cleaned, errors="coerce").fillna(0).round(2)
+    """Parse MXN price text (" $1,135.00 " → 1135.0) in one vectorized pass.
 
+    Each distinct text is cleaned and converted once and mapped back by its code:
+    a catalog repeats a few hundred prices over all its rows. Empty or non-numeric
+    text is <NA> (Float64) rather than 0, so it can be reported as a rejection."""
+    codes, uniques = pd.factorize(series)
+    cleaned = pd.Series(uniques, dtype="string").str.replace(r"[\s$,]", "", regex=True)
+    parsed = pd.to_numeric(cleaned, errors="coerce").astype("Float64").round(2)
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=series.index, name=series.name)
 
-def choose_price_column(df: pd.DataFrame, normalized_map: dict[str, str]) -> str:
-    """Pick the most reliable price source from known candidate columns."""
+
+def choose_price_column(
+    df: pd.DataFrame, normalized_map: dict[str, str], price_cache: dict[str, pd.Series] | None = None
+) -> str:
+    """Pick the most reliable price source from known candidate columns.
+
+    Parsed candidates are stored in price_cache (column → parsed prices) so the
+    chosen column is not parsed a second time by build_import_frame."""
     candidates: list[str] = []
     if "precio1" in normalized_map:
         candidates.append(normalized_map["precio1"])
@@ -47,8 +103,9 @@ def choose_price_column(df: pd.DataFrame, normalized_map: dict[str, str]) -> str
 
     best_col = candidates[0]
     best_non_zero = -1
+    price_cache = {} if price_cache is None else price_cache
     for col in candidates:
-        parsed = parse_price(df[col])
+        parsed = price_cache.setdefault(col, parse_price(df[col]))
         non_zero = int((parsed > 0).sum())
         if non_zero > best_non_zero:
             best_non_zero = non_zero
@@ -56,10 +113,8 @@ def choose_price_column(df: pd.DataFrame, normalized_map: dict[str, str]) -> str
     return best_col
 
 
-def convertir_inventario(archivo_origen: str, archivo_destino: str):
-    df_origen = safe_read_csv(archivo_origen)
-    df_origen.columns = df_origen.columns.str.strip()
-
+def resolve_columns(df_origen: pd.DataFrame) -> tuple[dict[str, str], str, dict[str, str]]:
+    """Map the logical fields to the raw headers of this export."""
     normalized_map = {normalize_column_name(col): col for col in df_origen.columns}
 
     required_keys = {
@@ -82,39 +137,469 @@ def convertir_inventario(archivo_origen: str, archivo_destino: str):
     if not sat_col:
         sat_col = "Unnamed: 15" if "Unnamed: 15" in df_origen.columns else df_origen.columns[-1]
 
-    price_col = choose_price_column(df_origen, normalized_map)
+    return resolved, sat_col, normalized_map
+
+
+def _text(series: pd.Series) -> pd.Series:
+    """Stripped nullable text; blank cells become <NA>."""
+    text = series.astype("string").str.strip()
+    return text.mask(text.eq(""))
 
-    df_final = pd.DataFrame()
-    df_final["nombre"] = df_origen[resolved["descripcion"]].astype(str).str.strip()
+
+def build_import_frame(
+    df_origen: pd.DataFrame,
+    resolved: dict[str, str],
+    sat_col: str,
+    price_col: str,
+    parsed_price: pd.Series | None = None,
+) -> pd.DataFrame:
+    """Convert raw inventory rows to the import layout, typed as SCHEMA.
+
+    parsed_price is the already parsed price_col (see choose_price_column), if any."""
+    df_final = pd.DataFrame(index=df_origen.index)
+    df_final["nombre"] = _text(df_origen[resolved["descripcion"]])
     df_final["descripcion"] = df_final["nombre"]
-    df_final["precio"] = parse_price(df_origen[price_col])
-    df_final["departamento"] = df_origen[resolved["departamento"]].astype(str).str.strip()
-    df_final["categoria"] = df_origen[resolved["categoria"]].astype(str).str.strip()
-    df_final["clave1"] = df_origen[resolved["clave1"]].astype(str).str.strip()
-    df_final["clave2"] = df_origen[resolved["clave2"]].astype(str).str.strip()
-    df_final["codigo_sat"] = df_origen[sat_col].fillna("").astype(str).str.strip()
-    df_final["disponible"] = (
-        df_origen[resolved["inventariable"]].fillna("").astype(str).str.upper().str.strip() == "SI"
-    )
+    df_final["precio"] = parse_price(df_origen[price_col]) if parsed_price is None else parsed_price
+    df_final["departamento"] = _text(df_origen[resolved["departamento"]])
+    df_final["categoria"] = _text(df_origen[resolved["categoria"]])
+    df_final["clave1"] = _text(df_origen[resolved["clave1"]])
+    df_final["clave2"] = _text(df_origen[resolved["clave2"]])
+    df_final["codigo_sat"] = _text(df_origen[sat_col])
+    df_final["disponible"] = _text(df_origen[resolved["inventariable"]]).str.upper().eq("SI").fillna(False)
     df_final["destacado"] = False
     df_final["temporada"] = False
+    return df_final[ORDERED_COLUMNS].astype(SCHEMA)
+
+
+def find_rejections(df_final: pd.DataFrame, raw_price: pd.Series, first_row: int) -> pd.DataFrame:
+    """Rows the web importer will reject, with the same codes and order as parseCsv.ts:
+    MISSING_FIELD (all empty required fields in one issue), then INVALID_PRICE.
+
+    Codes are decided from df_final, i.e. what is written: an unparseable price is
+    written empty, so parseCsv.ts reports it as MISSING_FIELD (precio). raw_price is
+    the source price text, shown in `valor` so the report says what the source had;
+    first_row is the CSV line of df_final's first row, as in SkuIndex.check."""
+    raw_price = _text(raw_price)
+    missing = pd.DataFrame({col: df_final[col].isna() for col in REQUIRED_COLUMNS})
+    any_missing = missing.any(axis=1).to_numpy()
+    invalid_price = ~any_missing & ~df_final["precio"].gt(0).fillna(False).to_numpy()
+
+    filas = first_row + np.arange(len(df_final))
+    rechazos = []
+    for i in np.flatnonzero(any_missing):
+        campos = [col for col in REQUIRED_COLUMNS if missing.iat[i, missing.columns.get_loc(col)]]
+        valor = raw_price.iat[i] if "precio" in campos and not pd.isna(raw_price.iat[i]) else ""
+        rechazos.append((filas[i], df_final["clave1"].iat[i], df_final["nombre"].iat[i], "MISSING_FIELD",
+                         ";".join(campos), valor, f"Campos obligatorios vacíos: {', '.join(campos)}"))
+    for i in np.flatnonzero(invalid_price):
+        valor = raw_price.iat[i]
+        rechazos.append((filas[i], df_final["clave1"].iat[i], df_final["nombre"].iat[i], "INVALID_PRICE",
+                         "precio", valor, f'Precio inválido: "{valor}". Debe ser un número mayor a 0.'))
+    rechazos.sort(key=lambda r: r[0])
+    return pd.DataFrame(rechazos, columns=REJECTION_COLUMNS).astype({"clave1": "string", "nombre": "string"})
+
+
+def write_csv_atomic(df: pd.DataFrame, path: str | Path):
+    """Write to a temp file and rename, so readers never see a half-written CSV."""
+    tmp = f"{path}.tmp"
+    df.to_csv(tmp, index=False, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# ─── Parquet opcional (--parquet, requiere pyarrow) ─────────────────────────
+_ARROW_TYPES = {"string": "string", "Float64": "float64", "boolean": "bool_"}
+
+
+def arrow_schema():
+    """SCHEMA as an Arrow schema, so every chunk is written with the same types."""
+    return pa.schema([(col, getattr(pa, _ARROW_TYPES[dtype])()) for col, dtype in SCHEMA.items()])
+
+
+def parquet_path(archivo_destino: str | Path) -> Path:
+    return Path(archivo_destino).with_suffix(".parquet")
+
+
+class ParquetChunkWriter:
+    """Appends typed frames to one Parquet file through a temp file renamed on close."""
 
-    ordered_cols = [
-        "nombre",
-        "descripcion",
-        "precio",
-        "departamento",
-        "categoria",
-        "clave1",
-        "clave2",
-        "codigo_sat",
-        "disponible",
-        "destacado",
-        "temporada",
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.tmp = f"{self.path}.tmp"
+        self.schema = arrow_schema()
+        self.writer = pq.ParquetWriter(self.tmp, self.schema)
+
+    def write(self, df: pd.DataFrame):
+        self.writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        self.writer.close()
+        os.replace(self.tmp, self.path)
+
+
+# ─── Delta incremental contra el snapshot anterior ──────────────────────────
+def _as_snapshot_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Render values the way they are written to CSV, so old and new compare as text."""
+    return df.astype(object).where(df.notna(), "").astype(str)
+
+
+def _unique_by_key(df: pd.DataFrame, label: str) -> pd.DataFrame:
+    duplicated = df[DELTA_KEY].duplicated(keep="first")
+    if duplicated.any():
+        print(
+            f"[WARN] {label}: {int(duplicated.sum())} filas con {DELTA_KEY} repetida; "
+            "el delta usa la primera aparición."
+        )
+    return df[~duplicated].set_index(DELTA_KEY, drop=False)
+
+
+def compute_delta(df_anterior: pd.DataFrame, df_nuevo: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Compare two converted snapshots keyed by clave1.
+
+    Returns added/changed/removed frames; `modificados` carries a
+    `campos_cambiados` column listing the fields that differ (e.g. "precio;disponible")."""
+    anterior = _unique_by_key(_as_snapshot_text(df_anterior), "snapshot anterior")
+    nuevo = _unique_by_key(_as_snapshot_text(df_nuevo), "inventario nuevo")
+
+    claves_anteriores = anterior.index
+    claves_nuevas = nuevo.index
+    agregados = nuevo.loc[claves_nuevas.difference(claves_anteriores, sort=False)]
+    eliminados = anterior.loc[claves_anteriores.difference(claves_nuevas, sort=False)]
+
+    comunes = claves_nuevas.intersection(claves_anteriores, sort=False)
+    compare_cols = [c for c in ORDERED_COLUMNS if c != DELTA_KEY and c in anterior.columns]
+    antes = anterior.loc[comunes, compare_cols]
+    despues = nuevo.loc[comunes, compare_cols]
+    diferencias = antes.ne(despues)
+    cambiadas = diferencias.any(axis=1)
+
+    modificados = nuevo.loc[comunes[cambiadas.to_numpy()]].copy()
+    modificados["campos_cambiados"] = [
+        ";".join(col for col, cambio in fila.items() if cambio)
+        for _, fila in diferencias[cambiadas].iterrows()
     ]
-    df_final = df_final[ordered_cols]
+    return {
+        "agregados": agregados.reset_index(drop=True),
+        "modificados": modificados.reset_index(drop=True),
+        "eliminados": eliminados.reset_index(drop=True),
+    }
+
+
+def write_delta(
+    delta: dict[str, pd.DataFrame], carpeta_delta: Path, archivo_anterior: str, archivo_origen: str
+) -> dict:
+    carpeta_delta.mkdir(parents=True, exist_ok=True)
+    for nombre, archivo in DELTA_FILES.items():
+        write_csv_atomic(delta[nombre], carpeta_delta / archivo)
+
+    campos: dict[str, int] = {}
+    for lista in delta["modificados"].get("campos_cambiados", []):
+        for campo in lista.split(";"):
+            campos[campo] = campos.get(campo, 0) + 1
+
+    resumen = {
+        "generado_en": datetime.now().isoformat(timespec="seconds"),
+        "origen": archivo_origen,
+        "snapshot_anterior": archivo_anterior,
+        "agregados": len(delta["agregados"]),
+        "modificados": len(delta["modificados"]),
+        "eliminados": len(delta["eliminados"]),
+        "campos_modificados": dict(sorted(campos.items(), key=lambda kv: -kv[1])),
+    }
+    tmp = carpeta_delta / "resumen_delta.json.tmp"
+    tmp.write_text(json.dumps(resumen, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, carpeta_delta / "resumen_delta.json")
+    return resumen
+
+
+def load_snapshot(path: str) -> pd.DataFrame:
+    """Previous converted file, read as text (it was written by this script)."""
+    return pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8")
+
+
+# ─── Indice de unicidad de SKU (clave1 / clave2) ────────────────────────────
+def load_db_snapshot(path: str) -> tuple[set[str], dict[str, str]]:
+    """Existing products exported locally (columns `sku` and optionally `barcode`).
+
+    Returns (skus, barcode → sku). E.g. from the SQL editor:
+    `select sku, barcode from products` → Download CSV."""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    df.columns = [normalize_column_name(c) for c in df.columns]
+    if "sku" not in df.columns:
+        raise KeyError(f"El snapshot de BD {path} no tiene columna 'sku'.")
+    skus = {sku.strip() for sku in df["sku"] if sku.strip()}
+    barcodes = {}
+    if "barcode" in df.columns:
+        for sku, barcode in zip(df["sku"], df["barcode"]):
+            if barcode.strip():
+                barcodes.setdefault(barcode.strip(), sku.strip())
+    return skus, barcodes
+
+
+def _clean_key(value) -> str:
+    if value is None or pd.isna(value):
+        return ""
+    value = str(value).strip()
+    return "" if value.lower() == "nan" else value
+
+
+class SkuIndex:
+    """Hash index over clave1/clave2, fed frame by frame so chunked runs stay one pass.
 
-    df_final.to_csv(archivo_destino, index=False, encoding="utf-8")
+    clave1 is the importer's idempotency key (products.sku, UNIQUE): a repeated
+    clave1 is an error and only its first occurrence is kept. Rows whose clave1
+    already exists in the DB snapshot are skipped by the web importer
+    (DUPLICATE_SKU), so they are dropped too unless keep_existing=True (e.g. for
+    a loader that upserts). clave2 (barcode) is not unique in the DB: shared
+    barcodes are reported as warnings only."""
+
+    def __init__(self, db_skus: set[str] | None = None, db_barcodes: dict[str, str] | None = None,
+                 keep_existing: bool = False):
+        self.db_skus = db_skus or set()
+        self.db_barcodes = db_barcodes or {}
+        self.keep_existing = keep_existing
+        self.first_row_by_sku: dict[str, int] = {}
+        self.first_sku_by_barcode: dict[str, tuple[str, int]] = {}
+        self.conflicts: list[dict] = []
+
+    def _report(self, fila, clave1, clave2, nombre, tipo, severidad, accion, conflicto_con):
+        self.conflicts.append({
+            "fila": fila, "clave1": clave1, "clave2": clave2, "nombre": nombre, "tipo": tipo,
+            "severidad": severidad, "accion": accion, "conflicto_con": conflicto_con,
+        })
+
+    def check(self, df_final: pd.DataFrame, first_row: int) -> pd.Series:
+        """Index the frame and return a keep-mask. first_row is the CSV line of df_final's
+        first row (2 = first line after the header, the importer's sourceRow)."""
+        keep = []
+        for offset, (nombre, clave1, clave2) in enumerate(
+            zip(df_final["nombre"], df_final["clave1"], df_final["clave2"])
+        ):
+            fila = first_row + offset
+            clave1, clave2 = _clean_key(clave1), _clean_key(clave2)
+            if not clave1:
+                keep.append(True)   # el importador la rechaza como MISSING_FIELD
+                continue
+
+            if clave1 in self.first_row_by_sku:
+                self._report(fila, clave1, clave2, nombre, "clave1_duplicada", "error", "omitida",
+                             self.first_row_by_sku[clave1])
+                keep.append(False)
+                continue
+            self.first_row_by_sku[clave1] = fila
+
+            row_keep = True
+            if clave1 in self.db_skus:
+                row_keep = self.keep_existing
+                self._report(fila, clave1, clave2, nombre, "existe_en_bd", "aviso",
+                             "conservada" if row_keep else "omitida", "bd")
+
+            if clave2:
+                previous = self.first_sku_by_barcode.get(clave2)
+                if previous is None:
+                    self.first_sku_by_barcode[clave2] = (clave1, fila)
+                elif previous[0] != clave1:
+                    self._report(fila, clave1, clave2, nombre, "clave2_compartida", "aviso",
+                                 "conservada", previous[1])
+                db_sku = self.db_barcodes.get(clave2)
+                if db_sku and db_sku != clave1:
+                    self._report(fila, clave1, clave2, nombre, "clave2_en_bd", "aviso",
+                                 "conservada", f"bd:{db_sku}")
+            keep.append(row_keep)
+        return pd.Series(keep, index=df_final.index, dtype=bool)
+
+    def counts(self) -> dict[str, int]:
+        counts: dict[str, int] = {}
+        for conflict in self.conflicts:
+            counts[conflict["tipo"]] = counts.get(conflict["tipo"], 0) + 1
+        return counts
+
+    def write_report(self, path: str | Path):
+        write_csv_atomic(pd.DataFrame(self.conflicts, columns=CONFLICT_COLUMNS), path)
+
+    def print_summary(self, filas_dedup: int, archivo_dedup: str | Path, archivo_conflictos: str | Path):
+        counts = self.counts()
+        detalle = ", ".join(f"{tipo} ({n})" for tipo, n in sorted(counts.items())) or "ninguno"
+        print(
+            f"Unicidad de SKU: {len(self.first_row_by_sku)} clave1 distintas. "
+            f"Conflictos: {detalle}. "
+            f"Filas importables: {filas_dedup} en {archivo_dedup}. "
+            f"Reporte: {archivo_conflictos}"
+        )
+
+
+def _validation_paths(archivo_destino: str) -> tuple[Path, Path]:
+    carpeta = Path(archivo_destino).parent
+    return carpeta / DEDUP_FILE, carpeta / CONFLICTS_FILE
+
+
+def write_rejections(rechazos: pd.DataFrame, archivo_destino: str) -> Path:
+    path = Path(archivo_destino).parent / REJECTIONS_FILE
+    write_csv_atomic(rechazos, path)
+    return path
+
+
+def print_rejections(rechazos: pd.DataFrame, path: Path):
+    counts = rechazos["codigo"].value_counts()
+    detalle = ", ".join(f"{codigo} ({n})" for codigo, n in sorted(counts.items())) or "ninguno"
+    print(f"Rechazos del importador: {len(rechazos)} filas [{detalle}]. Reporte: {path}")
+
+
+def _new_index(snapshot_bd: str | None, keep_existing: bool) -> SkuIndex:
+    db_skus, db_barcodes = load_db_snapshot(snapshot_bd) if snapshot_bd else (set(), {})
+    return SkuIndex(db_skus, db_barcodes, keep_existing=keep_existing)
+
+
+# ─── Conversion por bloques (memoria constante) ─────────────────────────────
+def detect_encoding(path: str, sample_bytes: int = SAMPLE_BYTES) -> str:
+    """Pick the first encoding that decodes a prefix of the file."""
+    with open(path, "rb") as f:
+        prefix = f.read(sample_bytes)
+    for enc in SOURCE_ENCODINGS:
+        try:
+            # final=False: a multi-byte char cut at the end of the sample is not an error
+            codecs.getincrementaldecoder(enc)().decode(prefix, final=False)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return SOURCE_ENCODINGS[-1]
+
+
+def _convert_chunks(
+    archivo_origen: str, tmp: str, tmp_dedup: str, indice: SkuIndex, encoding: str, chunk_size: int,
+    sample_rows: int, parquet: ParquetChunkWriter | None = None,
+) -> tuple[int, int, int, str, pd.DataFrame]:
+    df_muestra = pd.read_csv(archivo_origen, encoding=encoding, nrows=sample_rows, dtype=str)
+    raw_columns = list(df_muestra.columns)
+    df_muestra.columns = df_muestra.columns.str.strip()
+
+    resolved, sat_col, normalized_map = resolve_columns(df_muestra)
+    price_col = choose_price_column(df_muestra, normalized_map)
+
+    # Solo se leen las columnas que usa la conversion (por posicion: los headers
+    # vacios no tienen un nombre estable para usecols)
+    stripped = list(df_muestra.columns)
+    needed = set(resolved.values()) | {sat_col, price_col}
+    usecols = [i for i, col in enumerate(stripped) if col in needed]
+
+    filas = 0
+    filas_dedup = 0
+    non_zero_prices = 0
+    rechazos = []
+    # dtype=str: la inferencia por bloque haria que la misma clave saliera como
+    # texto en un bloque y como float en otro
+    reader = pd.read_csv(archivo_origen, encoding=encoding, chunksize=chunk_size, dtype=str, usecols=usecols)
+    with open(tmp, "w", encoding="utf-8", newline="") as salida, \
+            open(tmp_dedup, "w", encoding="utf-8", newline="") as salida_dedup:
+        for i, chunk in enumerate(reader):
+            chunk.columns = [raw_columns[j].strip() for j in usecols]
+            df_final = build_import_frame(chunk, resolved, sat_col, price_col)
+            df_final.to_csv(salida, index=False, header=(i == 0))
+            if parquet is not None:
+                parquet.write(df_final)
+            keep = indice.check(df_final, first_row=filas + 2)
+            df_final[keep].to_csv(salida_dedup, index=False, header=(i == 0))
+            rechazos.append(find_rejections(df_final, chunk[price_col], first_row=filas + 2))
+            filas += len(df_final)
+            filas_dedup += int(keep.sum())
+            non_zero_prices += int((df_final["precio"] > 0).sum())
+    return filas, filas_dedup, non_zero_prices, price_col, pd.concat(rechazos, ignore_index=True)
+
+
+def convertir_inventario_por_bloques(
+    archivo_origen: str,
+    archivo_destino: str,
+    chunk_size: int = CHUNK_SIZE,
+    sample_rows: int = SAMPLE_ROWS,
+    snapshot_bd: str | None = None,
+    conservar_existentes: bool = False,
+    parquet: bool = False,
+):
+    """Same output as convertir_inventario, reading and writing CHUNK_SIZE rows at a time.
+
+    The encoding comes from a sampled prefix and the price column from the first
+    sample_rows rows, so memory stays bounded by the chunk size, not the file."""
+    encoding = detect_encoding(archivo_origen)
+    archivo_dedup, archivo_conflictos = _validation_paths(archivo_destino)
+    tmp = f"{archivo_destino}.tmp"
+    tmp_dedup = f"{archivo_dedup}.tmp"
+    encodings = [encoding] + [enc for enc in SOURCE_ENCODINGS if enc != encoding]
+    for enc in encodings:
+        writer = ParquetChunkWriter(parquet_path(archivo_destino)) if parquet else None
+        try:
+            indice = _new_index(snapshot_bd, conservar_existentes)
+            filas, filas_dedup, non_zero_prices, price_col, rechazos = _convert_chunks(
+                archivo_origen, tmp, tmp_dedup, indice, enc, chunk_size, sample_rows, writer
+            )
+            break
+        except UnicodeDecodeError:
+            # Un byte invalido despues de la muestra: se reintenta completo con el siguiente
+            # (latin1 decodifica cualquier byte, asi que el ciclo siempre termina en break)
+            print(f"[WARN] {enc} fallo despues de la muestra; reintentando con otro encoding.")
+            if writer is not None:
+                writer.writer.close()
+    os.replace(tmp, archivo_destino)
+    os.replace(tmp_dedup, archivo_dedup)
+    if writer is not None:
+        writer.close()
+    indice.write_report(archivo_conflictos)
+    archivo_rechazos = write_rejections(rechazos, archivo_destino)
+    print(
+        f"Conversion completada (por bloques de {chunk_size}). Filas: {filas}. "
+        f"Precios > 0: {non_zero_prices}. "
+        f"Columna de precio usada: {price_col}. "
+        f"Encoding: {enc}. "
+        f"Archivo: {archivo_destino}"
+    )
+    indice.print_summary(filas_dedup, archivo_dedup, archivo_conflictos)
+    print_rejections(rechazos, archivo_rechazos)
+    if writer is not None:
+        print(f"Parquet: {writer.path}")
+
+
+def convertir_inventario(
+    archivo_origen: str,
+    archivo_destino: str,
+    incremental: bool = False,
+    archivo_anterior: str | None = None,
+    carpeta_delta: str | None = None,
+    snapshot_bd: str | None = None,
+    conservar_existentes: bool = False,
+    parquet: bool = False,
+):
+    df_origen = safe_read_csv(archivo_origen)
+    df_origen.columns = df_origen.columns.str.strip()
+
+    resolved, sat_col, normalized_map = resolve_columns(df_origen)
+    price_cache: dict[str, pd.Series] = {}
+    price_col = choose_price_column(df_origen, normalized_map, price_cache)
+    df_final = build_import_frame(df_origen, resolved, sat_col, price_col, price_cache[price_col])
+    rechazos = find_rejections(df_final, df_origen[price_col], first_row=2)
+
+    # El snapshot anterior se lee antes de sobrescribir el destino
+    resumen = None
+    if incremental:
+        archivo_anterior = archivo_anterior or archivo_destino
+        if os.path.exists(archivo_anterior):
+            df_anterior = load_snapshot(archivo_anterior)
+        else:
+            print(f"[WARN] Sin snapshot anterior en {archivo_anterior}: todo el inventario cuenta como agregado.")
+            df_anterior = pd.DataFrame(columns=ORDERED_COLUMNS)
+        carpeta = Path(carpeta_delta) if carpeta_delta else Path(archivo_destino).parent / "delta"
+        delta = compute_delta(df_anterior, df_final)
+        resumen = write_delta(delta, carpeta, str(archivo_anterior), str(archivo_origen))
+
+    indice = _new_index(snapshot_bd, conservar_existentes)
+    keep = indice.check(df_final, first_row=2)
+    archivo_dedup, archivo_conflictos = _validation_paths(archivo_destino)
+
+    write_csv_atomic(df_final, archivo_destino)
+    write_csv_atomic(df_final[keep], archivo_dedup)
+    indice.write_report(archivo_conflictos)
+    archivo_rechazos = write_rejections(rechazos, archivo_destino)
+    if parquet:
+        writer = ParquetChunkWriter(parquet_path(archivo_destino))
+        writer.write(df_final)
+        writer.close()
     non_zero_prices = int((df_final["precio"] > 0).sum())
     print(
         f"Conversion completada. Filas: {len(df_final)}. "
@@ -122,6 +607,17 @@ def convertir_inventario(archivo_origen: str, archivo_destino: str):
         f"Columna de precio usada: {price_col}. "
         f"Archivo: {archivo_destino}"
     )
+    indice.print_summary(int(keep.sum()), archivo_dedup, archivo_conflictos)
+    print_rejections(rechazos, archivo_rechazos)
+    if parquet:
+        print(f"Parquet: {parquet_path(archivo_destino)}")
+    if resumen:
+        campos = ", ".join(f"{campo} ({n})" for campo, n in resumen["campos_modificados"].items())
+        print(
+            f"Delta: {resumen['agregados']} agregados, {resumen['modificados']} modificados"
+            f"{f' [{campos}]' if campos else ''}, {resumen['eliminados']} eliminados. "
+            f"Carpeta: {carpeta}"
+        )
 
 
 if __name__ == "__main__":
@@ -129,4 +625,63 @@ if __name__ == "__main__":
     base_dir = script_dir.parent
     archivo_origen = base_dir / "source" / "inventory" / "Inventario_Productos.csv"
     archivo_destino = base_dir / "output" / "current" / "productos_listos_para_importar.csv"
-    convertir_inventario(str(archivo_origen), str(archivo_destino))
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="Convierte el inventario al formato de importacion.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="compara contra el snapshot anterior (por clave1) y escribe agregados/modificados/eliminados",
+    )
+    parser.add_argument(
+        "--anterior",
+        help="snapshot convertido con el que comparar (default: el destino actual antes de sobrescribirlo)",
+    )
+    parser.add_argument("--delta-dir", help="carpeta de salida del delta (default: output/current/delta)")
+    parser.add_argument(
+        "--por-bloques",
+        action="store_true",
+        help="convierte en bloques con memoria constante (exportaciones muy grandes; no combina con --incremental)",
+    )
+    parser.add_argument(
+        "--tamano-bloque", type=int, default=CHUNK_SIZE, help="filas por bloque (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--snapshot-bd",
+        help="CSV local con los products.sku (y barcode) existentes, para detectar choques contra la BD",
+    )
+    parser.add_argument(
+        "--conservar-existentes",
+        action="store_true",
+        help="con --snapshot-bd, mantiene en el archivo importable los SKUs que ya existen en la BD",
+    )
+    parser.add_argument(
+        "--parquet",
+        action="store_true",
+        help="ademas del CSV escribe productos_listos_para_importar.parquet con el esquema tipado (requiere pyarrow)",
+    )
+    args = parser.parse_args()
+    if args.parquet and pa is None:
+        parser.error("--parquet requiere pyarrow (pip install pyarrow)")
+
+    if args.por_bloques:
+        if args.incremental:
+            parser.error("--por-bloques no se combina con --incremental")
+        convertir_inventario_por_bloques(
+            str(archivo_origen),
+            str(archivo_destino),
+            chunk_size=args.tamano_bloque,
+            snapshot_bd=args.snapshot_bd,
+            conservar_existentes=args.conservar_existentes,
+            parquet=args.parquet,
+        )
+    else:
+        convertir_inventario(
+            str(archivo_origen),
+            str(archivo_destino),
+            incremental=args.incremental,
+            archivo_anterior=args.anterior,
+            carpeta_delta=args.delta_dir,
+            snapshot_bd=args.snapshot_bd,
+            conservar_existentes=args.conservar_existentes,
+            parquet=args.parquet,
+        )
@@ -1,19 +1,45 @@
-import pandas as pd
-import time
-import random
-import requests
+"""
+Genera descripciones (Ollama) y descarga imágenes locales por SKU.
+
+Uso:
+    python scripts/02_agrega-imagenes.py               # 1 worker (WORKERS)
+    python scripts/02_agrega-imagenes.py --workers 4   # pool de 4 workers (navegadores headless)
+    python scripts/02_agrega-imagenes.py --busqueda navegador    # sin el modo HTTP
+    python scripts/02_agrega-imagenes.py --probar-html Bing pagina.html   # parser sobre una página guardada
+"""
+import argparse
+import hashlib
+import json
 import os
+import queue
+import random
+import threading
+import time
 import base64
+import re
+import shutil
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from html import unescape
+from urllib.parse import quote_plus
+
+import pandas as pd
+import requests
 import ollama
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 
+from estado_pipeline import DESC_OK, DESC_PENDIENTE, EstadoPipeline, claves_imagen
+from eventos_pipeline import Instrumentacion, lineas_resumen
+
 # ─── Configuración de Ollama ─────────────────────────────────────────────────
 OLLAMA_MODEL = 'llama3.2'   # requiere: ollama pull llama3.2
+LLM_CONCURRENCIA = 2        # peticiones simultáneas al servidor Ollama (--llm-workers N)
 
 # ─── Rutas ──────────────────────────────────────────────────────────────────
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -24,166 +50,724 @@ CSV_INPUT = os.path.join(CURRENT_OUTPUT_DIR, "productos_listos_para_importar.csv
 CSV_OUTPUT = os.path.join(CURRENT_OUTPUT_DIR, "inventario_actualizado.csv")
 # Mapeo SKU → imagen local → URL de Supabase (se llena después de subir)
 CSV_IMAGENES = os.path.join(CURRENT_OUTPUT_DIR, "imagenes_map.csv")
-os.makedirs(FOLDER, exist_ok=True)
+# Progreso por SKU (imagen, descripción, URL de Supabase); los CSV se exportan de aquí
+ESTADO_DB = os.path.join(CURRENT_OUTPUT_DIR, "estado_pipeline.sqlite3")
+# Descripciones ya generadas, por hash de (modelo, prompt, nombre, categoría)
+CACHE_DESC = os.path.join(CURRENT_OUTPUT_DIR, "cache_descripciones.jsonl")
+# Imágenes ya descargadas, por contenido; el índice EAN/nombre → archivo vive en el estado
+CACHE_IMG_DIR = os.path.join(CURRENT_OUTPUT_DIR, "cache_imagenes")
 
 # ─── Parámetros del batch ────────────────────────────────────────────────────
-INICIO = 0      # índice 0-based — ajustar para reanudar si hay corrida parcial
+# La reanudación es automática (estado_pipeline.sqlite3); INICIO/LIMITE solo acotan la ventana
+INICIO = 0      # índice 0-based de la primera fila a considerar
 LIMITE = None   # None = todos los productos restantes
 FORZAR_DESC = False  # True = regenera descripciones aunque ya existan en CSV previo
+WORKERS = 1     # workers en paralelo (--workers N); con más de 1 el navegador es headless
+BUSQUEDA = "http"   # "http": HTML por HTTP y navegador solo de respaldo; "navegador": siempre Selenium
+HEADLESS = False  # True = corre sin ventana aunque WORKERS sea 1
 
 # ─── Navegador ─────────────────────────────────────────────────────────────
-options = webdriver.ChromeOptions()
-options.add_argument('--lang=es-MX,es')
-options.add_argument('--disable-blink-features=AutomationControlled')
-options.add_experimental_option('excludeSwitches', ['enable-automation'])
-options.add_experimental_option('useAutomationExtension', False)
-# options.add_argument('--headless=new')  # descomenta para correr sin ventana
-driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-driver.set_window_size(1280, 900)
+@lru_cache(maxsize=1)
+def _ruta_chromedriver():
+    # Una sola descarga/verificación aunque varios workers arranquen a la vez
+    return ChromeDriverManager().install()
+
+_lock_chromedriver = threading.Lock()
+
+def crear_driver(headless=HEADLESS):
+    """Crea un Chrome independiente; cada worker del pool usa el suyo."""
+    options = webdriver.ChromeOptions()
+    options.add_argument('--lang=es-MX,es')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_experimental_option('excludeSwitches', ['enable-automation'])
+    options.add_experimental_option('useAutomationExtension', False)
+    if headless:
+        options.add_argument('--headless=new')
+    with _lock_chromedriver:
+        ruta = _ruta_chromedriver()
+    driver = webdriver.Chrome(service=Service(ruta), options=options)
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    driver.set_window_size(1280, 900)
+    return driver
 
 # ─── Fuentes de imagen (orden de preferencia) ────────────────────────────────
 # Bing raramente muestra CAPTCHA. Google queda como último recurso.
+# Las URLs base se pueden apuntar a un servidor local (HG_BING_URL / HG_GOOGLE_URL)
+# que sirva páginas de resultados de prueba.
+BING_URL   = os.environ.get("HG_BING_URL", "https://www.bing.com/images/search")
+GOOGLE_URL = os.environ.get("HG_GOOGLE_URL", "https://www.google.com/search")
+
+# ─── Búsqueda por HTTP (sin navegador) ───────────────────────────────────────
+# La página de resultados se descarga como HTML y las URLs de las miniaturas se
+# sacan con expresiones regulares; el navegador queda como respaldo para cuando
+# el HTML no trae candidatos (cambio de marcado, página armada con JS, etc.).
+TIMEOUT_BUSQUEDA_HTTP = 10
+HEADERS_BUSQUEDA = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "es-MX,es;q=0.9",
+}
+
+_RE_BING_ENLACE = re.compile(r'<a\b[^>]*\bclass="iusc\b[^>]*>')
+_RE_BING_IMG = re.compile(r'<img\b[^>]*\bclass="mimg\b[^>]*>')
+_RE_GOOGLE_IMG = re.compile(r'<img\b[^>]*\bsrc="[^"]*[?&](?:amp;)?q=tbn:[^"]*"[^>]*>')
+
+def _atributo(etiqueta, nombre):
+    m = re.search(rf'\s{nombre}="([^"]*)"', etiqueta)
+    return unescape(m.group(1)) if m else ""
+
+def _sin_repetidos(urls):
+    return list(dict.fromkeys(u for u in urls if u))
+
+def extraer_candidatos_bing(pagina):
+    """Miniaturas de los resultados de Bing Imágenes: el JSON del atributo `m` de
+    cada `a.iusc` (turl) y, si no hay, el data-src/src de `img.mimg` (sin los GIF
+    de relleno de la carga diferida)."""
+    urls = []
+    for etiqueta in _RE_BING_ENLACE.findall(pagina):
+        try:
+            urls.append(json.loads(_atributo(etiqueta, "m")).get("turl", ""))
+        except ValueError:
+            continue
+    if not urls:
+        urls = [_atributo(e, "data-src") or _atributo(e, "src") for e in _RE_BING_IMG.findall(pagina)]
+    return _sin_repetidos(u for u in urls if u.startswith(("http", "data:image")) and not u.startswith("data:image/gif"))
+
+def extraer_candidatos_google(pagina):
+    """Miniaturas de la versión HTML básica de Google Imágenes (src con q=tbn:)."""
+    return _sin_repetidos(_atributo(e, "src") for e in _RE_GOOGLE_IMG.findall(pagina))
+
+# Ritmo por fuente (token bucket compartido por todos los workers):
+#   tasa_inicial / tasa_min / tasa_max  búsquedas por segundo
+#   rafaga               búsquedas que se pueden hacer seguidas con el bucket lleno
+#   latencia_objetivo    segundos; por debajo la tasa sube `incremento`, por encima baja ×`reduccion_lenta`
+#   reduccion            factor de la tasa tras un timeout, CAPTCHA o error
+#   jitter               fracción aleatoria que se suma a cada espera
+# Circuit breaker por fuente:
+#   fallos               timeouts/errores seguidos que abren el circuito (un CAPTCHA lo abre de inmediato)
+#   enfriamiento         segundos con el circuito abierto; se duplica en cada reapertura hasta enfriamiento_max
+# Mientras una fuente está abierta, todo el tráfico va a la siguiente.
 FUENTES = [
     {
         "nombre": "Bing",
-        "url":    lambda q: f"https://www.bing.com/images/search?q={q}&form=HDRSC2",
+        "url":    lambda q: f"{BING_URL}?q={quote_plus(q)}&form=HDRSC2",
         "selectores": ["img.mimg", "a.iusc img", ".iuscp img"],
+        "extraer_html": extraer_candidatos_bing,
+        "captcha": ["captcha", "/challenge"],
+        "ritmo": {
+            "tasa_inicial": 0.25, "tasa_min": 0.05, "tasa_max": 1.0, "rafaga": 2,
+            "latencia_objetivo": 4.0, "incremento": 0.02, "reduccion": 0.5,
+            "reduccion_lenta": 0.9, "jitter": 0.3,
+        },
+        "circuito": {"fallos": 3, "enfriamiento": 120.0, "enfriamiento_max": 1800.0},
     },
     {
         "nombre": "Google",
-        "url":    lambda q: f"https://www.google.com/search?q={q}&tbm=isch",
+        "url":    lambda q: f"{GOOGLE_URL}?q={quote_plus(q)}&tbm=isch",
         "selectores": ["img.Q4LuWd", "img.YQ4gaf", "div[data-ri] img", "g-img img"],
+        "extraer_html": extraer_candidatos_google,
+        "captcha": ["/sorry/", "recaptcha", "unusual traffic", "tráfico inusual"],
+        "ritmo": {
+            "tasa_inicial": 0.125, "tasa_min": 0.02, "tasa_max": 0.25, "rafaga": 1,
+            "latencia_objetivo": 4.0, "incremento": 0.01, "reduccion": 0.5,
+            "reduccion_lenta": 0.9, "jitter": 0.3,
+        },
+        "circuito": {"fallos": 3, "enfriamiento": 300.0, "enfriamiento_max": 3600.0},
     },
 ]
 
-def _pausa_humana(min_s=2.0, max_s=5.0):
-    time.sleep(random.uniform(min_s, max_s))
+class LimitadorFuente:
+    """Token bucket con tasa adaptativa (AIMD) para una fuente.
+
+    Lo comparten todos los workers: la fuente ve el tráfico sumado, así que el
+    ritmo también es uno solo. Cada búsqueda reserva un token; si no hay, la
+    espera se calcula con la tasa actual y se duerme fuera del lock."""
+
+    def __init__(self, nombre, tasa_inicial, tasa_min, tasa_max, rafaga=1, latencia_objetivo=4.0,
+                 incremento=0.02, reduccion=0.5, reduccion_lenta=0.9, jitter=0.0):
+        self.nombre = nombre
+        self.tasa = tasa_inicial
+        self.tasa_min = tasa_min
+        self.tasa_max = tasa_max
+        self.rafaga = rafaga
+        self.latencia_objetivo = latencia_objetivo
+        self.incremento = incremento
+        self.reduccion = reduccion
+        self.reduccion_lenta = reduccion_lenta
+        self.jitter = jitter
+        self._tokens = float(rafaga)
+        self._ultima = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rellenar(self, ahora):
+        self._tokens = min(self.rafaga, self._tokens + (ahora - self._ultima) * self.tasa)
+        self._ultima = ahora
+
+    def esperar(self):
+        with self._lock:
+            self._rellenar(time.monotonic())
+            self._tokens -= 1
+            espera = -self._tokens / self.tasa if self._tokens < 0 else 0.0
+        if espera > 0:
+            time.sleep(espera * (1 + random.uniform(0, self.jitter)))
+
+    def registrar(self, segundos, ok):
+        """Ajusta la tasa con el resultado de una búsqueda."""
+        with self._lock:
+            self._rellenar(time.monotonic())
+            if not ok:
+                self.tasa = max(self.tasa_min, self.tasa * self.reduccion)
+            elif segundos > self.latencia_objetivo:
+                self.tasa = max(self.tasa_min, self.tasa * self.reduccion_lenta)
+            else:
+                self.tasa = min(self.tasa_max, self.tasa + self.incremento)
+
+class CircuitoFuente:
+    """Circuit breaker de una fuente: cerrado → abierto → semiabierto.
+
+    Abierto, la fuente se salta hasta que pase el enfriamiento; después deja
+    pasar una sola búsqueda de prueba. Si la prueba falla se vuelve a abrir
+    con el doble de enfriamiento; si sale bien se cierra."""
+
+    def __init__(self, nombre, fallos=3, enfriamiento=120.0, enfriamiento_max=1800.0):
+        self.nombre = nombre
+        self.umbral = fallos
+        self.enfriamiento_base = enfriamiento
+        self.enfriamiento_max = enfriamiento_max
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self.aperturas = 0
+        self._probando = False
+        self._lock = threading.Lock()
+
+    def permite(self):
+        with self._lock:
+            if self.abierto_hasta == 0.0:
+                return True
+            if time.monotonic() < self.abierto_hasta or self._probando:
+                return False
+            self._probando = True   # semiabierto: una sola búsqueda de prueba
+            return True
+
+    @property
+    def abierto(self):
+        return self.abierto_hasta != 0.0
+
+    def reabre_en(self):
+        """Segundos hasta que la fuente acepte una búsqueda (0 si ya la acepta)."""
+        with self._lock:
+            return max(0.0, self.abierto_hasta - time.monotonic()) if self.abierto_hasta else 0.0
+
+    def exito(self):
+        with self._lock:
+            if self.abierto_hasta:
+                print(f"  [CIRCUITO] {self.nombre} cerrado: la búsqueda de prueba funcionó")
+            self.fallos = 0
+            self.abierto_hasta = 0.0
+            self.enfriamiento = self.enfriamiento_base
+            self._probando = False
+
+    def fallo(self, motivo, inmediato=False):
+        with self._lock:
+            self.fallos += 1
+            if not (inmediato or self._probando or self.fallos >= self.umbral):
+                return
+            if self._probando:
+                self.enfriamiento = min(self.enfriamiento_max, self.enfriamiento * 2)
+            self.abierto_hasta = time.monotonic() + self.enfriamiento
+            self.aperturas += 1
+            self._probando = False
+            print(f"  [CIRCUITO] {self.nombre} abierto {self.enfriamiento:.0f} s "
+                  f"({motivo}, {self.fallos} fallo(s) seguidos)")
+
+def crear_limitadores():
+    """Un (limitador, circuito) por fuente, compartido por todos los workers."""
+    return {
+        f["nombre"]: (LimitadorFuente(f["nombre"], **f["ritmo"]), CircuitoFuente(f["nombre"], **f["circuito"]))
+        for f in FUENTES
+    }
 
-def _buscar_imagen_en_fuente(fuente):
-    """Intenta los selectores de una fuente y retorna el primer elemento encontrado."""
+def resumen_limitadores(limitadores):
+    return "  Fuentes: " + ", ".join(
+        f"{nombre} {limitador.tasa * 60:.1f} búsquedas/min ({circuito.aperturas} aperturas del circuito)"
+        for nombre, (limitador, circuito) in limitadores.items()
+    )
+
+def _es_captcha(texto, fuente):
+    texto = texto.lower()
+    return any(marca in texto for marca in fuente["captcha"])
+
+def _buscar_candidatos_en_fuente(driver, fuente):
+    """Intenta los selectores de una fuente y retorna hasta MAX_CANDIDATOS URLs de imagen."""
     for selector in fuente["selectores"]:
         try:
             elementos = driver.find_elements(By.CSS_SELECTOR, selector)
-            visibles = [e for e in elementos if e.is_displayed() and e.get_attribute("src")]
-            if visibles:
-                return visibles[0]
+            urls = [
+                e.get_attribute("src") for e in elementos
+                if e.is_displayed() and e.get_attribute("src")
+            ]
+            if urls:
+                return urls[:MAX_CANDIDATOS]
         except Exception:
             continue
-    return None
+    return []
 
-def _guardar_imagen(img_url, ruta):
-    """Escribe la imagen (base64 o URL) en disco. Retorna True si tuvo éxito."""
-    try:
-        if img_url.startswith('data:image'):
-            _, encoded = img_url.split(",", 1)
-            with open(ruta, "wb") as f:
-                f.write(base64.b64decode(encoded))
-            return True
-        else:
-            resp = requests.get(img_url, timeout=10)
-            if resp.status_code == 200:
-                with open(ruta, "wb") as f:
-                    f.write(resp.content)
-                return True
-    except Exception:
-        pass
-    return False
+class Buscador:
+    """Backend de búsqueda de un worker.
 
-def descargar_imagen(sku, nombre, clave2):
-    nombre_archivo = f"{sku}.jpg"
-    ruta_guardado  = os.path.join(FOLDER, nombre_archivo)
+    En modo "http" pide el HTML de resultados con la sesión compartida y solo
+    abre el navegador si el parser no encuentra candidatos. El navegador se crea
+    la primera vez que hace falta, así que un worker que nunca cae al respaldo
+    no paga el arranque de Chrome."""
 
-    if os.path.exists(ruta_guardado):
-        print(f"  [SKIP img] {sku} ya existe")
-        return nombre_archivo
+    def __init__(self, session, modo=BUSQUEDA, headless=HEADLESS):
+        self.session = session
+        self.modo = modo
+        self.headless = headless
+        self._driver = None
+        self._sin_navegador = False
 
-    # Incluir siempre clave1 — sea SKU alfanumérico o EAN, ambos ayudan a Bing
-    query = f'{sku} "{nombre}" repostería pastelería'
+    @property
+    def driver(self):
+        if self._driver is None:
+            print(f"  [INFO img] Iniciando navegador (búsqueda: {self.modo})")
+            self._driver = crear_driver(headless=self.headless)
+        return self._driver
+
+    def buscar(self, fuente, query, ev):
+        """Retorna (candidatos, falla). Sin candidatos ni falla: la fuente respondió sin resultados."""
+        if self.modo == "http":
+            ev["via"] = "http"
+            candidatos, falla = self._por_http(fuente, query)
+            if candidatos or falla:
+                return candidatos, falla
+            if self._sin_navegador:
+                return [], ""
+            try:
+                self.driver
+            except Exception as e:
+                self._sin_navegador = True
+                print(f"  [WARN img] Sin navegador de respaldo ({type(e).__name__}: {e}); "
+                      f"se sigue solo por HTTP")
+                return [], ""
+        ev["via"] = "navegador"
+        return self._por_navegador(fuente, query)
+
+    def _por_http(self, fuente, query):
+        resp = self.session.get(fuente["url"](query), headers=HEADERS_BUSQUEDA, timeout=TIMEOUT_BUSQUEDA_HTTP)
+        if resp.status_code == 429 or resp.status_code >= 500:
+            return [], f"http_{resp.status_code}"
+        if resp.status_code == 200:
+            candidatos = fuente["extraer_html"](resp.text)
+            if candidatos:
+                return candidatos[:MAX_CANDIDATOS], ""
+        if _es_captcha(f"{resp.url}\n{resp.text}", fuente):
+            return [], "captcha"
+        return [], ""
 
-    for fuente in FUENTES:
+    def _por_navegador(self, fuente, query):
+        driver = self.driver
+        # Limpiar DOM entre búsquedas para evitar que Bing reutilice
+        # elementos de la página anterior (navegación SPA)
+        driver.get("about:blank")
+        driver.get(fuente["url"](query))
+
+        wait_selector = ", ".join(fuente["selectores"])
         try:
-            # Limpiar DOM entre búsquedas para evitar que Bing reutilice
-            # elementos de la página anterior (navegación SPA)
-            driver.get("about:blank")
-            time.sleep(0.5)
-            driver.get(fuente["url"](query))
-            _pausa_humana(1.5, 3.0)
-
-            wait_selector = ", ".join(fuente["selectores"])
             WebDriverWait(driver, 8).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, wait_selector))
             )
+        except TimeoutException:
+            return [], "captcha" if _es_captcha(f"{driver.current_url}\n{driver.page_source}", fuente) else "timeout"
+        return _buscar_candidatos_en_fuente(driver, fuente), ""
+
+    def cerrar(self):
+        if self._driver is not None:
+            self._driver.quit()
 
-            img_element = _buscar_imagen_en_fuente(fuente)
-            if img_element is None:
+def buscar_imagen(buscador, limitadores, eventos, sku, nombre, clave2, detener=None):
+    """Etapa de búsqueda: solo extrae URLs candidatas, no descarga nada.
+    Retorna (nombre de la fuente, [urls]); (None, []) si alguna fuente respondió sin
+    resultados, o (None, None) si ninguna respondió (timeout, 5xx): eso no prueba
+    que el producto no tenga imagen, así que el SKU debe quedar pendiente.
+    Cada intento por fuente es un evento "busqueda" (sin contar la espera del limitador).
+
+    Las fuentes con el circuito abierto se saltan. Si ninguna fuente respondió y
+    todas quedaron abiertas, espera a que la primera admita una búsqueda de prueba
+    en vez de dar el SKU por perdido; `detener` (threading.Event) corta esa espera."""
+    # Incluir siempre clave1 — sea SKU alfanumérico o EAN, ambos ayudan a Bing
+    query = f'{sku} "{nombre}" repostería pastelería'
+
+    while True:
+        respondieron = 0
+        for fuente in FUENTES:
+            limitador, circuito = limitadores[fuente["nombre"]]
+            if not circuito.permite():
+                continue
+            limitador.esperar()
+            inicio = time.monotonic()
+            candidatos, falla = [], ""
+            try:
+                with eventos.medir("busqueda", fuente=fuente["nombre"], sku=sku) as ev:
+                    candidatos, falla = buscador.buscar(fuente, query, ev)
+                    ev["error"] = falla or ("" if candidatos else "sin_resultados")
+            except Exception as e:
+                falla = type(e).__name__
+
+            limitador.registrar(time.monotonic() - inicio, ok=not falla)
+            if falla:
+                print(f"  [WARN img] {fuente['nombre']} falló para {sku}: {falla}")
+                circuito.fallo(falla, inmediato=falla == "captcha")
+                continue
+            circuito.exito()
+            respondieron += 1
+            if not candidatos:
                 print(f"  [WARN img] Sin resultados en {fuente['nombre']} para {sku}")
                 continue
+            return fuente["nombre"], candidatos
 
-            img_url = img_element.get_attribute("src")
-            if img_url and _guardar_imagen(img_url, ruta_guardado):
-                print(f"  [OK img]  {sku} → {nombre_archivo} ({fuente['nombre']})")
-                return nombre_archivo
+        if respondieron:
+            return None, []
+        if not all(circuito.abierto for _, circuito in limitadores.values()):
+            return None, None
+        espera = max(1.0, min(circuito.reabre_en() for _, circuito in limitadores.values()))
+        print(f"  [CIRCUITO] Todas las fuentes en pausa; {sku} espera {espera:.0f} s")
+        if detener is None:
+            time.sleep(espera)
+        elif detener.wait(espera):
+            return None, None
 
-        except Exception as e:
-            print(f"  [WARN img] {fuente['nombre']} falló para {sku}: {type(e).__name__}")
-            continue
+# ─── Descarga (etapa separada del navegador) ─────────────────────────────────
+MAX_CANDIDATOS = 3           # URLs que la búsqueda entrega por SKU, en orden de preferencia
+DESCARGAS_CONCURRENTES = 8   # descargas HTTP simultáneas (todas las comparten los workers)
+TAMANO_MIN_IMAGEN = 1024     # bytes; menos que esto suele ser un pixel de tracking
+
+# Firmas de los formatos que aceptamos como imagen válida
+_FIRMAS_IMAGEN = (b"\xff\xd8\xff", b"\x89PNG", b"GIF8", b"RIFF")
+
+def _es_imagen_valida(contenido):
+    if len(contenido) < TAMANO_MIN_IMAGEN or not contenido.startswith(_FIRMAS_IMAGEN):
+        return False
+    return not contenido.startswith(b"RIFF") or contenido[8:12] == b"WEBP"
 
-    print(f"  [ERROR img] Sin imagen en ninguna fuente para SKU {sku}")
-    return "error_no_encontrado.jpg"
+class Descargador:
+    """Descarga candidatos con concurrencia acotada y una sesión HTTP compartida.
 
-def generar_descripcion_local(nombre_producto, categoria, descripcion_original=""):
-    """Genera descripción usando Ollama (llama3.2) corriendo localmente.
-    Sin límites de cuota ni dependencia de internet. Fallback a descripción original."""
-    prompt = (
+    La sesión reutiliza conexiones keep-alive por host, así que las miniaturas
+    de un mismo CDN no pagan un handshake TLS por imagen."""
+
+    def __init__(self, eventos, concurrencia=DESCARGAS_CONCURRENTES):
+        self.eventos = eventos
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=concurrencia, pool_maxsize=concurrencia)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix="descarga")
+
+    def enviar(self, sku, fuente, candidatos):
+        """Encola la descarga y retorna un Future con (ruta local, fuente): ruta '' si ningún
+        candidato sirvió, None si no se pudo escribir en disco (el SKU queda pendiente)."""
+        return self.executor.submit(self._descargar, sku, fuente, candidatos)
+
+    def _obtener(self, img_url):
+        if img_url.startswith('data:image'):
+            _, encoded = img_url.split(",", 1)
+            return base64.b64decode(encoded)
+        resp = self.session.get(img_url, timeout=10)
+        return resp.content if resp.status_code == 200 else b""
+
+    def _descargar(self, sku, fuente, candidatos):
+        nombre_archivo = f"{sku}.jpg"
+        ruta = os.path.join(FOLDER, nombre_archivo)
+        fallo_disco = False
+        with self.eventos.medir("descarga", fuente=fuente, sku=sku) as ev:
+            for intento, img_url in enumerate(candidatos, start=1):
+                try:
+                    contenido = self._obtener(img_url)
+                except Exception:
+                    continue
+                if not _es_imagen_valida(contenido):
+                    continue
+                # Temporal + rename: un archivo a medias nunca cuenta como "ya existe"
+                tmp = f"{ruta}.part"
+                try:
+                    with open(tmp, "wb") as f:
+                        f.write(contenido)
+                    os.replace(tmp, ruta)
+                except OSError as e:
+                    print(f"  [ERROR img] No se pudo guardar {nombre_archivo}: {type(e).__name__}: {e}")
+                    fallo_disco = True
+                    try:
+                        os.remove(tmp)
+                    except OSError:
+                        pass
+                    continue
+                ev.update(candidato=intento, bytes=len(contenido))
+                print(f"  [OK img]  {sku} → {nombre_archivo} ({fuente})")
+                return ruta, fuente
+            ev["error"] = "escritura" if fallo_disco else "sin_candidato_valido"
+        if fallo_disco:
+            # Problema local, no falta de imagen: que la próxima corrida lo reintente
+            return None, fuente
+        print(f"  [ERROR img] Ninguna imagen de {fuente} se pudo descargar para SKU {sku}")
+        return "", fuente
+
+    def cerrar(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+# ─── Cache de imágenes por EAN / nombre ──────────────────────────────────────
+def _enlazar(origen, destino):
+    """Hardlink (no ocupa disco) con copia como respaldo; temporal + rename."""
+    tmp = f"{destino}.part"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(origen, tmp)
+    except OSError:
+        shutil.copyfile(origen, tmp)
+    os.replace(tmp, destino)
+
+class CacheImagenes:
+    """Cache persistente de imágenes compartido entre SKUs y corridas.
+
+    Cada imagen descargada se guarda una vez por contenido en cache_imagenes/
+    y se indexa en el estado por EAN (clave2) y por nombre normalizado. Un SKU
+    recodificado o re-importado, o uno que comparte código de barras con otro,
+    recibe la imagen sin abrir el buscador."""
+
+    def __init__(self, estado, carpeta=CACHE_IMG_DIR):
+        self.estado = estado
+        self.carpeta = carpeta
+        os.makedirs(carpeta, exist_ok=True)
+        self._lock = threading.Lock()
+        self.aciertos = {"ean": 0, "nombre": 0}
+        self.fallos = 0
+
+    def obtener(self, sku, clave2, nombre):
+        """Copia la imagen en cache a {sku}.jpg. Retorna (ruta, fuente) o None si no hay."""
+        claves = claves_imagen(clave2, nombre)
+        encontrado = self.estado.buscar_en_cache(claves)
+        if encontrado:
+            clave, archivo, fuente = encontrado
+            origen = os.path.join(self.carpeta, archivo)
+            if os.path.exists(origen):
+                ruta = os.path.join(FOLDER, f"{sku}.jpg")
+                _enlazar(origen, ruta)
+                # Un acierto por nombre también deja indexado el EAN de este SKU
+                faltantes = claves[:claves.index(clave)]
+                if faltantes:
+                    self.estado.guardar_en_cache(faltantes, archivo, fuente, sku)
+                tipo = clave.split(":", 1)[0]
+                with self._lock:
+                    self.aciertos[tipo] += 1
+                print(f"  [CACHE img] {sku} ← {clave[:60]} ({fuente})")
+                return ruta, fuente
+        with self._lock:
+            self.fallos += 1
+        return None
+
+    def guardar(self, sku, clave2, nombre, ruta, fuente):
+        """Agrega una imagen recién descargada (o existente) bajo todas sus claves."""
+        claves = claves_imagen(clave2, nombre)
+        if not claves:
+            return
+        with open(ruta, "rb") as f:
+            archivo = f"{hashlib.sha256(f.read()).hexdigest()}.jpg"
+        destino = os.path.join(self.carpeta, archivo)
+        if not os.path.exists(destino):
+            _enlazar(ruta, destino)
+        self.estado.guardar_en_cache(claves, archivo, fuente, sku)
+
+    def sembrar(self, filas, con_imagen):
+        """Indexa las imágenes que ya existen en product_images/ y aún no están en el cache."""
+        en_cache = self.estado.claves_en_cache()
+        sembradas = 0
+        for _, row in filas:
+            sku = str(row['clave1'])
+            ruta = os.path.join(FOLDER, f"{sku}.jpg")
+            if sku not in con_imagen or not os.path.exists(ruta):
+                continue
+            if set(claves_imagen(row['clave2'], row['nombre'])) <= en_cache:
+                continue
+            self.guardar(sku, row['clave2'], row['nombre'], ruta, "")
+            en_cache.update(claves_imagen(row['clave2'], row['nombre']))
+            sembradas += 1
+        return sembradas
+
+    def resumen(self):
+        aciertos = sum(self.aciertos.values())
+        consultas = aciertos + self.fallos
+        tasa = f"{aciertos / consultas:.0%}" if consultas else "n/a"
+        return (
+            f"  Imágenes:      cache {aciertos} aciertos (EAN {self.aciertos['ean']}, "
+            f"nombre {self.aciertos['nombre']}) / {self.fallos} fallos ({tasa})"
+        )
+
+def _futuro_resuelto(valor):
+    futuro = Future()
+    futuro.set_result(valor)
+    return futuro
+
+def obtener_imagen(buscador, limitadores, descargador, cache, sku, nombre, clave2, detener=None):
+    """Consulta el cache y, si no está, busca en las fuentes y delega la descarga.
+    Retorna un Future con (ruta local, fuente); fuente vacía cuando no hubo búsqueda
+    y ruta None cuando ninguna fuente respondió (el SKU sigue pendiente)."""
+    ruta_guardado = os.path.join(FOLDER, f"{sku}.jpg")
+    if os.path.exists(ruta_guardado):
+        print(f"  [SKIP img] {sku} ya existe")
+        return _futuro_resuelto((ruta_guardado, ""))
+
+    en_cache = cache.obtener(sku, clave2, nombre)
+    if en_cache:
+        return _futuro_resuelto(en_cache)
+
+    fuente, candidatos = buscar_imagen(buscador, limitadores, descargador.eventos, sku, nombre, clave2, detener)
+    if candidatos is None:
+        print(f"  [WARN img] Ninguna fuente respondió para SKU {sku}; queda pendiente")
+        return _futuro_resuelto((None, ""))
+    if not candidatos:
+        print(f"  [ERROR img] Sin imagen en ninguna fuente para SKU {sku}")
+        return _futuro_resuelto(("", ""))
+    futuro = descargador.enviar(sku, fuente, candidatos)
+
+    def _al_descargar(f):
+        ruta, fuente = f.result()
+        if ruta:
+            try:
+                cache.guardar(sku, clave2, nombre, ruta, fuente)
+            except Exception as e:
+                print(f"  [WARN img] No se pudo guardar {sku} en el cache: {type(e).__name__}: {e}")
+
+    futuro.add_done_callback(_al_descargar)
+    return futuro
+
+def procesar_producto(buscador, limitadores, descargador, cache, row, detener=None):
+    """Busca la imagen del producto; la descarga sigue en segundo plano.
+    Retorna un Future con (ruta local, '' si no se encontró o None si la búsqueda falló, fuente)."""
+    sku    = str(row['clave1'])
+    nombre = str(row['nombre'])
+
+    print(f"\n── Procesando SKU {sku}: {nombre}")
+
+    return obtener_imagen(buscador, limitadores, descargador, cache, sku, nombre, row['clave2'], detener)
+
+# ─── Descripciones (etapa independiente de las imágenes) ─────────────────────
+def _prompt_descripcion(nombre_producto, categoria):
+    return (
         f"Escribe una descripción comercial muy breve (máximo 20 palabras) "
         f"para este producto de repostería: {nombre_producto}. "
         f"Categoría: {categoria}. "
         f"No uses introducciones como 'Aquí tienes' o 'Este producto'."
     )
-    try:
-        response = ollama.chat(model=OLLAMA_MODEL, messages=[
-            {'role': 'user', 'content': prompt}
-        ])
-        descripcion = response['message']['content'].strip()
-        print(f"  [OK desc] {len(descripcion)} chars")
-        return descripcion
-    except Exception as e:
-        print(f"  [ERROR desc] {type(e).__name__}: {e}")
-        return descripcion_original
 
-def procesar_producto(row):
-    """Descarga imagen localmente y genera descripción con Ollama."""
-    sku       = str(row['clave1'])
-    nombre    = str(row['nombre'])
-    categoria = str(row.get('categoria', ''))
+class CacheDescripciones:
+    """Cache persistente de descripciones en JSON lines (append-only).
 
-    print(f"\n── Procesando SKU {sku}: {nombre}")
+    La clave es un hash de (modelo, prompt, nombre, categoría): si cambia
+    cualquiera de ellos se genera de nuevo; si no, nunca se vuelve a pagar
+    la generación, ni en re-corridas ni después de un crash."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._datos = {}
+        self._lock = threading.Lock()
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        registro = json.loads(linea)
+                    except json.JSONDecodeError:
+                        continue   # última línea truncada por un crash
+                    self._datos[registro["clave"]] = registro["descripcion"]
+
+    @staticmethod
+    def clave(modelo, prompt, nombre, categoria):
+        contenido = json.dumps([modelo, prompt, nombre, categoria], ensure_ascii=False)
+        return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+    def obtener(self, clave):
+        with self._lock:
+            return self._datos.get(clave)
+
+    def guardar(self, clave, descripcion):
+        with self._lock:
+            self._datos[clave] = descripcion
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"clave": clave, "descripcion": descripcion}, ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        return len(self._datos)
+
+class GeneradorDescripciones:
+    """Genera descripciones con Ollama con concurrencia configurable y cache en disco.
+
+    El cliente respeta OLLAMA_HOST, así que puede apuntarse a un servidor local de prueba."""
+
+    def __init__(self, eventos, concurrencia=LLM_CONCURRENCIA, ruta_cache=CACHE_DESC, forzar=FORZAR_DESC):
+        self.eventos = eventos
+        self.cliente = ollama.Client()
+        self.cache = CacheDescripciones(ruta_cache)
+        self.forzar = forzar
+        self.executor = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.errores = 0
+        self.tokens = 0
+        self.segundos_eval = 0.0
+
+    def enviar(self, sku, nombre_producto, categoria, descripcion_original=""):
+        """Encola la generación y retorna un Future con (descripción, desc_estado)."""
+        return self.executor.submit(self._generar, sku, nombre_producto, categoria, descripcion_original)
+
+    def _generar(self, sku, nombre_producto, categoria, descripcion_original):
+        """Fallback a la descripción original si Ollama falla, con DESC_PENDIENTE para reintentarla."""
+        prompt = _prompt_descripcion(nombre_producto, categoria)
+        clave = CacheDescripciones.clave(OLLAMA_MODEL, prompt, nombre_producto, categoria)
+        # FORZAR_DESC ignora el cache al leer, pero el resultado nuevo lo reemplaza
+        en_cache = None if self.forzar else self.cache.obtener(clave)
+        if en_cache is not None:
+            with self._lock:
+                self.aciertos += 1
+            print(f"  [CACHE desc] {sku}")
+            return en_cache, DESC_OK
+
+        with self._lock:
+            self.fallos += 1
+        try:
+            with self.eventos.medir("llm", fuente=OLLAMA_MODEL, sku=sku) as ev:
+                response = self.cliente.chat(model=OLLAMA_MODEL, messages=[
+                    {'role': 'user', 'content': prompt}
+                ])
+                ev["tokens"] = response.get('eval_count') or 0
+            descripcion = response['message']['content'].strip()
+        except Exception as e:
+            with self._lock:
+                self.errores += 1
+            print(f"  [ERROR desc] {sku} {type(e).__name__}: {e}")
+            return descripcion_original, DESC_PENDIENTE
+
+        with self._lock:
+            self.tokens += response.get('eval_count') or 0
+            self.segundos_eval += (response.get('eval_duration') or 0) / 1e9
+        self.cache.guardar(clave, descripcion)
+        print(f"  [OK desc] {sku} {len(descripcion)} chars")
+        return descripcion, DESC_OK
+
+    def resumen(self):
+        consultas = self.aciertos + self.fallos
+        tasa = f"{self.aciertos / consultas:.0%}" if consultas else "n/a"
+        tps = f"{self.tokens / self.segundos_eval:.1f}" if self.segundos_eval else "n/a"
+        return (
+            f"  Descripciones: cache {self.aciertos} aciertos / {self.fallos} fallos ({tasa}), "
+            f"errores {self.errores}, {self.tokens} tokens a {tps} tokens/s"
+        )
 
-    imagen_archivo = descargar_imagen(sku, nombre, row['clave2'])
-    # Registrar mapeo SKU → imagen local → URL Supabase (columna vacía hasta subir)
-    necesita_header = not os.path.exists(CSV_IMAGENES) or os.path.getsize(CSV_IMAGENES) == 0
-    imagen_path = os.path.join(FOLDER, imagen_archivo) if imagen_archivo != "error_no_encontrado.jpg" else ""
-    with open(CSV_IMAGENES, 'a', newline='') as mf:
-        import csv as csv_mod
-        writer = csv_mod.writer(mf, quoting=csv_mod.QUOTE_ALL)
-        if necesita_header:
-            writer.writerow(['sku', 'nombre', 'imagen_local', 'supabase_url'])
-        writer.writerow([sku, nombre, imagen_path, ''])
-
-    desc_actual = str(row.get('descripcion', ''))
-    # Regenerar si: no tiene descripción, es igual al nombre (valor por defecto del CSV),
-    # o si FORZAR_DESC está activo
-    necesita_desc = FORZAR_DESC or not desc_actual or desc_actual == nombre
-    if necesita_desc:
-        descripcion = generar_descripcion_local(nombre, categoria, descripcion_original=desc_actual)
-    else:
-        print(f"  [SKIP desc] Ya tiene descripción")
-        descripcion = desc_actual
-
-    _pausa_humana(1.5, 3.0)
-
-    return descripcion
+    def cerrar(self):
+        self.executor.shutdown(wait=True)
 
 # ─── Columnas esperadas por el importador (CsvRawRow en types.ts) ────────────
 CSV_COLUMNS = [
@@ -191,36 +775,261 @@ CSV_COLUMNS = [
     'clave1', 'clave2', 'codigo_sat', 'disponible', 'destacado', 'temporada',
 ]
 
+# ─── Pool de workers ─────────────────────────────────────────────────────────
+_FIN = object()   # marca que un worker terminó su shard
+
+def _worker(num, filas, resultados, detener, buscador, limitadores, descargador, cache):
+    """Procesa un shard de filas con su propio buscador; los limitadores son compartidos.
+
+    Nunca escribe los CSV: publica ("img", idx, sku, nombre, imagen_futura)
+    en `resultados` y el hilo principal es el único que persiste."""
+    try:
+        if buscador.modo == "navegador":
+            buscador.driver   # sin respaldo que valga: si Chrome no arranca, el worker no sirve
+        for idx, row in filas:
+            if detener.is_set():
+                break
+            try:
+                imagen_futura = procesar_producto(buscador, limitadores, descargador, cache, row, detener)
+            except Exception as e:
+                print(f"  [ERROR worker {num}] SKU {row['clave1']}: {type(e).__name__}: {e}")
+                continue
+            resultados.put(("img", idx, str(row['clave1']), str(row['nombre']), imagen_futura))
+    except Exception as e:
+        print(f"  [ERROR worker {num}] No se pudo iniciar el navegador: {type(e).__name__}: {e}")
+    finally:
+        buscador.cerrar()
+        resultados.put(_FIN)
+
+def _publicar_descripcion(futuro, resultados, sku, nombre):
+    """Done-callback de cada descripción: siempre publica un resultado, aunque el
+    futuro haya fallado, para que el hilo principal no espere uno que nunca llega."""
+    if futuro.cancelled():
+        return
+    try:
+        resultados.put(("desc", sku, nombre, *futuro.result()))
+    except Exception as e:
+        resultados.put(("desc_error", sku, e))
+
+def exportar_csvs(df, estado):
+    """Genera inventario_actualizado.csv e imagenes_map.csv a partir del estado SQLite.
+
+    Ambos se escriben en un temporal y se renombran: nunca quedan a medias."""
+    descripciones = estado.descripciones()
+    df = df.copy()
+    skus = df['clave1'].astype(str)
+    df['descripcion'] = skus.map(descripciones).fillna(df['descripcion'])
+    tmp = f"{CSV_OUTPUT}.tmp"
+    df[CSV_COLUMNS].to_csv(tmp, index=False)
+    os.replace(tmp, CSV_OUTPUT)
+    filas_mapa = estado.exportar_mapa_csv(CSV_IMAGENES)
+    print(f"  [EXPORT] {CSV_OUTPUT} ({len(df)} filas) y {CSV_IMAGENES} ({filas_mapa} filas)")
+
+def _abrir_estado(df):
+    """Abre el estado SQLite y lo sincroniza con los CSV de corridas anteriores."""
+    estado = EstadoPipeline(ESTADO_DB)
+    # Trae las supabase_url que haya escrito 03_sube-imagenes-supabase.py
+    estado.importar_mapa_csv(CSV_IMAGENES, FOLDER)
+    # Primera corrida con estado: adopta las descripciones del CSV previo (por SKU)
+    if os.path.exists(CSV_OUTPUT) and not estado.descripciones():
+        df_prev = pd.read_csv(CSV_OUTPUT, dtype={'clave1': str})
+        if 'descripcion' in df_prev.columns:
+            previas = [
+                (str(r.clave1), str(r.nombre), str(r.descripcion))
+                for r in df_prev.itertuples()
+                if isinstance(r.descripcion, str) and r.descripcion and r.descripcion != str(r.nombre)
+            ]
+            estado.importar_descripciones(previas)
+            print(f"[INFO] CSV previo cargado: {len(previas)} descripciones adoptadas en el estado.")
+    return estado
+
 # ─── Ejecución ───────────────────────────────────────────────────────────────
-df = pd.read_csv(CSV_INPUT)
-
-# Si ya existe un CSV de salida previo, recuperamos las descripciones ya generadas
-if os.path.exists(CSV_OUTPUT):
-    df_prev = pd.read_csv(CSV_OUTPUT)
-    if 'descripcion' in df_prev.columns:
-        df['descripcion'] = df_prev['descripcion']
-    print(f"[INFO] CSV previo cargado: se preservan descripciones anteriores.\n")
-
-fin    = (INICIO + LIMITE) if LIMITE is not None else None
-subset = df.iloc[INICIO:fin].copy()
-
-total  = len(subset)
-print(f"Iniciando procesamiento de {total} productos")
-print(f"Filas CSV {INICIO + 1}–{INICIO + total} (índice pandas {INICIO}–{INICIO + total - 1})")
-print(f"Carpeta de imágenes: {FOLDER}\n")
-
-GUARDAR_CADA = 10   # persiste el CSV cada N productos para no perder progreso
-
-for i, (idx, row) in enumerate(subset.iterrows(), start=1):
-    descripcion = procesar_producto(row)
-    df.at[idx, 'descripcion'] = descripcion
-
-    if i % GUARDAR_CADA == 0 or i == total:
-        df[CSV_COLUMNS].to_csv(CSV_OUTPUT, index=False)
-        print(f"  [SAVE] Progreso guardado ({i}/{total} productos)")
-
-driver.quit()
-print(f"\nProceso completado.")
-print(f"  CSV listo para importar: {CSV_OUTPUT}")
-print(f"  Imágenes en:             {FOLDER}")
-print(f"  Próximo paso:            subir imágenes a Supabase Storage y actualizar products.image_url por SKU.")
+def probar_html(nombre_fuente, archivo):
+    """Corre el parser HTTP de una fuente sobre una página guardada (p. ej. con curl)."""
+    fuente = next((f for f in FUENTES if f["nombre"].lower() == nombre_fuente.lower()), None)
+    if fuente is None:
+        raise SystemExit(f"Fuente desconocida: {nombre_fuente} (opciones: {', '.join(f['nombre'] for f in FUENTES)})")
+    with open(archivo, encoding="utf-8", errors="replace") as f:
+        pagina = f.read()
+    candidatos = fuente["extraer_html"](pagina)
+    print(f"{fuente['nombre']}: {len(candidatos)} candidatos en {archivo}")
+    for url in candidatos:
+        print(f"  {url}")
+    if not candidatos and _es_captcha(pagina, fuente):
+        print("  La página parece un CAPTCHA.")
+
+def _necesita_descripcion(row, con_descripcion):
+    """Regenerar si: su desc_estado no es 'ok' (nunca generada o falló), o si FORZAR_DESC está activo."""
+    return FORZAR_DESC or str(row['clave1']) not in con_descripcion
+
+def main():
+    parser = argparse.ArgumentParser(description="Descripciones + imágenes locales por SKU.")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="workers de búsqueda en paralelo, cada uno con su navegador headless "
+                             "de respaldo (default: %(default)s)")
+    parser.add_argument("--busqueda", choices=["http", "navegador"], default=BUSQUEDA,
+                        help="http: HTML por HTTP con el navegador de respaldo; navegador: siempre "
+                             "Selenium (default: %(default)s)")
+    parser.add_argument("--probar-html", nargs=2, metavar=("FUENTE", "ARCHIVO"),
+                        help="imprime los candidatos que el parser HTTP saca de una página de "
+                             "resultados guardada y sale")
+    parser.add_argument("--llm-workers", type=int, default=LLM_CONCURRENCIA,
+                        help="peticiones simultáneas a Ollama (default: %(default)s)")
+    parser.add_argument("--reintentar-sin-imagen", action="store_true",
+                        help="vuelve a buscar los SKUs que quedaron sin imagen en corridas previas")
+    parser.add_argument("--solo-exportar", action="store_true",
+                        help="regenera los CSV desde el estado SQLite sin procesar nada")
+    args = parser.parse_args()
+    n_workers = max(1, args.workers)
+    headless = HEADLESS or n_workers > 1
+
+    if args.probar_html:
+        probar_html(*args.probar_html)
+        return
+
+    os.makedirs(FOLDER, exist_ok=True)
+    df = pd.read_csv(CSV_INPUT, dtype={'clave1': str, 'clave2': str})
+    estado = _abrir_estado(df)
+
+    if args.solo_exportar:
+        exportar_csvs(df, estado)
+        estado.cerrar()
+        return
+
+    fin    = (INICIO + LIMITE) if LIMITE is not None else None
+    subset = df.iloc[INICIO:fin]
+
+    # Reanudación: el estado dice qué SKUs ya terminaron cada etapa
+    con_imagen = estado.skus_con_imagen(incluir_sin_imagen=not args.reintentar_sin_imagen)
+    con_descripcion = estado.skus_con_descripcion()
+    filas = list(subset.iterrows())
+    filas_img = [(idx, row) for idx, row in filas if str(row['clave1']) not in con_imagen]
+    filas_desc = [(idx, row) for idx, row in filas if _necesita_descripcion(row, con_descripcion)]
+
+    print(f"Iniciando procesamiento de {len(filas)} productos con {n_workers} worker(s) "
+          f"(búsqueda: {args.busqueda})")
+    print(f"Estado:              {ESTADO_DB}")
+    print(f"Imágenes pendientes: {len(filas_img)}")
+    print(f"Descripciones pend.: {len(filas_desc)}")
+    print(f"Carpeta de imágenes: {FOLDER}")
+
+    eventos = Instrumentacion(os.path.splitext(os.path.basename(__file__))[0], total=len(filas_img))
+    print(f"Eventos:             {eventos.ruta}")
+
+    cache = CacheImagenes(estado)
+    sembradas = cache.sembrar(filas, con_imagen)
+    print(f"Cache de imágenes:   {CACHE_IMG_DIR}"
+          f"{f' ({sembradas} existentes indexadas)' if sembradas else ''}\n")
+
+    resultados = queue.Queue()
+    detener = threading.Event()
+
+    # Etapa de descripciones: corre en su propio pool, sin esperar a los navegadores
+    generador = GeneradorDescripciones(eventos, concurrencia=max(1, args.llm_workers))
+    for idx, row in filas_desc:
+        futuro = generador.enviar(
+            str(row['clave1']), str(row['nombre']), str(row.get('categoria', '')),
+            descripcion_original=str(row.get('descripcion', '')),
+        )
+        futuro.add_done_callback(
+            lambda f, row=row: _publicar_descripcion(f, resultados, str(row['clave1']), str(row['nombre']))
+        )
+
+    # Etapa de imágenes: shards intercalados, cada worker toma una fila de cada N
+    shards = [filas_img[k::n_workers] for k in range(n_workers) if filas_img[k::n_workers]]
+    limitadores = crear_limitadores()
+    descargador = Descargador(eventos)
+    sesion_busqueda = requests.Session()
+    sesion_busqueda.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=n_workers))
+    sesion_busqueda.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=n_workers))
+    hilos = []
+    for num, shard in enumerate(shards, start=1):
+        buscador = Buscador(sesion_busqueda, args.busqueda, headless)
+        hilo = threading.Thread(
+            target=_worker, args=(num, shard, resultados, detener, buscador, limitadores, descargador, cache),
+            daemon=True,
+        )
+        hilo.start()
+        hilos.append(hilo)
+
+    # El hilo principal es el único que escribe: un upsert por resultado
+    activos = len(shards)
+    imagenes = 0
+    img_pendientes = 0
+    descripciones_ok = 0
+    descripciones_error = 0
+
+    def registrar(item):
+        nonlocal imagenes, img_pendientes, descripciones_ok, descripciones_error
+        if item[0] == "desc":
+            _, sku, nombre, descripcion, desc_estado = item
+            estado.registrar_descripcion(sku, nombre, descripcion, desc_estado)
+            descripciones_ok += 1
+        elif item[0] == "desc_error":
+            _, sku, error = item
+            print(f"  [ERROR desc] {sku} {type(error).__name__}: {error}")
+            descripciones_error += 1
+        else:
+            _, idx, sku, nombre, imagen_futura = item
+            try:
+                ruta, fuente = imagen_futura.result()
+            except Exception as e:
+                print(f"  [ERROR img] {sku}: {type(e).__name__}: {e}")
+                ruta, fuente = None, ""
+            if ruta is None:
+                img_pendientes += 1   # sin registrar: la próxima corrida lo vuelve a buscar
+            else:
+                estado.registrar_imagen(sku, nombre, ruta, fuente)
+                imagenes += 1
+            eventos.avance()
+
+    en_curso = None   # item sacado de la cola y aún no registrado (un Ctrl+C puede caer ahí)
+    try:
+        while activos or descripciones_ok + descripciones_error < len(filas_desc):
+            item = resultados.get()
+            if item is _FIN:
+                activos -= 1
+                continue
+            en_curso = item
+            registrar(item)
+            en_curso = None
+    except KeyboardInterrupt:
+        print("\n[INFO] Interrumpido: se detienen los workers tras su producto actual.")
+        generador.executor.shutdown(wait=False, cancel_futures=True)
+    finally:
+        # Los workers usan el estado (cache) y el descargador: terminan antes de cerrarlos
+        detener.set()
+        for hilo in hilos:
+            hilo.join()
+        descargador.cerrar()
+        generador.cerrar()
+        sesion_busqueda.close()
+        # Lo que terminó mientras se cerraba también se guarda: descripciones e imágenes ya bajadas
+        # (los upserts son idempotentes, así que re-registrar en_curso no duplica nada)
+        if en_curso is not None:
+            registrar(en_curso)
+        while not resultados.empty():
+            item = resultados.get()
+            if item is not _FIN:
+                registrar(item)
+        print(f"  [ESTADO] imágenes {imagenes}/{len(filas_img)}"
+              f"{f' ({img_pendientes} quedan pendientes por fallas de red o disco)' if img_pendientes else ''}, "
+              f"descripciones {descripciones_ok}/{len(filas_desc)}"
+              f"{f' ({descripciones_error} con error)' if descripciones_error else ''}")
+        exportar_csvs(df, estado)
+        estado.cerrar()
+        resumen = eventos.cerrar()
+
+    print(f"\nProceso completado.")
+    print(generador.resumen())
+    print(cache.resumen())
+    print(resumen_limitadores(limitadores))
+    print("\n".join(lineas_resumen(resumen)))
+    print(f"  Reporte de la corrida:   {eventos.ruta_resumen}")
+    print(f"  CSV listo para importar: {CSV_OUTPUT}")
+    print(f"  Imágenes en:             {FOLDER}")
+    print(f"  Próximo paso:            subir imágenes a Supabase Storage y actualizar products.image_url por SKU.")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,138 +2,548 @@
 Sube imágenes locales a Supabase Storage (bucket: product-images)
 y actualiza products.image_url por SKU — sin SDK de Supabase (solo requests).
 
+Cada lote que la DB confirma se agrega a imagenes_map.journal.jsonl (con
+fsync) en lugar de reescribir imagenes_map.csv; el CSV se compacta desde el
+journal al arrancar y al terminar, con escritura atómica. Si la corrida se
+corta, la siguiente retoma solo lo que faltaba.
+
 Uso:
-    python scripts/03_sube-imagenes-supabase.py            # simulacro
-    python scripts/03_sube-imagenes-supabase.py --subir    # sube y actualiza DB
+    python scripts/03_sube-imagenes-supabase.py                        # simulacro
+    python scripts/03_sube-imagenes-supabase.py --subir                # sube y actualiza DB
+    python scripts/03_sube-imagenes-supabase.py --subir --workers 8    # 8 subidas en paralelo
 """
+import argparse
+import hashlib
+import json
 import os
 import sys
-import requests
-import pandas as pd
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 
-# ─── Leer .env.local manualmente (sin python-dotenv) ────────────────────────
-def cargar_env(path: Path) -> dict:
-    env = {}
-    if path.exists():
-        for line in path.read_text().splitlines():
-            line = line.strip()
-            if line and not line.startswith("#") and "=" in line:
-                k, _, v = line.partition("=")
-                env[k.strip()] = v.strip().strip('"').strip("'")
-    return env
-
-ROOT = Path(__file__).resolve().parents[3]
-env  = cargar_env(ROOT / ".env.local")
-
-SUPABASE_URL      = env.get("NEXT_PUBLIC_SUPABASE_URL", "").rstrip("/")
-SERVICE_ROLE_KEY  = env.get("SUPABASE_SERVICE_ROLE_KEY") or env.get("NEXT_PUBLIC_SUPABASE_ANON_KEY", "")
-BUCKET            = "product-images"
-SIMULACRO         = "--subir" not in sys.argv
-
-if not SUPABASE_URL or not SERVICE_ROLE_KEY:
-    print("ERROR: Faltan NEXT_PUBLIC_SUPABASE_URL o SUPABASE_SERVICE_ROLE_KEY en .env.local")
-    sys.exit(1)
-
-# Headers comunes para todas las llamadas
-HEADERS_BASE = {
-    "Authorization": f"Bearer {SERVICE_ROLE_KEY}",
-    "apikey": SERVICE_ROLE_KEY,
-}
+import pandas as pd
+import requests
+
+from eventos_pipeline import Instrumentacion, lineas_resumen, percentil
+from supabase_http import BUCKET, cargar_config, crear_sesion
+
+SUPABASE_URL, SERVICE_ROLE_KEY = cargar_config()
 
 # ─── Rutas ───────────────────────────────────────────────────────────────────
 SCRIPT_DIR   = Path(__file__).parent
 IMPORT_CSV_DIR = SCRIPT_DIR.parent
 IMAGENES_MAP = IMPORT_CSV_DIR / "output" / "current" / "imagenes_map.csv"
+# (sku, supabase_url, sha256) confirmados por la DB y aún no compactados en IMAGENES_MAP
+JOURNAL      = IMPORT_CSV_DIR / "output" / "current" / "imagenes_map.journal.jsonl"
+# hash de contenido → objeto en el bucket; cada imagen distinta se sube una sola vez
+MANIFEST     = IMPORT_CSV_DIR / "output" / "current" / "storage_manifest.json"
+PREFIJO_CONTENIDO = "contenido"   # objetos direccionados por sha256: contenido/<sha256>.<ext>
+# Salida de 05_normaliza-imagenes.py; si existe, se sube esa versión en lugar del original
+FOLDER_NORM  = IMPORT_CSV_DIR / "output" / "current" / "product_images_norm"
+EXTENSIONES_NORM = {"jpeg": "jpg", "webp": "webp"}   # formato de 05 (en .ajuste) → extensión
+
+WORKERS      = 1    # subidas simultáneas (--workers N)
+TAMANO_LOTE  = 200  # SKUs por actualización masiva de image_url (--lote N)
+RPC_LOTE     = "bulk_update_product_image_urls"   # supabase/migrations/011
 
 # ─── Funciones de API ────────────────────────────────────────────────────────
-def subir_imagen(storage_path: str, ruta_local: Path) -> str:
-    """Sube imagen al bucket y retorna la URL pública."""
+def subir_imagen(session, storage_path: str, ruta_local: Path, content_type: str = "image/jpeg") -> tuple[str, int]:
+    """Sube imagen al bucket y retorna (URL pública, bytes enviados)."""
     url = f"{SUPABASE_URL}/storage/v1/object/{BUCKET}/{storage_path}"
-    with open(ruta_local, "rb") as f:
-        resp = requests.post(
-            url,
-            headers={**HEADERS_BASE, "Content-Type": "image/jpeg", "x-upsert": "true"},
-            data=f,
-        )
+    # En memoria (no stream) para que un reintento pueda reenviar el cuerpo completo
+    contenido = ruta_local.read_bytes()
+    resp = session.post(
+        url,
+        headers={"Content-Type": content_type, "x-upsert": "true"},
+        data=contenido,
+        timeout=60,
+    )
     if not resp.ok:
         raise Exception(f"HTTP {resp.status_code}: {resp.text}")
-    return f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET}/{storage_path}"
+    return f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET}/{storage_path}", len(contenido)
 
-def actualizar_image_url(sku: str, image_url: str) -> int:
+def actualizar_image_url(session, sku: str, image_url: str) -> int:
     """Actualiza products.image_url donde sku = clave1. Retorna filas afectadas."""
     url  = f"{SUPABASE_URL}/rest/v1/products"
-    resp = requests.patch(
+    resp = session.patch(
         url,
         headers={
-            **HEADERS_BASE,
             "Content-Type": "application/json",
             "Prefer": "return=representation,count=exact",
         },
         params={"sku": f"eq.{sku}"},
         json={"image_url": image_url},
+        timeout=30,
     )
     resp.raise_for_status()
     filas = len(resp.json()) if resp.text else 0
     return filas
 
-# ─── Cargar mapa ─────────────────────────────────────────────────────────────
-df = pd.read_csv(IMAGENES_MAP, on_bad_lines='warn', engine='python', dtype=str)
-df['supabase_url'] = df['supabase_url'].fillna('')
-pendientes = df[
-    df['imagen_local'].notna() &
-    (df['imagen_local'].astype(str) != '') &
-    (df['supabase_url'].isna() | (df['supabase_url'].astype(str).str.strip() == ''))
-].copy()
-
-print(f"{'[SIMULACRO]' if SIMULACRO else '[SUBIDA REAL]'}")
-print(f"URL proyecto:    {SUPABASE_URL}")
-print(f"Total en mapa:   {len(df)}")
-print(f"Pendientes:      {len(pendientes)}")
-print(f"Ya subidas:      {len(df) - len(pendientes)}\n")
-
-GUARDAR_CADA = 50
-subidas  = 0
-errores  = 0
-
-for i, (idx, row) in enumerate(pendientes.iterrows(), start=1):
-    sku          = str(row['sku'])
-    ruta_local   = Path(str(row['imagen_local']))
-    storage_path = f"{sku}.jpg"
-
-    if not ruta_local.exists():
-        print(f"  [WARN] No existe localmente: {ruta_local.name}")
-        errores += 1
-        continue
-
-    if SIMULACRO:
-        print(f"  [SIM] {sku}.jpg → {BUCKET}/{storage_path}")
-        subidas += 1
-        continue
-
-    try:
-        image_url = subir_imagen(storage_path, ruta_local)
-        filas = actualizar_image_url(sku, image_url)
-        df.at[idx, 'supabase_url'] = image_url
-        subidas += 1
-        if filas == 0:
+def actualizar_image_urls_lote(session, pares: list[tuple[str, str]]) -> dict:
+    """Actualiza products.image_url para muchos SKUs en una sola llamada RPC.
+    Retorna {"updated": n, "unmatched": [skus sin fila en products]}."""
+    url  = f"{SUPABASE_URL}/rest/v1/rpc/{RPC_LOTE}"
+    resp = session.post(
+        url,
+        headers={"Content-Type": "application/json"},
+        json={"items": [{"sku": sku, "image_url": image_url} for sku, image_url in pares]},
+        timeout=60,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+class ActualizadorImageUrl:
+    """Acumula (sku, image_url) y los envía a la DB en lotes de `tamano`.
+
+    Si la función RPC no existe en la base (migración 011 sin aplicar) cae a
+    un PATCH por SKU para no detener la corrida."""
+
+    def __init__(self, session, tamano: int, eventos):
+        self.session = session
+        self.eventos = eventos
+        self.tamano = max(1, tamano)
+        self._pendientes = []   # (idx, sku, image_url)
+        self.rpc_disponible = True
+        self.actualizadas = 0
+        self.sin_match = []
+        self.errores = 0
+        self.latencias = []
+
+    def agregar(self, idx, sku: str, image_url: str) -> list:
+        """Encola un SKU; si el lote se llena lo envía. Retorna los (idx, url) confirmados."""
+        self._pendientes.append((idx, sku, image_url))
+        if len(self._pendientes) >= self.tamano:
+            return self.vaciar()
+        return []
+
+    def vaciar(self) -> list:
+        """Envía lo pendiente. Retorna los (idx, url) que la DB confirmó (con o sin match)."""
+        lote, self._pendientes = self._pendientes, []
+        if not lote:
+            return []
+        inicio = time.perf_counter()
+        try:
+            if self.rpc_disponible:
+                try:
+                    resultado = actualizar_image_urls_lote(self.session, [(sku, url) for _, sku, url in lote])
+                except requests.HTTPError as e:
+                    if e.response is None or e.response.status_code != 404:
+                        raise
+                    print(f"  [WARN] RPC {RPC_LOTE} no existe (¿migración 011?); se usa PATCH por SKU")
+                    self.rpc_disponible = False
+            if not self.rpc_disponible:
+                resultado = self._actualizar_uno_por_uno(lote)
+        except Exception as e:
+            self.eventos.registrar("db", time.perf_counter() - inicio, error=type(e).__name__,
+                                   fuente="rpc" if self.rpc_disponible else "patch", skus=len(lote))
+            print(f"  [ERROR] Lote de {len(lote)} SKUs: {type(e).__name__}: {e}")
+            self.errores += len(lote)
+            return []
+        self.latencias.append(time.perf_counter() - inicio)
+        self.eventos.registrar("db", self.latencias[-1], fuente="rpc" if self.rpc_disponible else "patch",
+                               skus=len(lote))
+
+        sin_match = resultado.get("unmatched") or []
+        self.actualizadas += int(resultado.get("updated") or 0)
+        self.sin_match.extend(sin_match)
+        for sku in sin_match:
             print(f"  [OK-NOBDD] {sku} (imagen subida, SKU no encontrado en products)")
+        print(f"  [LOTE] {len(lote)} SKUs → {resultado.get('updated', 0)} filas actualizadas en DB, "
+              f"{len(sin_match)} sin match")
+        return [(idx, url) for idx, _, url in lote]
+
+    def _actualizar_uno_por_uno(self, lote) -> dict:
+        actualizadas = 0
+        sin_match = []
+        for _, sku, url in lote:
+            filas = actualizar_image_url(self.session, sku, url)
+            actualizadas += filas
+            if filas == 0:
+                sin_match.append(sku)
+        return {"updated": actualizadas, "unmatched": sin_match}
+
+# ─── Deduplicación por contenido ─────────────────────────────────────────────
+def huella_archivo(ruta_local: Path) -> tuple[str, str, int]:
+    """Retorna (sha256, md5, bytes) del archivo. El sha256 define la ruta en el bucket;
+    el md5 es lo que Storage reporta como ETag para comparar sin descargar."""
+    sha, md5, total = hashlib.sha256(), hashlib.md5(), 0
+    with open(ruta_local, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 16), b""):
+            sha.update(bloque)
+            md5.update(bloque)
+            total += len(bloque)
+    return sha.hexdigest(), md5.hexdigest(), total
+
+def ruta_contenido(sha256: str, extension: str = "jpg") -> str:
+    return f"{PREFIJO_CONTENIDO}/{sha256}.{extension}"
+
+# Firma → (Content-Type, extensión en el bucket). WebP se reconoce aparte (RIFF....WEBP)
+_TIPOS_IMAGEN = (
+    (b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (b"\x89PNG", "image/png", "png"),
+    (b"GIF8", "image/gif", "gif"),
+)
+
+def tipo_contenido(ruta_local: Path) -> tuple[str, str]:
+    """Detecta el formato real por sus primeros bytes (el nombre siempre dice .jpg)."""
+    with open(ruta_local, "rb") as f:
+        cabecera = f.read(12)
+    if cabecera.startswith(b"RIFF") and cabecera[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    for firma, content_type, extension in _TIPOS_IMAGEN:
+        if cabecera.startswith(firma):
+            return content_type, extension
+    return "image/jpeg", "jpg"
+
+@lru_cache(maxsize=1)
+def _salida_normalizacion() -> tuple[list[str], frozenset]:
+    """(extensiones a buscar, SKUs inválidos) según lo que dejó 05 en product_images_norm/:
+    el formato de la última corrida en .ajuste y la lista .invalidas."""
+    ajuste = FOLDER_NORM / ".ajuste"
+    formato = ajuste.read_text().split("-", 1)[0] if ajuste.exists() else ""
+    extensiones = [EXTENSIONES_NORM[formato]] if formato in EXTENSIONES_NORM else list(EXTENSIONES_NORM.values())
+    lista = FOLDER_NORM / ".invalidas"
+    invalidas = frozenset(lista.read_text(encoding="utf-8").split()) if lista.exists() else frozenset()
+    return extensiones, invalidas
+
+def resolver_archivo(sku: str, ruta_local: Path):
+    """Archivo a subir para un SKU: la versión de 05_normaliza-imagenes.py si existe,
+    None si 05 la registró como inválida, o el original (p. ej. una imagen que 02
+    bajó después de la última corrida de 05)."""
+    if not FOLDER_NORM.exists():
+        return ruta_local
+    extensiones, invalidas = _salida_normalizacion()
+    if sku in invalidas:
+        return None
+    for extension in extensiones:
+        normalizada = FOLDER_NORM / f"{sku}.{extension}"
+        if normalizada.exists():
+            return normalizada
+    return ruta_local
+
+class ManifestStorage:
+    """Manifest local hash → objeto en el bucket (JSON con escritura atómica).
+
+    Permite resolver sin red los archivos que ya se subieron en corridas anteriores."""
+
+    def __init__(self, ruta: Path):
+        self.ruta = ruta
+        self.datos = json.loads(ruta.read_text()) if ruta.exists() else {}
+
+    def obtener(self, sha256: str):
+        return self.datos.get(sha256)
+
+    def registrar(self, sha256: str, storage_path: str, md5: str, tamano: int):
+        self.datos[sha256] = {"storage_path": storage_path, "md5": md5, "bytes": tamano}
+
+    def guardar(self):
+        tmp = self.ruta.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.datos, indent=1, sort_keys=True))
+        os.replace(tmp, self.ruta)
+
+# ─── Journal de subidas confirmadas ──────────────────────────────────────────
+class JournalSubidas:
+    """Log append-only de los SKUs cuya image_url ya confirmó la DB.
+
+    Cada lote confirmado se escribe y se hace fsync antes de seguir, así que un
+    crash no pierde subidas terminadas y nunca deja el CSV a medias."""
+
+    def __init__(self, ruta: Path):
+        self.ruta = ruta
+        self._archivo = None
+
+    def leer(self) -> dict:
+        """sku → {"sku", "supabase_url", "sha256"}; la última entrada de cada SKU gana."""
+        entradas = {}
+        if not self.ruta.exists():
+            return entradas
+        with open(self.ruta, encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue   # última línea truncada por un crash
+                entradas[registro["sku"]] = registro
+        return entradas
+
+    def registrar(self, entradas: list[tuple[str, str, str]]):
+        """Agrega [(sku, supabase_url, sha256)] y espera a que lleguen al disco."""
+        if self._archivo is None:
+            self._archivo = open(self.ruta, "a", encoding="utf-8")
+        for sku, supabase_url, sha256 in entradas:
+            self._archivo.write(json.dumps({"sku": sku, "supabase_url": supabase_url, "sha256": sha256}) + "\n")
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+
+    def vaciar(self):
+        """Borra el journal; solo después de que el CSV compactado ya reemplazó al anterior."""
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+        self.ruta.unlink(missing_ok=True)
+
+def mezclar_journal(df, entradas: dict) -> tuple[int, int]:
+    """Aplica al mapa las URLs del journal de una corrida interrumpida.
+
+    Una entrada solo vale si el archivo del SKU sigue teniendo el contenido que
+    se subió (mismo sha256): si 04_reprocesa-imagenes.py lo reinició y 02 bajó
+    otra imagen, la URL vieja se descarta y el SKU queda pendiente.
+    Retorna (aplicadas, descartadas)."""
+    aplicadas = descartadas = 0
+    sin_url = df['supabase_url'].astype(str).str.strip() == ''
+    for idx in df.index[sin_url & df['sku'].isin(entradas.keys())]:
+        sku = str(df.at[idx, 'sku'])
+        ruta_local = Path(str(df.at[idx, 'imagen_local']))
+        ruta_local = resolver_archivo(sku, ruta_local) if ruta_local.is_file() else None
+        if ruta_local is not None and huella_archivo(ruta_local)[0] == entradas[sku]["sha256"]:
+            df.at[idx, 'supabase_url'] = entradas[sku]["supabase_url"]
+            aplicadas += 1
         else:
-            print(f"  [OK] {sku} ({filas} fila actualizada en DB)")
-    except Exception as e:
-        print(f"  [ERROR] {sku}: {type(e).__name__}: {e}")
-        errores += 1
-
-    if i % GUARDAR_CADA == 0 or i == len(pendientes):
-        df.to_csv(IMAGENES_MAP, index=False)
-        print(f"  [SAVE] {i}/{len(pendientes)} — subidas: {subidas}, errores: {errores}")
-
-if not SIMULACRO:
-    df.to_csv(IMAGENES_MAP, index=False)
-
-print(f"\nResumen final:")
-print(f"  {'Se subirían' if SIMULACRO else 'Subidas'}:  {subidas}")
-print(f"  Errores:    {errores}")
-if SIMULACRO:
-    print(f"\nCorre con --subir para ejecutar:")
-    print(f"  python scripts/03_sube-imagenes-supabase.py --subir")
+            descartadas += 1
+    return aplicadas, descartadas
+
+def escribir_mapa(df):
+    """imagenes_map.csv con temporal + fsync + rename: nunca queda a medias."""
+    tmp = IMAGENES_MAP.with_suffix(".csv.tmp")
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        df.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, IMAGENES_MAP)
+
+def compactar(df, journal: JournalSubidas):
+    """Vuelca el mapa (ya con lo del journal) al CSV y recién entonces vacía el journal.
+    Un crash entre ambos pasos solo hace que la próxima corrida re-aplique entradas ya aplicadas."""
+    escribir_mapa(df)
+    journal.vaciar()
+
+def objeto_remoto_coincide(session, storage_path: str, md5: str, tamano: int) -> bool:
+    """HEAD al objeto: coincide si el ETag es el md5 local o, sin ETag útil, si el tamaño es igual."""
+    url = f"{SUPABASE_URL}/storage/v1/object/{BUCKET}/{storage_path}"
+    resp = session.head(url, timeout=30)
+    if resp.status_code != 200:
+        return False
+    etag = resp.headers.get("ETag", "").removeprefix("W/").strip('"').lower()
+    if len(etag) == 32:
+        return etag == md5
+    return resp.headers.get("Content-Length") == str(tamano)
+
+def asegurar_blob(session, eventos, sha256: str, md5: str, tamano: int, ruta_local: Path) -> dict:
+    """Garantiza que el contenido esté en el bucket (sube solo si no está ya).
+    Corre en los hilos del pool; no toca el DataFrame ni el manifest."""
+    content_type, extension = tipo_contenido(ruta_local)
+    storage_path = ruta_contenido(sha256, extension)
+    inicio = time.perf_counter()
+    with eventos.medir("subida", fuente="subida", objeto=storage_path) as ev:
+        if objeto_remoto_coincide(session, storage_path, md5, tamano):
+            ev["fuente"] = "remoto"
+            image_url = f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET}/{storage_path}"
+            return {"image_url": image_url, "storage_path": storage_path, "bytes": 0,
+                    "latencia_subida": time.perf_counter() - inicio, "origen": "remoto"}
+        image_url, enviados = subir_imagen(session, storage_path, ruta_local, content_type)
+        ev["bytes"] = enviados
+    return {"image_url": image_url, "storage_path": storage_path, "bytes": enviados,
+            "latencia_subida": time.perf_counter() - inicio, "origen": "subida"}
+
+def reporte_throughput(resultados, segundos, latencias_lotes):
+    """Líneas del reporte de la corrida: archivos/s, MB/s y latencias p50/p95."""
+    if not resultados or segundos <= 0:
+        return ["  Throughput: sin subidas"]
+    megas = sum(r["bytes"] for r in resultados) / 1_000_000
+    subida = [r["latencia_subida"] for r in resultados]
+    return [
+        f"  Throughput: {len(resultados) / segundos:.2f} archivos/s, {megas / segundos:.2f} MB/s "
+        f"({megas:.1f} MB en {segundos:.1f}s)",
+        f"  Latencia subida:  p50 {percentil(subida, 50) * 1000:.0f} ms, p95 {percentil(subida, 95) * 1000:.0f} ms",
+        f"  Latencia lote DB: p50 {percentil(latencias_lotes, 50) * 1000:.0f} ms, "
+        f"p95 {percentil(latencias_lotes, 95) * 1000:.0f} ms ({len(latencias_lotes)} lotes)",
+    ]
+
+# ─── Ejecución ───────────────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Sube imágenes a Supabase Storage y actualiza products.image_url.")
+    parser.add_argument("--subir", action="store_true", help="ejecuta de verdad (sin esto es simulacro)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="subidas simultáneas con sesión compartida (default: %(default)s)")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE,
+                        help="SKUs por actualización masiva de image_url (default: %(default)s)")
+    args = parser.parse_args()
+    simulacro = not args.subir
+    n_workers = max(1, args.workers)
+
+    if not SUPABASE_URL or not SERVICE_ROLE_KEY:
+        print("ERROR: Faltan NEXT_PUBLIC_SUPABASE_URL o SUPABASE_SERVICE_ROLE_KEY en .env.local")
+        sys.exit(1)
+
+    # ─── Cargar mapa ─────────────────────────────────────────────────────────
+    df = pd.read_csv(IMAGENES_MAP, on_bad_lines='warn', engine='python', dtype=str)
+    df['supabase_url'] = df['supabase_url'].fillna('')
+
+    # Lo que una corrida interrumpida ya confirmó en la DB deja de estar pendiente
+    journal = JournalSubidas(JOURNAL)
+    entradas_journal = journal.leer()
+    if entradas_journal:
+        aplicadas, descartadas = mezclar_journal(df, entradas_journal)
+        print(f"Journal:         {len(entradas_journal)} SKUs de una corrida interrumpida "
+              f"({aplicadas} aplicados, {descartadas} descartados porque la imagen cambió)")
+        if not simulacro:
+            compactar(df, journal)
+
+    pendientes = df[
+        df['imagen_local'].notna() &
+        (df['imagen_local'].astype(str) != '') &
+        (df['supabase_url'].isna() | (df['supabase_url'].astype(str).str.strip() == ''))
+    ].copy()
+
+    print(f"{'[SIMULACRO]' if simulacro else '[SUBIDA REAL]'}")
+    print(f"URL proyecto:    {SUPABASE_URL}")
+    print(f"Total en mapa:   {len(df)}")
+    print(f"Pendientes:      {len(pendientes)}")
+    print(f"Ya subidas:      {len(df) - len(pendientes)}")
+    print(f"Workers:         {n_workers}")
+    print(f"Lote DB:         {max(1, args.lote)}\n")
+
+    subidas  = 0
+    errores  = 0
+    sin_normalizar = 0
+    tareas = []
+    for idx, row in pendientes.iterrows():
+        sku        = str(row['sku'])
+        ruta_local = Path(str(row['imagen_local']))
+
+        if not ruta_local.exists():
+            print(f"  [WARN] No existe localmente: {ruta_local.name}")
+            errores += 1
+            continue
+
+        original = ruta_local
+        ruta_local = resolver_archivo(sku, original)
+        if ruta_local is None:
+            print(f"  [WARN] {sku} inválida según 05_normaliza-imagenes.py, se omite")
+            errores += 1
+            continue
+        if FOLDER_NORM.exists() and ruta_local == original:
+            print(f"  [WARN] {sku} sin versión normalizada, se sube el original")
+            sin_normalizar += 1
+
+        tareas.append((idx, sku, ruta_local))
+
+    # ─── Agrupar por contenido ───────────────────────────────────────────────
+    manifest = ManifestStorage(MANIFEST)
+    grupos = {}    # sha256 → {"md5", "bytes", "ruta", "skus": [(idx, sku)]}
+    with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="hash") as executor:
+        huellas = executor.map(lambda t: huella_archivo(t[2]), tareas)
+        for (idx, sku, ruta_local), (sha256, md5, tamano) in zip(tareas, huellas):
+            grupo = grupos.setdefault(sha256, {"md5": md5, "bytes": tamano, "ruta": ruta_local, "skus": []})
+            grupo["skus"].append((idx, sku))
+    en_manifest = [sha for sha in grupos if manifest.obtener(sha)]
+    por_subir = [sha for sha in grupos if not manifest.obtener(sha)]
+
+    print(f"Archivos pendientes: {len(tareas)}")
+    if sin_normalizar:
+        print(f"Sin normalizar:      {sin_normalizar} (se sube el original; corre 05_normaliza-imagenes.py "
+              f"antes de --subir para normalizarlos)")
+    print(f"Contenidos únicos:   {len(grupos)} ({len(tareas) - len(grupos)} SKUs comparten imagen)")
+    print(f"Ya en manifest:      {len(en_manifest)}")
+    print(f"Por verificar/subir: {len(por_subir)}\n")
+
+    if simulacro:
+        for sha in por_subir:
+            skus = ", ".join(sku for _, sku in grupos[sha]["skus"])
+            _, extension = tipo_contenido(grupos[sha]["ruta"])
+            print(f"  [SIM] {skus} → {BUCKET}/{ruta_contenido(sha, extension)}")
+        subidas = len(por_subir)
+
+    resultados = []
+    latencias_lotes = []
+    omitidos_remoto = 0
+    bytes_remoto = 0
+    inicio = time.perf_counter()
+    eventos = None
+    if tareas and not simulacro:
+        eventos = Instrumentacion(Path(__file__).stem, total=len(tareas))
+        session = crear_sesion(SERVICE_ROLE_KEY, conexiones=n_workers)
+        actualizador = ActualizadorImageUrl(session, args.lote, eventos)
+        sha_por_idx = {idx: sha for sha, grupo in grupos.items() for idx, _ in grupo["skus"]}
+
+        def confirmar(confirmados):
+            # supabase_url solo se llena cuando la DB ya tiene la URL: si el lote
+            # falla, la siguiente corrida vuelve a intentar ese SKU
+            if not confirmados:
+                return
+            for idx, image_url in confirmados:
+                df.at[idx, 'supabase_url'] = image_url
+            with eventos.medir("journal", skus=len(confirmados)):
+                journal.registrar([(str(df.at[idx, 'sku']), url, sha_por_idx[idx]) for idx, url in confirmados])
+            eventos.avance(len(confirmados))
+            print(f"  [SAVE] {len(confirmados)} SKUs al journal; subidas: {subidas}, errores: {errores}")
+
+        def asignar(sha256, image_url):
+            for idx, sku in grupos[sha256]["skus"]:
+                confirmar(actualizador.agregar(idx, sku, image_url))
+
+        # Lo que ya está en el manifest no necesita red: directo al lote de DB
+        for sha in en_manifest:
+            storage_path = manifest.obtener(sha)["storage_path"]
+            asignar(sha, f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET}/{storage_path}")
+
+        with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="subida") as executor:
+            futuros = {
+                executor.submit(
+                    asegurar_blob, session, eventos, sha, grupos[sha]["md5"], grupos[sha]["bytes"], grupos[sha]["ruta"],
+                ): sha
+                for sha in por_subir
+            }
+            # Solo este hilo modifica df y el manifest, llama a la DB y escribe el CSV
+            for futuro in as_completed(futuros):
+                sha = futuros[futuro]
+                skus = ", ".join(sku for _, sku in grupos[sha]["skus"])
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    print(f"  [ERROR] {skus}: {type(e).__name__}: {e}")
+                    errores += len(grupos[sha]["skus"])
+                    continue
+                manifest.registrar(sha, resultado["storage_path"], grupos[sha]["md5"], grupos[sha]["bytes"])
+                if resultado["origen"] == "remoto":
+                    omitidos_remoto += 1
+                    bytes_remoto += grupos[sha]["bytes"]
+                    print(f"  [SKIP] {skus} (ya estaba en el bucket)")
+                else:
+                    resultados.append(resultado)
+                    subidas += 1
+                    print(f"  [OK] {skus} subida ({resultado['latencia_subida'] * 1000:.0f} ms)")
+                asignar(sha, resultado["image_url"])
+        confirmar(actualizador.vaciar())
+        manifest.guardar()
+        session.close()
+
+        errores += actualizador.errores
+        latencias_lotes = actualizador.latencias
+        print(f"\n  Filas actualizadas en DB: {actualizador.actualizadas}")
+        print(f"  SKUs sin match en products: {len(actualizador.sin_match)}")
+    segundos = time.perf_counter() - inicio
+
+    if not simulacro:
+        compactar(df, journal)
+
+    print(f"\nResumen final:")
+    print(f"  {'Se subirían' if simulacro else 'Subidas'}:  {subidas}")
+    print(f"  Errores:    {errores}")
+    if not simulacro:
+        ahorrados = sum(g["bytes"] * (len(g["skus"]) - 1) for g in grupos.values())
+        ahorrados += sum(grupos[sha]["bytes"] for sha in en_manifest) + bytes_remoto
+        print(f"  Omitidas (manifest / ya en bucket): {len(en_manifest)} / {omitidos_remoto}")
+        print(f"  Bytes no enviados por deduplicación: {ahorrados / 1_000_000:.1f} MB")
+        print("\n".join(reporte_throughput(resultados, segundos, latencias_lotes)))
+    if eventos is not None:
+        print("\n".join(lineas_resumen(eventos.cerrar())))
+        print(f"  Eventos: {eventos.ruta}")
+    if simulacro:
+        print(f"\nCorre con --subir para ejecutar:")
+        print(f"  python scripts/03_sube-imagenes-supabase.py --subir")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Reinicia las imágenes de un conjunto de SKUs para que 02_agrega-imagenes.py las
+vuelva a buscar: borra el archivo local (y su versión normalizada), las marca
+como pendientes en estado_pipeline.sqlite3, las quita del cache de imágenes
+(por EAN/nombre), regenera imagenes_map.csv y, con
+--bucket, quita products.image_url y borra del bucket los objetos que ningún
+otro SKU usa.
+
+Selectores (se combinan con AND; se requiere al menos uno):
+  --skus ARCHIVO              un SKU por línea (p. ej. reprocesar_skus.txt de 07_qa-imagenes.py)
+  --categoria / --departamento  se pueden repetir; sin distinguir acentos ni mayúsculas
+  --fuente bing|google        motor del que se descargó la imagen (registrado por 02)
+  --qa MARCA[,MARCA]          marcas de qa_imagenes.csv (duplicado, placeholder, chica, ...)
+  --desde / --hasta AAAA-MM-DD  fecha de descarga (fecha del archivo local o del estado)
+  --filas INICIO[:FIN]        rango de filas (0-based) de productos_listos_para_importar.csv
+
+Uso:
+    python scripts/04_reprocesa-imagenes.py --skus output/current/reprocesar_skus.txt   # simulacro
+    python scripts/04_reprocesa-imagenes.py --fuente google --desde 2026-10-01 --borrar
+    python scripts/04_reprocesa-imagenes.py --qa duplicado,placeholder --borrar --bucket
+"""
+import argparse
+import json
+import os
+import sys
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from estado_pipeline import IMAGEN_PENDIENTE, EstadoPipeline
+from supabase_http import BUCKET, cargar_config, crear_sesion
+
+SUPABASE_URL, SERVICE_ROLE_KEY = cargar_config()
+
+# ─── Rutas ───────────────────────────────────────────────────────────────────
+SCRIPT_DIR   = Path(__file__).resolve().parent
+CURRENT_DIR  = SCRIPT_DIR.parent / "output" / "current"
+CSV_INPUT    = CURRENT_DIR / "productos_listos_para_importar.csv"
+FOLDER       = CURRENT_DIR / "product_images"
+FOLDER_NORM  = CURRENT_DIR / "product_images_norm"
+CSV_IMAGENES = CURRENT_DIR / "imagenes_map.csv"
+ESTADO_DB    = CURRENT_DIR / "estado_pipeline.sqlite3"
+CSV_QA       = CURRENT_DIR / "qa_imagenes.csv"
+MANIFEST     = CURRENT_DIR / "storage_manifest.json"
+CACHE_IMG    = CURRENT_DIR / "cache_imagenes"
+
+LOTE_BUCKET  = 1000   # objetos por DELETE de Storage (límite de la API)
+LOTE_DB      = 200    # SKUs por llamada a la RPC de image_url
+RPC_LOTE     = "bulk_update_product_image_urls"   # supabase/migrations/011
+
+# ─── Selección ───────────────────────────────────────────────────────────────
+def _normalizar(texto) -> str:
+    texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(texto.lower().split())
+
+def escanear_carpeta(carpeta: Path) -> dict:
+    """Un solo recorrido del directorio: sku → (ruta, mtime)."""
+    if not carpeta.exists():
+        return {}
+    archivos = {}
+    with os.scandir(carpeta) as entradas:
+        for e in entradas:
+            if e.is_file() and not e.name.endswith((".part", ".tmp")) and not e.name.startswith("."):
+                archivos[Path(e.name).stem] = (Path(e.path), e.stat().st_mtime)
+    return archivos
+
+def _fecha(texto: str, fin_del_dia=False) -> float:
+    fecha = datetime.strptime(texto, "%Y-%m-%d")
+    if fin_del_dia:
+        fecha = fecha.replace(hour=23, minute=59, second=59)
+    return fecha.timestamp()
+
+def _rango_filas(texto: str) -> slice:
+    inicio, _, fin = texto.partition(":")
+    return slice(int(inicio or 0), int(fin) if fin else None)
+
+def seleccionar(args, locales: dict, imagenes: dict) -> set:
+    """Aplica los selectores (AND) sobre los SKUs con imagen local o registrada."""
+    seleccion = set(locales) | {sku for sku, i in imagenes.items() if i["imagen_estado"] != IMAGEN_PENDIENTE}
+
+    if args.skus:
+        lista = {linea.strip() for linea in args.skus.read_text(encoding="utf-8").splitlines()}
+        seleccion &= {sku for sku in lista if sku and not sku.startswith("#")}
+
+    if args.categoria or args.departamento or args.filas:
+        df = pd.read_csv(CSV_INPUT, dtype=str, keep_default_na=False)
+        if args.filas:
+            df = df.iloc[_rango_filas(args.filas)]
+        if args.categoria:
+            df = df[df["categoria"].map(_normalizar).isin({_normalizar(c) for c in args.categoria})]
+        if args.departamento:
+            df = df[df["departamento"].map(_normalizar).isin({_normalizar(d) for d in args.departamento})]
+        seleccion &= set(df["clave1"].str.strip())
+
+    if args.fuente:
+        fuentes = {f.lower() for f in args.fuente}
+        seleccion &= {sku for sku, i in imagenes.items() if i["imagen_fuente"].lower() in fuentes}
+
+    if args.qa:
+        marcas = {m.strip() for m in args.qa.split(",") if m.strip()}
+        qa = pd.read_csv(CSV_QA, dtype=str, keep_default_na=False)
+        seleccion &= {
+            sku for sku, marcas_sku in zip(qa["sku"], qa["marcas"])
+            if marcas & set(marcas_sku.split(";"))
+        }
+
+    if args.desde or args.hasta:
+        desde = _fecha(args.desde) if args.desde else float("-inf")
+        hasta = _fecha(args.hasta, fin_del_dia=True) if args.hasta else float("inf")
+
+        def fecha_imagen(sku):
+            if sku in locales:
+                return locales[sku][1]
+            return imagenes.get(sku, {}).get("actualizado_en", float("-inf"))
+
+        seleccion = {sku for sku in seleccion if desde <= fecha_imagen(sku) <= hasta}
+
+    return seleccion
+
+# ─── Bucket y DB ─────────────────────────────────────────────────────────────
+def ruta_storage(supabase_url: str) -> str:
+    """contenido/<sha>.jpg a partir de la URL pública; '' si no es de este bucket."""
+    _, separador, ruta = supabase_url.partition(f"/object/public/{BUCKET}/")
+    return ruta if separador else ""
+
+def objetos_a_borrar(seleccion: set, imagenes: dict) -> list[str]:
+    """Objetos de los SKUs seleccionados que ningún otro SKU referencia
+    (con direccionamiento por contenido varios SKUs comparten un objeto)."""
+    propios, ajenos = set(), set()
+    for sku, info in imagenes.items():
+        ruta = ruta_storage(info["supabase_url"])
+        if ruta:
+            (propios if sku in seleccion else ajenos).add(ruta)
+    return sorted(propios - ajenos)
+
+def limpiar_image_urls(session, skus: list[str]) -> int:
+    """products.image_url = NULL en lotes vía RPC; PATCH por SKU si la migración no está."""
+    limpiadas = 0
+    for i in range(0, len(skus), LOTE_DB):
+        lote = skus[i:i + LOTE_DB]
+        resp = session.post(
+            f"{SUPABASE_URL}/rest/v1/rpc/{RPC_LOTE}",
+            headers={"Content-Type": "application/json"},
+            json={"items": [{"sku": sku, "image_url": None} for sku in lote]},
+            timeout=60,
+        )
+        if resp.status_code == 404:
+            for sku in lote:
+                r = session.patch(
+                    f"{SUPABASE_URL}/rest/v1/products",
+                    headers={"Content-Type": "application/json"},
+                    params={"sku": f"eq.{sku}"},
+                    json={"image_url": None},
+                    timeout=30,
+                )
+                r.raise_for_status()
+                limpiadas += 1
+            continue
+        resp.raise_for_status()
+        limpiadas += resp.json().get("updated", 0)
+    return limpiadas
+
+def borrar_objetos(session, rutas: list[str]) -> int:
+    """DELETE /storage/v1/object/<bucket> con hasta LOTE_BUCKET rutas por llamada."""
+    borrados = 0
+    for i in range(0, len(rutas), LOTE_BUCKET):
+        lote = rutas[i:i + LOTE_BUCKET]
+        resp = session.delete(
+            f"{SUPABASE_URL}/storage/v1/object/{BUCKET}",
+            headers={"Content-Type": "application/json"},
+            json={"prefixes": lote},
+            timeout=120,
+        )
+        if not resp.ok:
+            raise Exception(f"HTTP {resp.status_code}: {resp.text}")
+        borrados += len(lote)
+        print(f"  [OK bucket] {borrados}/{len(rutas)} objetos")
+    return borrados
+
+def quitar_del_manifest(rutas: set[str]):
+    """Sin esto, 03 daría por subidos contenidos cuyo objeto ya no existe."""
+    if not MANIFEST.exists() or not rutas:
+        return
+    datos = json.loads(MANIFEST.read_text())
+    datos = {sha: obj for sha, obj in datos.items() if obj["storage_path"] not in rutas}
+    tmp = MANIFEST.with_suffix(".tmp")
+    tmp.write_text(json.dumps(datos, indent=1, sort_keys=True))
+    os.replace(tmp, MANIFEST)
+
+# ─── Ejecución ───────────────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Reinicia imágenes seleccionadas para re-procesarlas.")
+    parser.add_argument("--skus", type=Path, help="archivo con un SKU por línea")
+    parser.add_argument("--categoria", action="append", help="categoría (se puede repetir)")
+    parser.add_argument("--departamento", action="append", help="departamento (se puede repetir)")
+    parser.add_argument("--fuente", action="append", help="motor de búsqueda de origen (se puede repetir)")
+    parser.add_argument("--qa", help="marcas de qa_imagenes.csv separadas por coma")
+    parser.add_argument("--desde", help="fecha de descarga mínima (AAAA-MM-DD)")
+    parser.add_argument("--hasta", help="fecha de descarga máxima (AAAA-MM-DD, inclusive)")
+    parser.add_argument("--filas", help="rango INICIO[:FIN] de filas del CSV convertido (0-based)")
+    parser.add_argument("--borrar", action="store_true", help="ejecuta de verdad (sin esto es simulacro)")
+    parser.add_argument("--bucket", action="store_true",
+                        help="también limpia products.image_url y borra del bucket los objetos sin otro uso")
+    args = parser.parse_args()
+    simulacro = not args.borrar
+
+    selectores = (args.skus, args.categoria, args.departamento, args.fuente, args.qa,
+                  args.desde, args.hasta, args.filas)
+    if not any(selectores):
+        parser.error("indica al menos un selector (--skus, --categoria, --departamento, --fuente, "
+                     "--qa, --desde/--hasta, --filas)")
+    if args.bucket and (not SUPABASE_URL or not SERVICE_ROLE_KEY):
+        print("ERROR: --bucket requiere NEXT_PUBLIC_SUPABASE_URL y SUPABASE_SERVICE_ROLE_KEY en .env.local")
+        sys.exit(1)
+
+    estado = EstadoPipeline(str(ESTADO_DB))
+    estado.importar_mapa_csv(str(CSV_IMAGENES), str(FOLDER))   # el mapa puede traer supabase_url de 03
+    imagenes = estado.imagenes()
+    locales = escanear_carpeta(FOLDER)
+    normalizadas = escanear_carpeta(FOLDER_NORM)
+
+    seleccion = seleccionar(args, locales, imagenes)
+    archivos = [locales[sku][0] for sku in sorted(seleccion) if sku in locales]
+    archivos += [
+        ruta for nombre, (ruta, _) in normalizadas.items()
+        if nombre in seleccion or nombre.removesuffix("_thumb") in seleccion
+    ]
+    objetos = objetos_a_borrar(seleccion, imagenes) if args.bucket else []
+    con_url = sorted(sku for sku in seleccion if imagenes.get(sku, {}).get("supabase_url"))
+
+    print(f"{'[SIMULACRO]' if simulacro else '[REPROCESO REAL]'}")
+    print(f"SKUs seleccionados:     {len(seleccion)}")
+    print(f"Archivos locales:       {len(archivos)} (originales y normalizados)")
+    print(f"En el estado/mapa:      {sum(1 for sku in seleccion if sku in imagenes)}")
+    if args.bucket:
+        print(f"image_url a limpiar:    {len(con_url)}")
+        print(f"Objetos del bucket:     {len(objetos)} sin otro SKU que los use")
+    for sku in sorted(seleccion)[:20]:
+        print(f"  {'[REPROCESAR]' if simulacro else '[OK]'} {sku}")
+    if len(seleccion) > 20:
+        print(f"  ... y {len(seleccion) - 20} más")
+
+    if not simulacro and seleccion:
+        # 1) Estado + mapa primero: si algo falla después, 02 de todos modos los re-busca
+        estado.reiniciar_imagenes(sorted(seleccion))
+        estado.exportar_mapa_csv(str(CSV_IMAGENES))
+        # Sin esto 02 tomaría del cache (por EAN o nombre) la misma imagen que se quiere reemplazar
+        en_cache = estado.invalidar_cache(seleccion)
+        # 2) Archivos locales
+        for ruta in archivos + [CACHE_IMG / archivo for archivo in en_cache]:
+            ruta.unlink(missing_ok=True)
+        print(f"  [OK cache] {len(en_cache)} imágenes quitadas del cache de 02")
+        # 3) DB antes que el bucket: la tienda nunca apunta a un objeto borrado
+        if args.bucket:
+            session = crear_sesion(SERVICE_ROLE_KEY)
+            print(f"  [OK db] image_url limpiadas: {limpiar_image_urls(session, con_url)}")
+            borrar_objetos(session, objetos)
+            quitar_del_manifest(set(objetos))
+            session.close()
+    estado.cerrar()
+
+    print(f"\nResumen:")
+    print(f"  {'Se reprocesarían' if simulacro else 'Reiniciados'}: {len(seleccion)} SKUs")
+    if simulacro:
+        print(f"\nCorre con --borrar para ejecutar (y --bucket para limpiar Storage y image_url):")
+        print(f"  python scripts/04_reprocesa-imagenes.py {' '.join(sys.argv[1:])} --borrar")
+    else:
+        print(f"  Vuelve a correr 02_agrega-imagenes.py para buscar solo esos SKUs.")
+
+
+if __name__ == "__main__":
+    main()
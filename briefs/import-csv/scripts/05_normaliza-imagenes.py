@@ -0,0 +1,203 @@
+"""
+Normaliza las imágenes descargadas antes de subirlas a Supabase Storage.
+
+Valida cada archivo de product_images/, lo re-codifica como JPEG (o WebP) real
+con una dimensión máxima y calidad configurables, sin metadatos (EXIF, ICC,
+comentarios), y opcionalmente genera una miniatura. Corre en un pool de
+procesos (una imagen por tarea) para usar todos los núcleos.
+
+03_sube-imagenes-supabase.py sube la versión normalizada si existe, omite los
+SKUs de product_images_norm/.invalidas y sube el original de los demás.
+
+Uso:
+    python scripts/05_normaliza-imagenes.py                      # JPEG, 1200 px, calidad 82
+    python scripts/05_normaliza-imagenes.py --formato webp --miniaturas
+    python scripts/05_normaliza-imagenes.py --max-dim 800 --calidad 75 --procesos 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from eventos_pipeline import Instrumentacion, lineas_resumen
+
+# ─── Rutas ───────────────────────────────────────────────────────────────────
+SCRIPT_DIR = Path(__file__).resolve().parent
+CURRENT_OUTPUT_DIR = SCRIPT_DIR.parent / "output" / "current"
+FOLDER = CURRENT_OUTPUT_DIR / "product_images"
+FOLDER_NORM = CURRENT_OUTPUT_DIR / "product_images_norm"
+LISTA_INVALIDAS = FOLDER_NORM / ".invalidas"   # SKUs que 03 no debe subir, uno por línea
+
+# ─── Parámetros ──────────────────────────────────────────────────────────────
+MAX_DIM = 1200         # lado mayor en px; las imágenes más chicas no se agrandan
+CALIDAD = 82
+FORMATO = "jpeg"       # jpeg | webp
+MINIATURA_DIM = 320    # lado mayor de la miniatura ({sku}_thumb.{ext})
+MIN_DIM = 64           # por debajo de esto la imagen se considera inválida
+EXTENSIONES = {"jpeg": "jpg", "webp": "webp"}
+
+# Huella del ajuste: si cambia, se regeneran las salidas aunque sean más nuevas que la fuente
+def _firma(max_dim, calidad, formato, miniaturas):
+    return f"{formato}-{max_dim}-{calidad}-{int(miniaturas)}"
+
+def _a_rgb(img):
+    """Aplana transparencia sobre blanco (fondo del storefront) y convierte a RGB."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        fondo = Image.new("RGB", img.size, (255, 255, 255))
+        fondo.paste(img, mask=img.getchannel("A"))
+        return fondo
+    return img.convert("RGB")
+
+def _guardar(img, destino, formato, calidad):
+    tmp = destino.with_name(destino.name + ".part")
+    if formato == "webp":
+        img.save(tmp, "WEBP", quality=calidad, method=6)
+    else:
+        img.save(tmp, "JPEG", quality=calidad, optimize=True, progressive=True)
+    os.replace(tmp, destino)
+
+def _borrar_salidas(carpeta_destino, sku, conservar=None):
+    """Quita {sku}.{ext} y {sku}_thumb.{ext} de los formatos distintos de `conservar`
+    (de todos si es None): 03 no debe encontrar una versión vieja u obsoleta."""
+    for ext in EXTENSIONES.values():
+        if ext == conservar:
+            continue
+        for nombre in (f"{sku}.{ext}", f"{sku}_thumb.{ext}"):
+            (Path(carpeta_destino) / nombre).unlink(missing_ok=True)
+
+def normalizar_imagen(origen, carpeta_destino, max_dim, calidad, formato, miniaturas):
+    """Corre en un proceso del pool. Retorna un dict con el resultado y su duración (nunca lanza)."""
+    inicio = time.perf_counter()
+    resultado = _normalizar(origen, carpeta_destino, max_dim, calidad, formato, miniaturas)
+    try:
+        if resultado["estado"] == "ok":
+            _borrar_salidas(carpeta_destino, resultado["sku"], conservar=EXTENSIONES[formato])
+        else:
+            _borrar_salidas(carpeta_destino, resultado["sku"])   # si antes era válida, su salida ya no vale
+    except OSError as e:
+        resultado["detalle"] = f"{resultado.get('detalle', '')} (no se pudo limpiar: {e})".strip()
+    resultado["segundos"] = time.perf_counter() - inicio
+    return resultado
+
+def _normalizar(origen, carpeta_destino, max_dim, calidad, formato, miniaturas):
+    origen = Path(origen)
+    sku = origen.stem
+    ext = EXTENSIONES[formato]
+    destino = Path(carpeta_destino) / f"{sku}.{ext}"
+    try:
+        with Image.open(origen) as img:
+            img.verify()   # detecta archivos truncados o que no son imagen
+        with Image.open(origen) as img:
+            formato_origen = img.format
+            img = ImageOps.exif_transpose(img)   # respeta la orientación antes de tirar el EXIF
+            if min(img.size) < MIN_DIM:
+                return {"sku": sku, "estado": "invalida", "detalle": f"muy chica {img.size[0]}x{img.size[1]}"}
+            img = _a_rgb(img)
+            img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+            # Imagen nueva sin info/exif/icc: el save no arrastra metadatos
+            limpia = Image.new("RGB", img.size)
+            limpia.paste(img)
+            _guardar(limpia, destino, formato, calidad)
+            if miniaturas:
+                miniatura = limpia.copy()
+                miniatura.thumbnail((MINIATURA_DIM, MINIATURA_DIM), Image.Resampling.LANCZOS)
+                _guardar(miniatura, destino.with_name(f"{sku}_thumb.{ext}"), formato, calidad)
+    except Exception as e:
+        return {"sku": sku, "estado": "invalida", "detalle": f"{type(e).__name__}: {e}"}
+    return {
+        "sku": sku,
+        "estado": "ok",
+        "formato_origen": formato_origen,
+        "bytes_origen": origen.stat().st_size,
+        "bytes_destino": destino.stat().st_size,
+    }
+
+def _pendientes(max_dim, calidad, formato, miniaturas, forzar):
+    """Archivos de product_images/ sin salida normalizada vigente (más nueva y mismo ajuste)."""
+    ext = EXTENSIONES[formato]
+    marca = FOLDER_NORM / ".ajuste"
+    mismo_ajuste = marca.exists() and marca.read_text() == _firma(max_dim, calidad, formato, miniaturas)
+    existentes = {e.name: e.stat().st_mtime for e in os.scandir(FOLDER_NORM) if e.is_file()}
+    pendientes = []
+    for entrada in os.scandir(FOLDER):
+        if not entrada.is_file() or entrada.name.endswith(".part"):
+            continue
+        salida = f"{Path(entrada.name).stem}.{ext}"
+        vigente = mismo_ajuste and existentes.get(salida, 0) >= entrada.stat().st_mtime
+        if forzar or not vigente:
+            pendientes.append(entrada.path)
+    return pendientes
+
+def main():
+    parser = argparse.ArgumentParser(description="Normaliza imágenes antes de subirlas.")
+    parser.add_argument("--max-dim", type=int, default=MAX_DIM, help="lado mayor en px (default: %(default)s)")
+    parser.add_argument("--calidad", type=int, default=CALIDAD, help="calidad de compresión (default: %(default)s)")
+    parser.add_argument("--formato", choices=sorted(EXTENSIONES), default=FORMATO,
+                        help="formato de salida (default: %(default)s)")
+    parser.add_argument("--miniaturas", action="store_true",
+                        help=f"genera también {{sku}}_thumb con lado mayor {MINIATURA_DIM} px")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1,
+                        help="procesos del pool (default: núcleos disponibles)")
+    parser.add_argument("--forzar", action="store_true", help="re-normaliza aunque la salida esté vigente")
+    args = parser.parse_args()
+
+    FOLDER_NORM.mkdir(parents=True, exist_ok=True)
+    pendientes = _pendientes(args.max_dim, args.calidad, args.formato, args.miniaturas, args.forzar)
+
+    print(f"Origen:     {FOLDER}")
+    print(f"Destino:    {FOLDER_NORM}")
+    print(f"Ajuste:     {args.formato}, max {args.max_dim}px, calidad {args.calidad}"
+          f"{', con miniaturas' if args.miniaturas else ''}")
+    print(f"Pendientes: {len(pendientes)} imágenes, {args.procesos} procesos\n")
+
+    eventos = Instrumentacion(Path(__file__).stem, total=len(pendientes))
+    inicio = time.perf_counter()
+    ok = []
+    invalidas = []
+    with ProcessPoolExecutor(max_workers=max(1, args.procesos)) as executor:
+        resultados = executor.map(
+            normalizar_imagen,
+            pendientes,
+            [str(FOLDER_NORM)] * len(pendientes),
+            [args.max_dim] * len(pendientes),
+            [args.calidad] * len(pendientes),
+            [args.formato] * len(pendientes),
+            [args.miniaturas] * len(pendientes),
+            chunksize=16,
+        )
+        for resultado in resultados:
+            eventos.registrar("normalizacion", resultado["segundos"], fuente=resultado.get("formato_origen", ""),
+                              error="" if resultado["estado"] == "ok" else "invalida", sku=resultado["sku"])
+            eventos.avance()
+            if resultado["estado"] == "ok":
+                ok.append(resultado)
+            else:
+                invalidas.append(resultado)
+                print(f"  [INVALIDA] {resultado['sku']}: {resultado['detalle']}")
+    segundos = time.perf_counter() - inicio
+    # Las inválidas nunca tienen salida vigente, así que cada corrida las vuelve a evaluar todas
+    tmp = LISTA_INVALIDAS.with_name(LISTA_INVALIDAS.name + ".part")
+    tmp.write_text("".join(f"{r['sku']}\n" for r in sorted(invalidas, key=lambda r: r["sku"])), encoding="utf-8")
+    os.replace(tmp, LISTA_INVALIDAS)
+    (FOLDER_NORM / ".ajuste").write_text(_firma(args.max_dim, args.calidad, args.formato, args.miniaturas))
+
+    antes = sum(r["bytes_origen"] for r in ok)
+    despues = sum(r["bytes_destino"] for r in ok)
+    no_jpeg = sum(1 for r in ok if r["formato_origen"] != "JPEG")
+    print(f"\nResumen:")
+    print(f"  Normalizadas: {len(ok)} ({no_jpeg} no eran JPEG en origen)")
+    print(f"  Inválidas:    {len(invalidas)} (sin versión normalizada; 03 las omite, ver {LISTA_INVALIDAS})")
+    if ok:
+        print(f"  Tamaño:       {antes / 1_000_000:.1f} MB → {despues / 1_000_000:.1f} MB "
+              f"({1 - despues / antes:.0%} menos)")
+    if segundos > 0 and pendientes:
+        print(f"  Velocidad:    {len(pendientes) / segundos:.1f} imágenes/s")
+    print("\n".join(lineas_resumen(eventos.cerrar())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Carga el CSV convertido directo en la tabla products con upserts por lote vía
+PostgREST (on_conflict=sku), sin pasar por el importador del admin, que valida
+e inserta en bloques chicos con reintentos fila por fila.
+
+Aplica las mismas reglas que src/lib/import/csv (parseCsv, validators, mapping):
+columnas de CsvRawRow, campos obligatorios, precio > 0, reglas de
+category_mapping_rules por prioridad y categoría curada → id. Reglas y
+categorías se leen una sola vez y se resuelven en memoria.
+
+Uso:
+    python scripts/06_carga-masiva-productos.py                      # simulacro: valida y reporta
+    python scripts/06_carga-masiva-productos.py --cargar             # upsert real
+    python scripts/06_carga-masiva-productos.py --cargar --lote 1000 --workers 4
+    python scripts/06_carga-masiva-productos.py --csv output/current/productos_sin_conflictos.csv
+"""
+import argparse
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from eventos_pipeline import Instrumentacion, lineas_resumen, percentil
+from supabase_http import cargar_config, crear_sesion
+
+SUPABASE_URL, SERVICE_ROLE_KEY = cargar_config()
+
+# ─── Rutas ───────────────────────────────────────────────────────────────────
+SCRIPT_DIR     = Path(__file__).parent
+IMPORT_CSV_DIR = SCRIPT_DIR.parent
+CSV_INPUT      = IMPORT_CSV_DIR / "output" / "current" / "inventario_actualizado.csv"
+REPORTE        = IMPORT_CSV_DIR / "output" / "current" / "carga_masiva_issues.csv"
+
+MAPPING_VERSION = "v1"
+TAMANO_LOTE     = 500    # filas por upsert (--lote N)
+WORKERS         = 1      # upserts simultáneos (--workers N)
+PAGINA          = 1000   # filas por página al leer tablas (límite por defecto de PostgREST)
+
+# Mismo orden que CsvRawRow (src/lib/import/csv/types.ts)
+COLUMNAS_CSV = [
+    "nombre", "descripcion", "precio", "departamento", "categoria",
+    "clave1", "clave2", "codigo_sat", "disponible", "destacado", "temporada",
+]
+COLUMNAS_OBLIGATORIAS = ["nombre", "precio", "departamento", "categoria", "clave1"]
+
+# ─── Normalizadores (espejo de src/lib/import/csv/normalizers.ts) ───────────
+def normalizar_clave(raw: str) -> str:
+    """normalizeCategoryKey: sin acentos (NFD sin U+0300–U+036F), minúsculas, trim."""
+    texto = unicodedata.normalize("NFD", raw)
+    texto = "".join(c for c in texto if not "̀" <= c <= "ͯ")
+    return texto.lower().strip()
+
+_NUMERO_INICIAL = re.compile(r"\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)")
+
+def normalizar_precio(raw: str) -> float:
+    """normalizePrice: quita $ y comas; como parseFloat, toma el número inicial o NaN."""
+    if not raw or not raw.strip():
+        return float("nan")
+    match = _NUMERO_INICIAL.match(raw.strip().replace("$", "").replace(",", ""))
+    return float(match.group(1)) if match else float("nan")
+
+def es_verdadero(raw: str) -> bool:
+    """parseBooleanField."""
+    return (raw or "").strip().lower() in ("true", "1", "si", "sí", "yes")
+
+def nulo_si_vacio(raw: str):
+    """nullableString."""
+    limpio = (raw or "").strip()
+    return limpio or None
+
+def slugify(texto: str) -> str:
+    """Espejo de src/lib/slugify.ts."""
+    texto = normalizar_clave(texto)
+    texto = re.sub(r"[^a-z0-9\s-]", "", texto)
+    texto = re.sub(r"[\s_]+", "-", texto)
+    texto = re.sub(r"-+", "-", texto)
+    return texto.strip("-")
+
+# ─── Reglas de categoría ─────────────────────────────────────────────────────
+class ResolvedorCategorias:
+    """resolveCategory + lookup de category_id, indexado una vez.
+
+    Candidatas de un par (departamento, categoria): las reglas exactas, las de
+    departamento '*', las de categoria '*' y '*'/'*'. Gana la de mayor prioridad
+    y, en empate, la primera en el orden en que llegaron (como el sort estable de
+    TS). Cada par distinto se resuelve una sola vez."""
+
+    def __init__(self, reglas: list[dict], categorias: list[dict]):
+        self._por_par = {}
+        for orden, regla in enumerate(reglas):
+            par = (regla["departamento_raw"], regla["categoria_raw"])
+            clave = (regla["priority"], -orden)
+            if par not in self._por_par or clave > self._por_par[par][0]:
+                self._por_par[par] = (clave, regla["curated_category"])
+        self._ids = {c["name"]: c["id"] for c in categorias}
+        self._cache = {}
+
+    def resolver(self, departamento: str, categoria: str) -> tuple[str | None, str]:
+        """Retorna (category_id, "") o (None, detalle del issue UNMAPPED_CATEGORY)."""
+        par = (departamento, categoria)
+        if par not in self._cache:
+            self._cache[par] = self._resolver(departamento, categoria)
+        return self._cache[par]
+
+    def _resolver(self, departamento, categoria):
+        candidatas = [
+            self._por_par[p]
+            for p in ((departamento, categoria), ("*", categoria), (departamento, "*"), ("*", "*"))
+            if p in self._por_par
+        ]
+        if not candidatas:
+            return None, (f'Sin regla de mapeo para departamento="{departamento}" '
+                          f'+ categoría="{categoria}".')
+        curada = max(candidatas)[1]
+        category_id = self._ids.get(curada)
+        if not category_id:
+            return None, f'Categoría curada "{curada}" no existe en el catálogo. Créala primero.'
+        return category_id, ""
+
+# ─── Funciones de API ────────────────────────────────────────────────────────
+def leer_tabla(session, tabla: str, params: dict) -> list[dict]:
+    """GET paginado de /rest/v1/<tabla> (limit/offset) hasta agotar las filas."""
+    filas = []
+    offset = 0
+    while True:
+        resp = session.get(
+            f"{SUPABASE_URL}/rest/v1/{tabla}",
+            params={**params, "limit": PAGINA, "offset": offset},
+            timeout=60,
+        )
+        resp.raise_for_status()
+        pagina = resp.json()
+        filas.extend(pagina)
+        if len(pagina) < PAGINA:
+            return filas
+        offset += PAGINA
+
+def cargar_catalogo(session):
+    """Reglas activas, categorías activas y (sku, slug) de los productos existentes."""
+    reglas = leer_tabla(session, "category_mapping_rules", {
+        "select": "departamento_raw,categoria_raw,curated_category,priority",
+        "mapping_version": f"eq.{MAPPING_VERSION}",
+        "is_active": "eq.true",
+        "order": "priority.desc",
+    })
+    categorias = leer_tabla(session, "categories", {
+        "select": "id,name", "is_active": "eq.true", "order": "id",
+    })
+    productos = leer_tabla(session, "products", {"select": "sku,slug", "order": "id"})
+    return reglas, categorias, productos
+
+def upsert_lote(session, filas: list[dict]):
+    """Un solo INSERT ... ON CONFLICT (sku) DO UPDATE para todo el lote."""
+    resp = session.post(
+        f"{SUPABASE_URL}/rest/v1/products",
+        params={"on_conflict": "sku"},
+        headers={
+            "Content-Type": "application/json",
+            "Prefer": "resolution=merge-duplicates,return=minimal",
+        },
+        json=filas,
+        timeout=120,
+    )
+    if not resp.ok:
+        raise Exception(f"HTTP {resp.status_code}: {resp.text}")
+
+def cargar_lote(session, lote: list[tuple[int, dict]]) -> tuple[int, list[tuple[int, str]]]:
+    """Upsert de [(fila, payload)]. Si el lote falla se parte en mitades hasta
+    aislar las filas malas, así un error no tira las demás ni obliga a ir fila por
+    fila. Retorna (filas cargadas, [(fila, error)])."""
+    try:
+        upsert_lote(session, [payload for _, payload in lote])
+        return len(lote), []
+    except Exception as e:
+        if len(lote) == 1:
+            return 0, [(lote[0][0], str(e))]
+    mitad = len(lote) // 2
+    ok_a, errores_a = cargar_lote(session, lote[:mitad])
+    ok_b, errores_b = cargar_lote(session, lote[mitad:])
+    return ok_a + ok_b, errores_a + errores_b
+
+# ─── Preparación de filas ────────────────────────────────────────────────────
+def leer_filas_csv(ruta: Path) -> pd.DataFrame:
+    """CSV como texto, con headers normalizados igual que parseCsvText."""
+    df = pd.read_csv(ruta, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    df.columns = [normalizar_clave(c) for c in df.columns]
+    for col in COLUMNAS_CSV:
+        if col not in df.columns:
+            df[col] = ""
+    return df[COLUMNAS_CSV]
+
+def preparar_filas(df, resolvedor, slugs_por_sku, slugs_existentes, solo_nuevos):
+    """Valida y mapea cada fila. Retorna (payloads [(fila, payload)], issues
+    [(fila, código, detalle)], SKUs existentes que se actualizarán).
+
+    slugs_existentes son los de todos los productos de la BD, también los que no
+    tienen SKU: un slug nuevo no puede chocar con ninguno."""
+    payloads = []
+    issues = []
+    existentes = set()
+    vistos = set()
+    slugs_usados = set(slugs_existentes)
+    ahora = datetime.now(timezone.utc).isoformat()
+
+    for offset, raw in enumerate(df.itertuples(index=False)):
+        raw = raw._asdict()
+        fila = offset + 2   # sourceRow del importador: la fila 1 es el header
+
+        faltantes = [col for col in COLUMNAS_OBLIGATORIAS if not raw[col].strip()]
+        if faltantes:
+            issues.append((fila, "MISSING_FIELD", f"Campos obligatorios vacíos: {', '.join(faltantes)}"))
+            continue
+
+        precio = normalizar_precio(raw["precio"])
+        if not precio > 0:
+            issues.append((fila, "INVALID_PRICE",
+                           f'Precio inválido: "{raw["precio"]}". Debe ser un número mayor a 0.'))
+            continue
+
+        sku = raw["clave1"].strip()
+        if sku in vistos:
+            issues.append((fila, "DUPLICATE_SKU", f'SKU duplicado: "{sku}" repetido en el archivo; se omite.'))
+            continue
+        vistos.add(sku)
+        if sku in slugs_por_sku and solo_nuevos:
+            issues.append((fila, "DUPLICATE_SKU",
+                           f'SKU duplicado: "{sku}" ya existe en el catálogo y será omitido.'))
+            continue
+
+        category_id, detalle = resolvedor.resolver(
+            normalizar_clave(raw["departamento"]), normalizar_clave(raw["categoria"]),
+        )
+        if not category_id:
+            issues.append((fila, "UNMAPPED_CATEGORY", detalle))
+            continue
+
+        nombre = raw["nombre"].strip()
+        if sku in slugs_por_sku:
+            existentes.add(sku)
+            slug = slugs_por_sku[sku]   # un update no cambia la URL del producto
+        else:
+            slug = _slug_unico(nombre, slugs_usados)
+
+        payloads.append((fila, {
+            "name": nombre,
+            "description": nulo_si_vacio(raw["descripcion"]),
+            "price": round(precio, 2),
+            "category_id": category_id,
+            "sku": sku,
+            "barcode": nulo_si_vacio(raw["clave2"]),
+            "sat_code": nulo_si_vacio(raw["codigo_sat"]),
+            "is_available": es_verdadero(raw["disponible"]) if raw["disponible"] else True,
+            "is_featured": es_verdadero(raw["destacado"]),
+            "is_seasonal": es_verdadero(raw["temporada"]),
+            "is_visible": True,
+            "slug": slug,
+            "updated_at": ahora,
+        }))
+    return payloads, issues, existentes
+
+def _slug_unico(nombre: str, usados: set[str]) -> str:
+    """Como generateSlug: base, base-2, base-3… pero contra el set ya cargado, sin consultas."""
+    base = slugify(nombre) or f"producto-{int(time.time() * 1000)}"
+    candidato = base
+    sufijo = 1
+    while candidato in usados:
+        sufijo += 1
+        candidato = f"{base}-{sufijo}"
+    usados.add(candidato)
+    return candidato
+
+def guardar_reporte(issues):
+    df = pd.DataFrame(issues, columns=["fila", "codigo", "detalle"]).sort_values("fila")
+    tmp = f"{REPORTE}.tmp"
+    df.to_csv(tmp, index=False, encoding="utf-8")
+    Path(tmp).replace(REPORTE)
+
+# ─── Ejecución ───────────────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Carga masiva de productos en Supabase vía PostgREST.")
+    parser.add_argument("--cargar", action="store_true", help="ejecuta de verdad (sin esto es simulacro)")
+    parser.add_argument("--csv", type=Path, default=CSV_INPUT, help="CSV a cargar (default: %(default)s)")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help="filas por upsert (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="upserts simultáneos con sesión compartida (default: %(default)s)")
+    parser.add_argument("--solo-nuevos", action="store_true",
+                        help="omite los SKUs que ya existen (como el importador web) en lugar de actualizarlos")
+    args = parser.parse_args()
+    simulacro = not args.cargar
+    n_workers = max(1, args.workers)
+    tamano_lote = max(1, args.lote)
+
+    if not SUPABASE_URL or not SERVICE_ROLE_KEY:
+        print("ERROR: Faltan NEXT_PUBLIC_SUPABASE_URL o SUPABASE_SERVICE_ROLE_KEY en .env.local")
+        sys.exit(1)
+
+    session = crear_sesion(SERVICE_ROLE_KEY, conexiones=n_workers)
+
+    # ─── Catálogo (una sola lectura) ─────────────────────────────────────────
+    inicio_lectura = time.perf_counter()
+    reglas, categorias, productos = cargar_catalogo(session)
+    slugs_por_sku = {p["sku"]: p["slug"] for p in productos if p.get("sku")}   # para los updates
+    slugs_existentes = {p["slug"] for p in productos if p.get("slug")}
+    resolvedor = ResolvedorCategorias(reglas, categorias)
+    df = leer_filas_csv(args.csv)
+    payloads, issues, existentes = preparar_filas(df, resolvedor, slugs_por_sku, slugs_existentes, args.solo_nuevos)
+    segundos_lectura = time.perf_counter() - inicio_lectura
+
+    conteo_issues = {}
+    for _, codigo, _ in issues:
+        conteo_issues[codigo] = conteo_issues.get(codigo, 0) + 1
+
+    print(f"{'[SIMULACRO]' if simulacro else '[CARGA REAL]'}")
+    print(f"URL proyecto:    {SUPABASE_URL}")
+    print(f"CSV:             {args.csv}")
+    print(f"Filas en CSV:    {len(df)}")
+    print(f"Reglas/categ.:   {len(reglas)} reglas {MAPPING_VERSION}, {len(categorias)} categorías")
+    print(f"Productos en BD: {len(productos)} ({len(productos) - len(slugs_por_sku)} sin SKU)")
+    print(f"Por crear:       {len(payloads) - len(existentes)}")
+    print(f"Por actualizar:  {len(existentes)}")
+    for codigo, n in sorted(conteo_issues.items()):
+        print(f"Omitidas {codigo + ':':<18}{n}")
+    print(f"Workers / lote:  {n_workers} / {tamano_lote}")
+    print(f"Preparación:     {segundos_lectura:.1f} s\n")
+
+    cargadas = 0
+    latencias = []
+    eventos = None
+    inicio = time.perf_counter()
+    if payloads and not simulacro:
+        eventos = Instrumentacion(Path(__file__).stem, total=len(payloads))
+        lotes = [payloads[i:i + tamano_lote] for i in range(0, len(payloads), tamano_lote)]
+
+        def cargar_medido(lote):
+            t0 = time.perf_counter()
+            with eventos.medir("db", fuente="upsert", filas=len(lote)) as ev:
+                resultado = cargar_lote(session, lote)
+                if resultado[1]:
+                    ev["error"] = "filas_con_error"
+            return resultado, time.perf_counter() - t0
+
+        with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="upsert") as executor:
+            futuros = {executor.submit(cargar_medido, lote): n for n, lote in enumerate(lotes, 1)}
+            # Solo este hilo acumula conteos e issues
+            for futuro in as_completed(futuros):
+                n = futuros[futuro]
+                (ok, errores), latencia = futuro.result()
+                cargadas += ok
+                latencias.append(latencia)
+                eventos.avance(ok + len(errores))
+                issues.extend((fila, "DB_INSERT_ERROR", f"Error al cargar producto: {e}") for fila, e in errores)
+                marca = "[OK]" if not errores else "[PARCIAL]"
+                print(f"  {marca} lote {n}/{len(lotes)}: {ok} filas ({latencia * 1000:.0f} ms)"
+                      f"{f', {len(errores)} con error' if errores else ''}")
+    segundos = time.perf_counter() - inicio
+    session.close()
+
+    guardar_reporte(issues)
+
+    print(f"\nResumen final:")
+    print(f"  {'Se cargarían' if simulacro else 'Cargadas'}:  {len(payloads) if simulacro else cargadas}")
+    print(f"  Issues:     {len(issues)} (detalle en {REPORTE})")
+    if not simulacro and cargadas:
+        print(f"  Velocidad:  {cargadas / segundos:.0f} filas/s ({segundos:.1f} s)")
+        print(f"  Latencia por lote: p50 {percentil(latencias, 50) * 1000:.0f} ms, "
+              f"p95 {percentil(latencias, 95) * 1000:.0f} ms")
+    if eventos is not None:
+        print("\n".join(lineas_resumen(eventos.cerrar())))
+        print(f"  Eventos: {eventos.ruta}")
+    if simulacro:
+        print(f"\nCorre con --cargar para ejecutar:")
+        print(f"  python scripts/06_carga-masiva-productos.py --cargar")
+
+
+if __name__ == "__main__":
+    main()
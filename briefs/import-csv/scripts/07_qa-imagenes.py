@@ -0,0 +1,281 @@
+"""
+Control de calidad de las imágenes descargadas con hashes perceptuales.
+
+Calcula un dHash de 64 bits por archivo de product_images/ (en un pool de
+procesos) y marca:
+  - duplicado:   imagen casi idéntica (distancia de Hamming <= --distancia) a la
+                 de otro SKU sin relación (nombre distinto, no una variante);
+  - placeholder: la misma imagen (a distancia <= --distancia) en muchos SKUs o
+                 una imagen casi lisa;
+  - chica:       lado menor por debajo de MIN_LADO px;
+  - proporcion:  relación de aspecto fuera de 1:PROPORCION_MAX (banners, tiras).
+
+La búsqueda de vecinos usa un índice multi-bloque sobre la distancia de Hamming
+(ver IndiceHamming), así que escala a decenas de miles de imágenes sin comparar
+todos contra todos. Las marcas se deciden con los vecinos directos de cada
+imagen, no con el grupo completo: el grupo encadena parecidos (A~B~C) y solo se
+reporta como referencia. Los SKUs que comparten a propósito la imagen del cache
+de 02 (mismo EAN o nombre normalizado) no cuentan como repetición.
+
+Salidas (output/current/):
+  - qa_imagenes.csv:     una fila por imagen con medidas, hash, grupo y marcas;
+  - reprocesar_skus.txt: SKUs marcados, uno por línea, para volver a buscarlos.
+
+Uso:
+    python scripts/07_qa-imagenes.py
+    python scripts/07_qa-imagenes.py --distancia 4 --procesos 8
+"""
+import argparse
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from PIL import Image, ImageStat
+
+from estado_pipeline import claves_imagen
+from eventos_pipeline import Instrumentacion, lineas_resumen
+
+# ─── Rutas ───────────────────────────────────────────────────────────────────
+SCRIPT_DIR = Path(__file__).resolve().parent
+CURRENT_OUTPUT_DIR = SCRIPT_DIR.parent / "output" / "current"
+FOLDER = CURRENT_OUTPUT_DIR / "product_images"
+CSV_INPUT = CURRENT_OUTPUT_DIR / "productos_listos_para_importar.csv"
+CSV_QA = CURRENT_OUTPUT_DIR / "qa_imagenes.csv"
+LISTA_REPROCESO = CURRENT_OUTPUT_DIR / "reprocesar_skus.txt"
+
+# ─── Umbrales ────────────────────────────────────────────────────────────────
+DISTANCIA_MAX = 6          # bits distintos (de 64) para considerar dos imágenes casi idénticas
+MIN_LADO = 200             # px
+PROPORCION_MAX = 2.5       # lado mayor / lado menor
+DESVIACION_LISA = 6.0      # desviación estándar de grises por debajo de la cual la imagen es casi lisa
+SKUS_PLACEHOLDER = 5       # una imagen con vecinos en este número de SKUs o más (contándose) es un placeholder
+SIMILITUD_NOMBRES = 0.5    # Jaccard de palabras a partir del cual dos nombres se consideran relacionados
+
+COLUMNAS_QA = ["sku", "nombre", "categoria", "archivo", "ancho", "alto", "bytes", "dhash",
+               "grupo", "tamano_grupo", "marcas", "detalle"]
+
+# ─── Hash perceptual ─────────────────────────────────────────────────────────
+def dhash(img) -> int:
+    """Difference hash: 9x8 en grises, 1 bit por par de píxeles vecinos en cada fila."""
+    pequena = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixeles = list(pequena.getdata())
+    valor = 0
+    for fila in range(8):
+        for col in range(8):
+            izquierda = pixeles[fila * 9 + col]
+            derecha = pixeles[fila * 9 + col + 1]
+            valor = (valor << 1) | (izquierda > derecha)
+    return valor
+
+def analizar_imagen(ruta):
+    """Corre en un proceso del pool. Retorna un dict con medidas, hash y duración (nunca lanza)."""
+    inicio = time.perf_counter()
+    ruta = Path(ruta)
+    base = {"sku": ruta.stem, "archivo": ruta.name, "bytes": ruta.stat().st_size}
+    try:
+        with Image.open(ruta) as img:
+            ancho, alto = img.size
+            # draft: el decodificador JPEG reduce al vuelo; el hash solo necesita 9x8
+            img.draft("L", (64, 64))
+            gris = img.convert("L")
+            desviacion = ImageStat.Stat(gris).stddev[0]
+            return {**base, "ancho": ancho, "alto": alto, "dhash": dhash(gris), "desviacion": desviacion,
+                    "segundos": time.perf_counter() - inicio}
+    except Exception as e:
+        return {**base, "ancho": 0, "alto": 0, "dhash": None, "desviacion": 0.0,
+                "error": f"{type(e).__name__}: {e}", "segundos": time.perf_counter() - inicio}
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class IndiceHamming:
+    """Vecinos por distancia de Hamming con índice multi-bloque (principio del palomar).
+
+    El hash se parte en radio + 1 bloques de bits: si dos hashes difieren en a lo
+    sumo `radio` bits, al menos un bloque es idéntico. Cada bloque se indexa en un
+    dict, así que una búsqueda solo compara contra los que comparten algún bloque
+    en vez de contra todos (un BK-tree con hashes de 64 bits y radio 6 termina
+    visitando casi todo el árbol)."""
+
+    def __init__(self, radio: int, bits: int = 64):
+        self.radio = radio
+        n_bloques = radio + 1
+        cortes = [bits * k // n_bloques for k in range(n_bloques + 1)]
+        self._bloques = [(inicio, (1 << (fin - inicio)) - 1) for inicio, fin in zip(cortes, cortes[1:])]
+        self._tablas = [{} for _ in self._bloques]
+        self._hashes = []
+
+    def agregar(self, valor: int) -> int:
+        indice = len(self._hashes)
+        self._hashes.append(valor)
+        for tabla, (desplazamiento, mascara) in zip(self._tablas, self._bloques):
+            tabla.setdefault((valor >> desplazamiento) & mascara, []).append(indice)
+        return indice
+
+    def buscar(self, valor: int) -> set[int]:
+        """Índices ya agregados a distancia <= radio."""
+        candidatos = set()
+        for tabla, (desplazamiento, mascara) in zip(self._tablas, self._bloques):
+            candidatos.update(tabla.get((valor >> desplazamiento) & mascara, ()))
+        return {i for i in candidatos if hamming(valor, self._hashes[i]) <= self.radio}
+
+# ─── Agrupación y marcas ─────────────────────────────────────────────────────
+def agrupar(hashes: list[int], radio: int) -> list[int]:
+    """Componentes conexas de "a distancia <= radio" (union-find). Retorna el grupo de cada índice."""
+    padre = list(range(len(hashes)))
+
+    def raiz(i):
+        while padre[i] != i:
+            padre[i] = padre[padre[i]]
+            i = padre[i]
+        return i
+
+    indice = IndiceHamming(radio)
+    for i, h in enumerate(hashes):
+        for j in indice.buscar(h):
+            padre[raiz(i)] = raiz(j)
+        indice.agregar(h)
+    return [raiz(i) for i in range(len(hashes))]
+
+def _palabras(nombre: str) -> set[str]:
+    texto = unicodedata.normalize("NFKD", nombre or "").encode("ascii", "ignore").decode("ascii").lower()
+    return {p for p in re.findall(r"[a-z]+", texto) if len(p) >= 3}
+
+def relacionados(a: dict, b: dict) -> bool:
+    """Nombres parecidos: variantes de un mismo producto (color, tamaño) pueden compartir foto."""
+    pa, pb = a["palabras"], b["palabras"]
+    return bool(pa and pb) and len(pa & pb) / len(pa | pb) >= SIMILITUD_NOMBRES
+
+def comparten_a_proposito(a: dict, b: dict) -> bool:
+    """Misma clave de cache (EAN o nombre normalizado): 02 les asignó la misma imagen adrede."""
+    return bool(a["claves"] & b["claves"])
+
+def marcar(registros: list[dict], distancia: int):
+    con_hash = [r for r in registros if r["dhash"] is not None]
+    hashes = [r["dhash"] for r in con_hash]
+    grupos = agrupar(hashes, distancia)
+    tamanos = {}
+    for g in grupos:
+        tamanos[g] = tamanos.get(g, 0) + 1
+    indice = IndiceHamming(distancia)
+    for h in hashes:
+        indice.agregar(h)
+    for i, (r, g) in enumerate(zip(con_hash, grupos)):
+        r["grupo"] = g
+        r["tamano_grupo"] = tamanos[g]
+        # Vecinos directos, sin los que comparten la imagen a propósito
+        r["vecinos"] = [
+            con_hash[j] for j in indice.buscar(r["dhash"])
+            if j != i and not comparten_a_proposito(r, con_hash[j])
+        ]
+
+    for r in registros:
+        marcas, detalle = [], []
+        if r["dhash"] is None:
+            marcas.append("ilegible")
+            detalle.append(r.get("error", ""))
+        else:
+            vecinos = r["vecinos"]
+            if len(vecinos) + 1 >= SKUS_PLACEHOLDER:
+                marcas.append("placeholder")
+                detalle.append(f"misma imagen en {len(vecinos) + 1} SKUs")
+            elif vecinos:
+                ajenos = [o["sku"] for o in vecinos if not relacionados(r, o)]
+                if ajenos:
+                    marcas.append("duplicado")
+                    detalle.append(f"igual a {', '.join(ajenos[:5])}")
+            if r["desviacion"] < DESVIACION_LISA:
+                if "placeholder" not in marcas:
+                    marcas.append("placeholder")
+                detalle.append(f"casi lisa (desv. {r['desviacion']:.1f})")
+            if min(r["ancho"], r["alto"]) < MIN_LADO:
+                marcas.append("chica")
+                detalle.append(f"{r['ancho']}x{r['alto']}")
+            proporcion = max(r["ancho"], r["alto"]) / max(1, min(r["ancho"], r["alto"]))
+            if proporcion > PROPORCION_MAX:
+                marcas.append("proporcion")
+                detalle.append(f"aspecto {proporcion:.1f}:1")
+        r["marcas"] = ";".join(marcas)
+        r["detalle"] = "; ".join(d for d in detalle if d)
+
+# ─── Ejecución ───────────────────────────────────────────────────────────────
+def _escribir_atomico(ruta: Path, escribir):
+    tmp = ruta.with_name(ruta.name + ".tmp")
+    escribir(tmp)
+    os.replace(tmp, ruta)
+
+def main():
+    parser = argparse.ArgumentParser(description="QA de imágenes con hashes perceptuales.")
+    parser.add_argument("--carpeta", type=Path, default=FOLDER, help="imágenes a revisar (default: %(default)s)")
+    parser.add_argument("--distancia", type=int, default=DISTANCIA_MAX,
+                        help="bits distintos máximos para considerar dos imágenes iguales (default: %(default)s)")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1,
+                        help="procesos del pool (default: núcleos disponibles)")
+    args = parser.parse_args()
+
+    productos = {}
+    if CSV_INPUT.exists():
+        df = pd.read_csv(CSV_INPUT, dtype=str, keep_default_na=False)
+        for sku, nombre, categoria, clave2 in zip(df["clave1"], df["nombre"], df["categoria"], df["clave2"]):
+            productos.setdefault(sku.strip(), (nombre, categoria.strip().lower(), clave2))
+
+    archivos = [
+        e.path for e in os.scandir(args.carpeta)
+        if e.is_file() and not e.name.endswith(".part") and not e.name.startswith(".")
+    ]
+    print(f"Carpeta:   {args.carpeta}")
+    print(f"Imágenes:  {len(archivos)}, {args.procesos} procesos, distancia <= {args.distancia}\n")
+
+    eventos = Instrumentacion(Path(__file__).stem, total=len(archivos))
+    inicio = time.perf_counter()
+    registros = []
+    with ProcessPoolExecutor(max_workers=max(1, args.procesos)) as executor:
+        for r in executor.map(analizar_imagen, archivos, chunksize=32):
+            eventos.registrar("hash", r["segundos"], error=r.get("error", "").split(":")[0], sku=r["sku"])
+            eventos.avance()
+            registros.append(r)
+    segundos_hash = time.perf_counter() - inicio
+
+    for r in registros:
+        r["nombre"], r["categoria"], clave2 = productos.get(r["sku"], ("", "", ""))
+        r["palabras"] = _palabras(r["nombre"])
+        r["claves"] = set(claves_imagen(clave2, r["nombre"]))
+        r.setdefault("grupo", "")
+        r.setdefault("tamano_grupo", 0)
+
+    inicio_grupos = time.perf_counter()
+    marcar(registros, args.distancia)
+    segundos_grupos = time.perf_counter() - inicio_grupos
+    eventos.registrar("agrupacion", segundos_grupos, imagenes=len(registros))
+
+    for r in registros:
+        r["dhash"] = f"{r['dhash']:016x}" if r["dhash"] is not None else ""
+    df_qa = pd.DataFrame(registros, columns=COLUMNAS_QA)
+    df_qa = df_qa.sort_values(["marcas", "grupo", "sku"], ascending=[False, True, True])
+    _escribir_atomico(CSV_QA, lambda tmp: df_qa.to_csv(tmp, index=False, encoding="utf-8"))
+
+    marcados = sorted(r["sku"] for r in registros if r["marcas"])
+    _escribir_atomico(LISTA_REPROCESO, lambda tmp: Path(tmp).write_text(
+        "".join(f"{sku}\n" for sku in marcados), encoding="utf-8"))
+
+    conteos = {}
+    for r in registros:
+        for marca in filter(None, r["marcas"].split(";")):
+            conteos[marca] = conteos.get(marca, 0) + 1
+    print(f"Resumen:")
+    for marca in ("duplicado", "placeholder", "chica", "proporcion", "ilegible"):
+        print(f"  {marca + ':':<13}{conteos.get(marca, 0)}")
+    print(f"  Por reprocesar: {len(marcados)} SKUs → {LISTA_REPROCESO}")
+    print(f"  Detalle:        {CSV_QA}")
+    if registros:
+        print(f"  Velocidad:      {len(registros) / max(segundos_hash, 1e-9):.0f} imágenes/s (hash), "
+              f"agrupación en {segundos_grupos:.2f} s")
+    print("\n".join(lineas_resumen(eventos.cerrar())))
+
+
+if __name__ == "__main__":
+    main()
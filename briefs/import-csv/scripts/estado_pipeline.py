@@ -0,0 +1,328 @@
+"""
+Estado del pipeline de importación por SKU en SQLite (modo WAL).
+
+Reemplaza el append a imagenes_map.csv y la reescritura periódica de
+inventario_actualizado.csv: cada resultado es un upsert idempotente de una
+fila, y los CSV se generan solo como exportaciones.
+
+No se ejecuta directamente; lo usan los scripts numerados de esta carpeta.
+"""
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+IMAGEN_PENDIENTE = "pendiente"
+IMAGEN_OK = "ok"
+IMAGEN_SIN_RESULTADO = "sin_imagen"
+
+DESC_PENDIENTE = "pendiente"
+DESC_OK = "ok"
+
+COLUMNAS_MAPA = ['sku', 'nombre', 'imagen_local', 'supabase_url']
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS productos (
+    sku            TEXT PRIMARY KEY,
+    nombre         TEXT NOT NULL DEFAULT '',
+    imagen_estado  TEXT NOT NULL DEFAULT 'pendiente',
+    imagen_local   TEXT NOT NULL DEFAULT '',
+    imagen_fuente  TEXT NOT NULL DEFAULT '',
+    supabase_url   TEXT NOT NULL DEFAULT '',
+    desc_estado    TEXT NOT NULL DEFAULT 'pendiente',
+    descripcion    TEXT,
+    actualizado_en REAL NOT NULL
+);
+
+-- Imágenes ya descargadas por clave de producto ('ean:<GTIN-14>' o 'nombre:<nombre normalizado>'),
+-- compartidas entre SKUs y corridas. archivo es relativo a la carpeta del cache.
+CREATE TABLE IF NOT EXISTS cache_imagenes (
+    clave          TEXT PRIMARY KEY,
+    archivo        TEXT NOT NULL,
+    fuente         TEXT NOT NULL DEFAULT '',
+    sku_origen     TEXT NOT NULL DEFAULT '',
+    actualizado_en REAL NOT NULL
+);
+"""
+
+# Columnas agregadas después de la primera versión del esquema: (nombre, definición)
+_COLUMNAS_NUEVAS = [
+    ("imagen_fuente", "TEXT NOT NULL DEFAULT ''"),
+]
+
+
+# ─── Claves del cache de imágenes ────────────────────────────────────────────
+def normalizar_ean(clave2):
+    """GTIN-14 si clave2 es un EAN-8/UPC-A/EAN-13/GTIN-14 con dígito verificador válido, si no ''.
+
+    Los códigos internos (cortos o sin dígito válido) no sirven como clave:
+    pueden repetirse entre productos que no tienen nada que ver."""
+    digitos = re.sub(r"\D", "", str(clave2 or ""))
+    if len(digitos) not in (8, 12, 13, 14) or not digitos.strip("0"):
+        return ""
+    gtin = digitos.zfill(14)
+    suma = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(gtin[:-1]))
+    return gtin if (10 - suma % 10) % 10 == int(gtin[-1]) else ""
+
+def normalizar_nombre(nombre):
+    texto = unicodedata.normalize("NFKD", str(nombre or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.findall(r"[a-z0-9]+", texto.lower()))
+
+def claves_imagen(clave2, nombre):
+    """Claves de cache en orden de preferencia: EAN y, como respaldo, el nombre normalizado."""
+    claves = []
+    ean = normalizar_ean(clave2)
+    if ean:
+        claves.append(f"ean:{ean}")
+    nombre_norm = normalizar_nombre(nombre)
+    if nombre_norm:
+        claves.append(f"nombre:{nombre_norm}")
+    return claves
+
+
+class EstadoPipeline:
+    """Acceso al archivo SQLite de progreso. Seguro entre hilos (un lock por conexión)."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_ESQUEMA)
+        self._migrar()
+
+    def _migrar(self):
+        existentes = {fila[1] for fila in self._conn.execute("PRAGMA table_info(productos)")}
+        with self._conn:
+            for columna, definicion in _COLUMNAS_NUEVAS:
+                if columna not in existentes:
+                    self._conn.execute(f"ALTER TABLE productos ADD COLUMN {columna} {definicion}")
+
+    # ─── Escritura ───────────────────────────────────────────────────────────
+    def registrar_imagen(self, sku, nombre, imagen_local, fuente=""):
+        """fuente: motor del que salió la imagen; vacío conserva el registrado (p. ej. en un SKIP)."""
+        estado = IMAGEN_OK if imagen_local else IMAGEN_SIN_RESULTADO
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO productos (sku, nombre, imagen_estado, imagen_local, imagen_fuente, actualizado_en)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(sku) DO UPDATE SET
+                    nombre = excluded.nombre,
+                    imagen_estado = excluded.imagen_estado,
+                    imagen_local = excluded.imagen_local,
+                    imagen_fuente = CASE WHEN excluded.imagen_fuente != ''
+                                         THEN excluded.imagen_fuente
+                                         ELSE productos.imagen_fuente END,
+                    actualizado_en = excluded.actualizado_en
+                """,
+                (sku, nombre, estado, imagen_local, fuente, time.time()),
+            )
+
+    def registrar_descripcion(self, sku, nombre, descripcion, estado=DESC_OK):
+        """estado DESC_PENDIENTE: la generación falló y se reintenta en la próxima corrida.
+        Un fallo nunca pisa una descripción ya generada (p. ej. con FORZAR_DESC)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO productos (sku, nombre, desc_estado, descripcion, actualizado_en)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(sku) DO UPDATE SET
+                    desc_estado = excluded.desc_estado,
+                    descripcion = excluded.descripcion,
+                    actualizado_en = excluded.actualizado_en
+                WHERE excluded.desc_estado = 'ok' OR productos.desc_estado != 'ok'
+                """,
+                (sku, nombre, estado, descripcion, time.time()),
+            )
+
+    def reiniciar_imagenes(self, skus):
+        """Marca imágenes como pendientes (p. ej. tras borrarlas para re-procesar)."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                UPDATE productos
+                SET imagen_estado = 'pendiente', imagen_local = '', imagen_fuente = '',
+                    supabase_url = '', actualizado_en = ?
+                WHERE sku = ?
+                """,
+                [(time.time(), sku) for sku in skus],
+            )
+
+    def guardar_en_cache(self, claves, archivo, fuente, sku_origen):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO cache_imagenes (clave, archivo, fuente, sku_origen, actualizado_en)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(clave) DO UPDATE SET
+                    archivo = excluded.archivo,
+                    fuente = excluded.fuente,
+                    sku_origen = excluded.sku_origen,
+                    actualizado_en = excluded.actualizado_en
+                """,
+                [(clave, archivo, fuente, sku_origen, time.time()) for clave in claves],
+            )
+
+    def invalidar_cache(self, skus):
+        """Quita del cache las imágenes que vinieron de estos SKUs (con todas sus claves).
+
+        Retorna los archivos que quedaron sin ninguna clave, para borrarlos del disco."""
+        skus = list(skus)
+        with self._lock, self._conn:
+            archivos = set()
+            for i in range(0, len(skus), 500):
+                lote = skus[i:i + 500]
+                marcas = ", ".join("?" for _ in lote)
+                archivos.update(a for (a,) in self._conn.execute(
+                    f"SELECT archivo FROM cache_imagenes WHERE sku_origen IN ({marcas})", lote
+                ))
+            self._conn.executemany("DELETE FROM cache_imagenes WHERE archivo = ?", [(a,) for a in archivos])
+        return sorted(archivos)
+
+    def importar_mapa_csv(self, ruta, carpeta_imagenes=None):
+        """Sincroniza desde imagenes_map.csv (formato histórico o exportado).
+
+        SKUs nuevos se insertan con su imagen; en los existentes se toma la
+        supabase_url que haya llenado 03_sube-imagenes-supabase.py y la imagen
+        solo si aún no tenían una. Las filas duplicadas del mapa histórico
+        colapsan en una por SKU.
+
+        Una imagen_local que no existe en esta máquina (p. ej. rutas absolutas
+        de otra) se reemplaza por carpeta_imagenes/{sku}.jpg si ese archivo
+        existe; si no, el SKU queda pendiente para volver a buscarse."""
+        if not os.path.exists(ruta):
+            return 0
+        filas = []
+        with open(ruta, newline='', encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                sku = (row.get('sku') or '').strip()
+                if not sku:
+                    continue
+                imagen_local = (row.get('imagen_local') or '').strip()
+                if not imagen_local:
+                    estado = IMAGEN_SIN_RESULTADO
+                elif os.path.exists(imagen_local):
+                    estado = IMAGEN_OK
+                else:
+                    en_carpeta = os.path.join(carpeta_imagenes, f"{sku}.jpg") if carpeta_imagenes else ""
+                    if en_carpeta and os.path.exists(en_carpeta):
+                        estado, imagen_local = IMAGEN_OK, en_carpeta
+                    else:
+                        estado, imagen_local = IMAGEN_PENDIENTE, ""
+                filas.append((
+                    sku, row.get('nombre') or '', estado, imagen_local,
+                    (row.get('supabase_url') or '').strip(), time.time(),
+                ))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO productos (sku, nombre, imagen_estado, imagen_local, supabase_url, actualizado_en)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(sku) DO UPDATE SET
+                    imagen_estado = CASE WHEN productos.imagen_local = '' AND excluded.imagen_local != ''
+                                         THEN excluded.imagen_estado
+                                         ELSE productos.imagen_estado END,
+                    imagen_local = CASE WHEN productos.imagen_local = ''
+                                        THEN excluded.imagen_local
+                                        ELSE productos.imagen_local END,
+                    supabase_url = CASE WHEN excluded.supabase_url != ''
+                                        THEN excluded.supabase_url
+                                        ELSE productos.supabase_url END
+                """,
+                filas,
+            )
+        return len(filas)
+
+    def importar_descripciones(self, pares):
+        """Carga descripciones ya generadas (sku, nombre, descripcion) de un CSV previo."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO productos (sku, nombre, desc_estado, descripcion, actualizado_en)
+                VALUES (?, ?, 'ok', ?, ?)
+                ON CONFLICT(sku) DO UPDATE SET
+                    desc_estado = 'ok',
+                    descripcion = excluded.descripcion
+                WHERE productos.desc_estado != 'ok'
+                """,
+                [(sku, nombre, desc, time.time()) for sku, nombre, desc in pares],
+            )
+
+    # ─── Lectura ─────────────────────────────────────────────────────────────
+    def _consultar(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def esta_vacio(self):
+        return not self._consultar("SELECT 1 FROM productos LIMIT 1")
+
+    def skus_con_imagen(self, incluir_sin_imagen=True):
+        """SKUs cuya etapa de imagen ya terminó (con o sin resultado)."""
+        estados = (IMAGEN_OK, IMAGEN_SIN_RESULTADO) if incluir_sin_imagen else (IMAGEN_OK,)
+        marcas = ", ".join("?" for _ in estados)
+        return {
+            sku for (sku,) in self._consultar(
+                f"SELECT sku FROM productos WHERE imagen_estado IN ({marcas})", estados
+            )
+        }
+
+    def imagenes(self):
+        """dict sku → {imagen_estado, imagen_local, imagen_fuente, supabase_url, actualizado_en}."""
+        filas = self._consultar(
+            "SELECT sku, imagen_estado, imagen_local, imagen_fuente, supabase_url, actualizado_en FROM productos"
+        )
+        return {
+            sku: {"imagen_estado": estado, "imagen_local": local, "imagen_fuente": fuente,
+                  "supabase_url": url, "actualizado_en": actualizado}
+            for sku, estado, local, fuente, url, actualizado in filas
+        }
+
+    def buscar_en_cache(self, claves):
+        """Primera clave con imagen en el cache: (clave, archivo, fuente) o None."""
+        for clave in claves:
+            fila = self._consultar("SELECT archivo, fuente FROM cache_imagenes WHERE clave = ?", (clave,))
+            if fila:
+                return (clave, *fila[0])
+        return None
+
+    def claves_en_cache(self):
+        return {clave for (clave,) in self._consultar("SELECT clave FROM cache_imagenes")}
+
+    def skus_con_descripcion(self):
+        """SKUs cuya descripción ya se generó (desc_estado = 'ok')."""
+        return {sku for (sku,) in self._consultar("SELECT sku FROM productos WHERE desc_estado = 'ok'")}
+
+    def descripciones(self):
+        """dict sku → descripción para las descripciones ya generadas."""
+        return dict(self._consultar(
+            "SELECT sku, descripcion FROM productos WHERE desc_estado = 'ok'"
+        ))
+
+    def conteos(self):
+        return dict(self._consultar(
+            "SELECT imagen_estado, COUNT(*) FROM productos GROUP BY imagen_estado"
+        ))
+
+    # ─── Exportación ─────────────────────────────────────────────────────────
+    def exportar_mapa_csv(self, ruta):
+        """Escribe imagenes_map.csv (una fila por SKU) con write-then-rename."""
+        filas = self._consultar(
+            "SELECT sku, nombre, imagen_local, supabase_url FROM productos "
+            "WHERE imagen_estado != 'pendiente' ORDER BY rowid"
+        )
+        tmp = f"{ruta}.tmp"
+        with open(tmp, 'w', newline='', encoding="utf-8") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(COLUMNAS_MAPA)
+            writer.writerows(filas)
+        os.replace(tmp, ruta)
+        return len(filas)
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,232 @@
+"""
+Instrumentación compartida de los scripts del pipeline: eventos JSON lines.
+
+Cada corrida escribe output/current/eventos/<fecha>-<script>.jsonl con un
+evento por línea (se hace flush de cada línea, así que se puede seguir en vivo):
+
+    {"t": 1760000000.123, "corrida": "...", "tipo": "inicio", "script": "02", "total": 1200}
+    {"t": ..., "tipo": "etapa", "etapa": "busqueda", "fuente": "Bing", "ms": 2310.4, "ok": true, "error": "", "sku": "..."}
+    {"t": ..., "tipo": "avance", "hechos": 15, "total": 1200}
+    {"t": ..., "tipo": "fin", "resumen": {...}}
+
+Al cerrar escribe <fecha>-<script>.resumen.json con throughput, latencias
+p50/p95/p99 por etapa y por fuente, y el conteo de errores por tipo.
+00_avance.py lee estos archivos para mostrar el avance y el ETA.
+
+No se ejecuta directamente; lo usan los scripts numerados de esta carpeta.
+"""
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+EVENTOS_DIR = Path(__file__).resolve().parent.parent / "output" / "current" / "eventos"
+
+
+def percentil(valores, p: float) -> float:
+    """Percentil por rango más cercano (p en 0–100); 0.0 si no hay valores."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[k]
+
+
+# ─── Agregación (la usan la corrida y el monitor) ────────────────────────────
+class Agregador:
+    """Acumula eventos y arma el resumen de una corrida."""
+
+    def __init__(self):
+        self.script = ""
+        self.inicio = None
+        self.ultimo = None
+        self.total = None
+        self.hechos = 0
+        self.terminada = False
+        self.latencias = {}   # (etapa, fuente) → [ms]
+        self.fallidos = {}    # (etapa, fuente) → n
+        self.errores = {}     # etapa → {error: n}
+        self.avances = []     # (t, hechos), para la velocidad reciente
+
+    def agregar(self, evento: dict):
+        t = evento.get("t", time.time())
+        self.inicio = t if self.inicio is None else self.inicio
+        self.ultimo = t
+        tipo = evento.get("tipo")
+        if tipo == "inicio":
+            self.script = evento.get("script", "")
+            self.total = evento.get("total")
+        elif tipo == "etapa":
+            clave = (evento["etapa"], evento.get("fuente") or "")
+            self.latencias.setdefault(clave, []).append(evento.get("ms", 0.0))
+            if not evento.get("ok", True):
+                self.fallidos[clave] = self.fallidos.get(clave, 0) + 1
+                errores = self.errores.setdefault(evento["etapa"], {})
+                error = evento.get("error") or "desconocido"
+                errores[error] = errores.get(error, 0) + 1
+        elif tipo == "avance":
+            self.hechos = evento.get("hechos", self.hechos)
+            if evento.get("total") is not None:
+                self.total = evento["total"]
+            self.avances.append((t, self.hechos))
+        elif tipo == "fin":
+            self.terminada = True
+
+    def velocidad(self, ventana: float = 120.0) -> float:
+        """Unidades por segundo en los últimos `ventana` segundos de avance (o en toda la corrida)."""
+        if len(self.avances) < 2:
+            return 0.0
+        t_fin, hechos_fin = self.avances[-1]
+        previos = [a for a in self.avances if a[0] >= t_fin - ventana]
+        t_ini, hechos_ini = previos[0] if len(previos) > 1 else self.avances[0]
+        return (hechos_fin - hechos_ini) / (t_fin - t_ini) if t_fin > t_ini else 0.0
+
+    def eta(self) -> float | None:
+        """Segundos restantes estimados con la velocidad reciente; None si no se puede estimar."""
+        velocidad = self.velocidad()
+        if not self.total or velocidad <= 0:
+            return None
+        return max(0, self.total - self.hechos) / velocidad
+
+    def _estadisticas(self, latencias, fallidos, segundos):
+        return {
+            "n": len(latencias),
+            "errores": fallidos,
+            "por_segundo": round(len(latencias) / segundos, 3) if segundos > 0 else 0.0,
+            "p50_ms": round(percentil(latencias, 50), 1),
+            "p95_ms": round(percentil(latencias, 95), 1),
+            "p99_ms": round(percentil(latencias, 99), 1),
+        }
+
+    def resumen(self) -> dict:
+        segundos = (self.ultimo - self.inicio) if self.inicio is not None else 0.0
+        por_etapa, por_fuente = {}, {}
+        for (etapa, fuente), latencias in sorted(self.latencias.items()):
+            por_etapa.setdefault(etapa, ([], 0))
+            todas, fallidos = por_etapa[etapa]
+            por_etapa[etapa] = (todas + latencias, fallidos + self.fallidos.get((etapa, fuente), 0))
+            if fuente:
+                por_fuente.setdefault(etapa, {})[fuente] = self._estadisticas(
+                    latencias, self.fallidos.get((etapa, fuente), 0), segundos)
+        return {
+            "script": self.script,
+            "segundos": round(segundos, 3),
+            "hechos": self.hechos,
+            "total": self.total,
+            "por_segundo": round(self.hechos / segundos, 3) if segundos > 0 else 0.0,
+            "etapas": {etapa: self._estadisticas(lat, fal, segundos) for etapa, (lat, fal) in por_etapa.items()},
+            "fuentes": por_fuente,
+            "errores": self.errores,
+        }
+
+
+def lineas_resumen(resumen: dict) -> list[str]:
+    """Reporte legible de un resumen: una línea por etapa/fuente y los errores por tipo."""
+    lineas = [f"  Corrida: {resumen['hechos']}"
+              f"{'/' + str(resumen['total']) if resumen.get('total') else ''} en {resumen['segundos']:.1f} s "
+              f"({resumen['por_segundo']:.2f}/s)"]
+    for etapa, e in resumen["etapas"].items():
+        lineas.append(f"  {etapa:<14} n={e['n']:<6} err={e['errores']:<4} {e['por_segundo']:.2f}/s  "
+                      f"p50 {e['p50_ms']:.0f} ms  p95 {e['p95_ms']:.0f} ms  p99 {e['p99_ms']:.0f} ms")
+        for fuente, f in resumen["fuentes"].get(etapa, {}).items():
+            lineas.append(f"    {fuente:<12} n={f['n']:<6} err={f['errores']:<4} "
+                          f"p50 {f['p50_ms']:.0f} ms  p95 {f['p95_ms']:.0f} ms  p99 {f['p99_ms']:.0f} ms")
+    for etapa, errores in resumen["errores"].items():
+        detalle = ", ".join(f"{error} {n}" for error, n in sorted(errores.items(), key=lambda x: -x[1]))
+        lineas.append(f"  Errores {etapa}: {detalle}")
+    return lineas
+
+
+def leer_eventos(ruta: Path) -> list[dict]:
+    eventos = []
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                eventos.append(json.loads(linea))
+            except json.JSONDecodeError:
+                continue   # última línea a medio escribir
+    return eventos
+
+
+# ─── Corrida ─────────────────────────────────────────────────────────────────
+class Instrumentacion:
+    """Escribe los eventos de una corrida y mantiene su resumen. Seguro entre hilos.
+
+    Uso:
+        eventos = Instrumentacion("02", total=len(filas))
+        with eventos.medir("busqueda", fuente="Bing", sku=sku) as ev:
+            ...
+            ev["error"] = "sin_resultados"   # falla sin excepción
+        eventos.registrar("llm", segundos, sku=sku)   # etapa medida por fuera
+        eventos.avance()
+        eventos.cerrar()
+    """
+
+    def __init__(self, script: str, total: int | None = None, carpeta: Path = EVENTOS_DIR):
+        carpeta = Path(carpeta)
+        carpeta.mkdir(parents=True, exist_ok=True)
+        base = f"{time.strftime('%Y%m%d-%H%M%S')}-{script}"
+        self.corrida, n = base, 1
+        while (carpeta / f"{self.corrida}.jsonl").exists():   # dos corridas en el mismo segundo
+            n += 1
+            self.corrida = f"{base}-{n}"
+        self.ruta = carpeta / f"{self.corrida}.jsonl"
+        self.ruta_resumen = carpeta / f"{self.corrida}.resumen.json"
+        self._lock = threading.Lock()
+        self._archivo = open(self.ruta, "x", encoding="utf-8")
+        self.agregador = Agregador()
+        self._emitir("inicio", script=script, total=total, pid=os.getpid())
+
+    def _escribir(self, tipo: str, **campos):
+        """Agrega y escribe un evento; quien llama tiene el lock."""
+        evento = {"t": round(time.time(), 3), "corrida": self.corrida, "tipo": tipo, **campos}
+        self.agregador.agregar(evento)
+        if not self._archivo.closed:
+            self._archivo.write(json.dumps(evento, ensure_ascii=False) + "\n")
+            self._archivo.flush()
+
+    def _emitir(self, tipo: str, **campos):
+        with self._lock:
+            self._escribir(tipo, **campos)
+
+    def registrar(self, etapa: str, segundos: float, ok: bool = True, error: str = "", fuente: str = "", **campos):
+        """Evento de una etapa ya medida; `error` no vacío la cuenta como fallida."""
+        ok = ok and not error
+        self._emitir("etapa", etapa=etapa, fuente=fuente, ms=round(segundos * 1000, 1),
+                     ok=ok, error=error if not ok else "", **campos)
+
+    @contextmanager
+    def medir(self, etapa: str, fuente: str = "", **campos):
+        """Mide el bloque. Dentro se puede fijar ev["error"] o ev["fuente"];
+        una excepción se registra con su tipo como error y se propaga."""
+        ev = {"fuente": fuente, "error": "", **campos}
+        inicio = time.perf_counter()
+        try:
+            yield ev
+        except Exception as e:
+            ev["error"] = type(e).__name__
+            raise
+        finally:
+            segundos = time.perf_counter() - inicio
+            fuente, error = ev.pop("fuente"), ev.pop("error")
+            self.registrar(etapa, segundos, error=error, fuente=fuente, **ev)
+
+    def avance(self, n: int = 1, total: int | None = None):
+        """Suma `n` unidades terminadas (lo que mide el ETA: SKUs, imágenes, filas)."""
+        campos = {"total": total} if total is not None else {}
+        with self._lock:
+            self._escribir("avance", hechos=self.agregador.hechos + n, **campos)
+
+    def cerrar(self) -> dict:
+        """Escribe el evento final y el resumen JSON. Retorna el resumen."""
+        with self._lock:
+            resumen = self.agregador.resumen()
+            self._escribir("fin", resumen=resumen)
+            self._archivo.close()
+        tmp = self.ruta_resumen.with_suffix(".tmp")
+        tmp.write_text(json.dumps(resumen, indent=1, ensure_ascii=False))
+        os.replace(tmp, self.ruta_resumen)
+        return resumen
@@ -0,0 +1,71 @@
+"""
+Acceso HTTP a Supabase (Storage + PostgREST) compartido por los scripts — sin SDK.
+
+Lee la configuración de `.env.local` en la raíz del repo; las variables de
+entorno del proceso tienen prioridad, lo que permite apuntar a un servidor
+local de prueba sin tocar el archivo.
+"""
+import os
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ROOT = Path(__file__).resolve().parents[3]
+BUCKET = "product-images"
+
+# Respuestas que vale la pena reintentar: rate limit y errores transitorios del servidor
+STATUS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+
+# ─── Leer .env.local manualmente (sin python-dotenv) ────────────────────────
+def cargar_env(path: Path) -> dict:
+    env = {}
+    if path.exists():
+        for line in path.read_text().splitlines():
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                k, _, v = line.partition("=")
+                env[k.strip()] = v.strip().strip('"').strip("'")
+    return env
+
+
+def cargar_config() -> tuple[str, str]:
+    """Retorna (SUPABASE_URL, clave) o cadenas vacías si faltan."""
+    env = cargar_env(ROOT / ".env.local")
+    for var in ("NEXT_PUBLIC_SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY", "NEXT_PUBLIC_SUPABASE_ANON_KEY"):
+        if os.environ.get(var):
+            env[var] = os.environ[var]
+    url = env.get("NEXT_PUBLIC_SUPABASE_URL", "").rstrip("/")
+    clave = env.get("SUPABASE_SERVICE_ROLE_KEY") or env.get("NEXT_PUBLIC_SUPABASE_ANON_KEY", "")
+    return url, clave
+
+
+def headers_base(clave: str) -> dict:
+    """Headers comunes para todas las llamadas."""
+    return {
+        "Authorization": f"Bearer {clave}",
+        "apikey": clave,
+    }
+
+
+def crear_sesion(clave: str, conexiones: int = 10, reintentos: int = 5, backoff: float = 0.5) -> requests.Session:
+    """Sesión con pool de conexiones keep-alive y reintentos con backoff exponencial.
+
+    Reintenta también POST/PATCH: las subidas usan x-upsert y los PATCH por SKU
+    son idempotentes, así que repetirlos no duplica nada. Respeta Retry-After."""
+    retry = Retry(
+        total=reintentos,
+        backoff_factor=backoff,
+        status_forcelist=STATUS_REINTENTABLES,
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=conexiones, pool_maxsize=conexiones, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(headers_base(clave))
+    return session
+
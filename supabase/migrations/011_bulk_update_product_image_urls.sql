@@ -0,0 +1,49 @@
+-- Migration: 011_bulk_update_product_image_urls
+-- Import pipeline (briefs/import-csv): bulk products.image_url update by SKU.
+-- Lets 03_sube-imagenes-supabase.py flush many (sku, image_url) pairs in a single
+-- PostgREST call (POST /rest/v1/rpc/bulk_update_product_image_urls) instead of one
+-- PATCH per SKU. Returns only counts plus the SKUs that did not match any product.
+--
+-- An upsert with on_conflict=sku is not usable here: the insert branch of
+-- INSERT ... ON CONFLICT still enforces NOT NULL on category_id/name/slug/price.
+
+-- ============================================================
+-- FUNCTION
+-- ============================================================
+CREATE OR REPLACE FUNCTION bulk_update_product_image_urls(items jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  updated_count integer;
+  unmatched text[];
+BEGIN
+  WITH input AS (
+    SELECT DISTINCT ON (x.sku) x.sku, x.image_url
+    FROM jsonb_to_recordset(items) AS x(sku text, image_url text)
+    WHERE x.sku IS NOT NULL
+  ),
+  updated AS (
+    UPDATE products p
+    SET image_url = input.image_url
+    FROM input
+    WHERE p.sku = input.sku
+    RETURNING p.sku
+  )
+  SELECT
+    (SELECT count(*) FROM updated),
+    (SELECT coalesce(array_agg(input.sku), '{}')
+       FROM input
+      WHERE input.sku NOT IN (SELECT sku FROM updated))
+  INTO updated_count, unmatched;
+
+  RETURN jsonb_build_object('updated', updated_count, 'unmatched', to_jsonb(unmatched));
+END;
+$$;
+
+-- ============================================================
+-- PRIVILEGES (operational script only, via service role)
+-- ============================================================
+REVOKE EXECUTE ON FUNCTION bulk_update_product_image_urls(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION bulk_update_product_image_urls(jsonb) TO service_role;